@@ -0,0 +1,264 @@
+"""Measure crawl speed and memory on generated sites, and compare the results across commits.
+
+python -m benchmarks.crawl_suite --pages 10000 --shape tree
+python -m benchmarks.crawl_suite --pages 100000 --shape clique --compare HEAD~1
+python -m benchmarks.crawl_suite --pages 2000 --browser --button-every 10
+python -m benchmarks.crawl_suite --pages 2000 --browser --button-every 10 --assets --tuned-driver
+
+Each benchmark runs in a fresh process so its peak memory is its own. Results are saved to
+benchmarks/results/<commit>.json, and --compare prints the change from an earlier commit's.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from benchmarks.synthetic_site import SHAPES, SyntheticSite, SyntheticSiteServer
+from siteatlas.crawler import CrawlState, crawl_concurrently
+from siteatlas.http_fetch import HttpFetcher
+from siteatlas.profiling import CrawlProfiler
+from siteatlas.site_map import SiteMap
+from siteatlas.site_nagivation import get_links_map
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'results')
+
+# Runs one benchmark, returning how many pages it covered and anything else worth saving
+Benchmark = Callable[[SyntheticSite, argparse.Namespace], dict[str, Any]]
+
+
+def bench_links_map(site: SyntheticSite, args: argparse.Namespace) -> dict[str, Any]:
+    """Read the links from every page's html, without any network."""
+    base_url = 'http://127.0.0.1:8000'
+    for page in range(site.pages):
+        get_links_map(site.html(page), f'{base_url}/page/{page}', {'127.0.0.1:8000'})
+    return {'pages': site.pages}
+
+
+def bench_site_map(site: SyntheticSite, args: argparse.Namespace) -> dict[str, Any]:
+    """Merge every page's links into a site map as a crawl would, then diff and add whole maps."""
+    base_url = 'http://127.0.0.1:8000'
+    site_map = SiteMap.compact() if args.compact else SiteMap()
+    for page in range(site.pages):
+        site_map += SiteMap({f'{base_url}/page/{link}' for link in site.links(page)}, {'https://www.example.org/'})
+    half = SiteMap({f'{base_url}/page/{page}' for page in range(0, site.pages, 2)}, set())
+    site_map.diff_site_maps(half)
+    _ = site_map + half
+    return {'pages': site.pages, 'urls': len(site_map.urls)}
+
+
+def _create_plain_driver() -> Any:
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    return webdriver.Chrome(options=options)
+
+
+def driver_factory(args: argparse.Namespace, allowed_domains: set[str]) -> Callable[[], Any]:
+    """A plain headless Chrome, or with --tuned-driver one that blocks resources not needed to find links."""
+    from siteatlas.browser import CrawlDriverFactory
+
+    if args.tuned_driver:
+        return CrawlDriverFactory(allowed_domains, profiles_directory=args.profiles_directory)
+    return _create_plain_driver
+
+
+def _crawl_over_http(site: SyntheticSite, args: argparse.Namespace, fetch_in_browser: bool) -> dict[str, Any]:
+    profiler = CrawlProfiler()
+    with SyntheticSiteServer(site) as server:
+        allowed_domains = {server.url.split('//')[1]}
+        http_fetcher = HttpFetcher(pool_size=args.workers)
+        if fetch_in_browser:
+            from siteatlas.driver_pool import DriverPool
+            from siteatlas.site_nagivation import get_site_map
+
+            with DriverPool(driver_factory(args, allowed_domains), size=args.drivers) as pool:
+                site_map = get_site_map(server.seed_url, pool, max_depth=0, allowed_domains=allowed_domains,
+                                        http_fetcher=http_fetcher, profiler=profiler)
+        else:
+            state = CrawlState(max_depth=0)
+            state.add_seed(server.seed_url, 0)
+
+            def browser_fetch_page(url: str) -> SiteMap:
+                # Without a browser, pages with buttons are read from their html alone
+                response = http_fetcher.get(url)
+                return get_links_map(response.text if response else '', url, allowed_domains, profiler=profiler)
+
+            site_map = crawl_concurrently(state,
+                                          lambda url: http_fetcher.fetch_page(url, allowed_domains, browser_fetch_page,
+                                                                              profiler=profiler),
+                                          args.workers,
+                                          profiler)
+    return {'pages': profiler.pages,
+            'urls': len(site_map.urls),
+            'phases': {phase: round(timings.total_in_seconds, 3) for phase, timings in profiler.phases.items()},
+            'counters': dict(profiler.counters)}
+
+
+def bench_http_crawl(site: SyntheticSite, args: argparse.Namespace) -> dict[str, Any]:
+    """A full crawl of the served site over http, with args.workers connections."""
+    return _crawl_over_http(site, args, fetch_in_browser=False)
+
+
+def bench_browser_crawl(site: SyntheticSite, args: argparse.Namespace) -> dict[str, Any]:
+    """A full get_site_map of the served site, rendering pages with buttons in headless Chrome."""
+    return _crawl_over_http(site, args, fetch_in_browser=True)
+
+
+def bench_button_targets(site: SyntheticSite, args: argparse.Namespace) -> dict[str, Any]:
+    """Probe the buttons on every button page in headless Chrome."""
+    from siteatlas.site_nagivation import get_button_targets
+
+    profiler = CrawlProfiler()
+    pages = 0
+    with SyntheticSiteServer(site) as server:
+        allowed_domains = {server.url.split('//')[1]}
+        driver = driver_factory(args, allowed_domains)()
+        try:
+            for page in range(site.pages):
+                if site.has_button(page):
+                    driver.get(f'{server.url}/page/{page}')
+                    get_button_targets(driver, allowed_domains, profiler=profiler)
+                    pages += 1
+        finally:
+            driver.quit()
+    return {'pages': pages, 'counters': dict(profiler.counters)}
+
+
+BENCHMARKS: dict[str, Benchmark] = {
+    'links_map': bench_links_map,
+    'site_map': bench_site_map,
+    'http_crawl': bench_http_crawl,
+}
+BROWSER_BENCHMARKS: dict[str, Benchmark] = {
+    'button_targets': bench_button_targets,
+    'browser_crawl': bench_browser_crawl,
+}
+
+
+def _run(name: str, site: SyntheticSite, args: argparse.Namespace, results: 'multiprocessing.Queue[Any]') -> None:
+    benchmark = {**BENCHMARKS, **BROWSER_BENCHMARKS}[name]
+    start = time.perf_counter()
+    result = benchmark(site, args)
+    wall_seconds = time.perf_counter() - start
+    result.update(wall_seconds=round(wall_seconds, 3),
+                  pages_per_second=round(result['pages'] / wall_seconds, 1) if wall_seconds else 0.0,
+                  # ru_maxrss is in kilobytes on Linux
+                  peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1))
+    results.put(result)
+
+
+def run_benchmark(name: str, site: SyntheticSite, args: argparse.Namespace,
+                  poll_in_seconds: float = 1.0) -> dict[str, Any]:
+    """Run a benchmark in a fresh process, so memory left over by the others does not count."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run, args=(name, site, args, results))
+    process.start()
+    while True:
+        # Checked before waiting, so a result sent just before the process exited is still read
+        exited = process.exitcode is not None
+        try:
+            result: dict[str, Any] = results.get(timeout=poll_in_seconds)
+            break
+        except queue.Empty:
+            if exited:
+                raise RuntimeError(f"Benchmark {name} exited with code {process.exitcode} without a result")
+    process.join()
+    return result
+
+
+def get_commit(ref: str = 'HEAD') -> str:
+    return subprocess.run(['git', 'rev-parse', '--short', ref], capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+def results_path(commit: str) -> str:
+    return os.path.join(RESULTS_DIRECTORY, f'{commit}.json')
+
+
+def compare(current: dict[str, Any], previous: dict[str, Any]) -> list[str]:
+    """Describe the change in each benchmark's speed and memory since a previous run."""
+    lines = [f"Compared with {previous['commit']}:"]
+    for key, result in current['benchmarks'].items():
+        before = previous['benchmarks'].get(key)
+        if not before:
+            continue
+        speed = (result['pages_per_second'] / before['pages_per_second'] - 1) * 100 if before['pages_per_second'] \
+            else 0.0
+        memory = (result['peak_rss_mb'] / before['peak_rss_mb'] - 1) * 100 if before['peak_rss_mb'] else 0.0
+        lines.append(f"  {key:<40} {speed:+7.1f}% pages/second {memory:+7.1f}% peak memory")
+    return lines
+
+
+def main(argv: Optional[list[str]] = None) -> dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=10_000)
+    parser.add_argument('--shape', choices=SHAPES, default='tree')
+    parser.add_argument('--branching', type=int, default=10)
+    parser.add_argument('--clique-size', type=int, default=20)
+    parser.add_argument('--button-every', type=int, default=0, help='make every nth page navigate with a button')
+    parser.add_argument('--workers', type=int, default=10, help='http connections for the crawl benchmarks')
+    parser.add_argument('--drivers', type=int, default=4, help='browsers for the browser benchmarks')
+    parser.add_argument('--compact', action='store_true', help='use a compact SiteMap')
+    parser.add_argument('--tuned-driver', action='store_true',
+                        help='use siteatlas.browser drivers, which block images, fonts, css and other hosts')
+    parser.add_argument('--profiles-directory', help='where --tuned-driver browsers keep their profiles and caches')
+    parser.add_argument('--assets', action='store_true', help='give every page a stylesheet, font and image')
+    parser.add_argument('--browser', action='store_true', help='also run the benchmarks that need Chrome')
+    parser.add_argument('--only', nargs='*', help='benchmarks to run, all by default')
+    parser.add_argument('--compare', help='a commit whose saved results to compare with')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+
+    site = SyntheticSite(args.pages, args.shape, args.branching, args.clique_size, args.button_every, args.assets)
+    names = list(BENCHMARKS) + (list(BROWSER_BENCHMARKS) if args.browser else [])
+    if args.only:
+        names = [name for name in names if name in args.only]
+
+    previous = None
+    if args.compare:
+        with open(results_path(get_commit(args.compare))) as f:
+            previous = json.load(f)
+
+    commit = get_commit()
+    run: dict[str, Any] = {'commit': commit,
+                           'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                           'python': platform.python_version(),
+                           'benchmarks': {}}
+    for name in names:
+        variant = ',compact' if args.compact else ''
+        if args.tuned_driver and name in BROWSER_BENCHMARKS:
+            variant += ',tuned'
+        key = f'{name}[{args.shape},{args.pages}{variant}]'
+        result = run_benchmark(name, site, args)
+        run['benchmarks'][key] = result
+        print(f"{key:<40} {result['pages_per_second']:>10.1f} pages/second {result['wall_seconds']:>8.2f}s "
+              f"{result['peak_rss_mb']:>8.1f}MB peak")
+
+    if not args.no_save:
+        # Keep results from earlier runs on this commit with other shapes and sizes
+        os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+        saved: dict[str, Any] = {'benchmarks': {}}
+        if os.path.exists(results_path(commit)):
+            with open(results_path(commit)) as f:
+                saved = json.load(f)
+        saved.update({key: value for key, value in run.items() if key != 'benchmarks'})
+        saved['benchmarks'].update(run['benchmarks'])
+        with open(results_path(commit), 'w') as f:
+            json.dump(saved, f, indent=2)
+
+    if previous:
+        print('\n'.join(compare(run, previous)))
+    return run
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Compare the memory used per url by a plain set[str] and a CompactUrlSet.
+
+python -m benchmarks.site_map_memory --urls 1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+from siteatlas.url_store import CompactUrlSet
+
+
+def generate_urls(count: int, hosts: int = 20) -> Iterator[str]:
+    """Urls shaped like a real crawl: a handful of hosts, shared directories and some query strings."""
+    for i in range(count):
+        host = f'www.site-{i % hosts}.example.com'
+        section = ('products', 'blog', 'news', 'support', 'about')[i % 5]
+        query = f'?page={i % 13}' if i % 4 == 0 else ''
+        yield f'https://{host}/{section}/{i // 1000}/item-{i}.html{query}'
+
+
+def measure(build: Callable[[], object], count: int) -> tuple[float, float]:
+    """Get the bytes per url and seconds taken to build a collection of count urls."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    collection = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del collection
+    return current / count, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--urls', type=int, default=200_000)
+    args = parser.parse_args()
+
+    for name, build in (('set[str]', lambda: set(generate_urls(args.urls))),
+                        ('CompactUrlSet', lambda: CompactUrlSet(generate_urls(args.urls)))):
+        bytes_per_url, elapsed = measure(build, args.urls)
+        print(f'{name:>14}: {bytes_per_url:7.1f} bytes/url, built in {elapsed:6.2f}s')
+
+
+if __name__ == '__main__':
+    main()
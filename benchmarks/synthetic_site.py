@@ -0,0 +1,152 @@
+"""A generated website of any size and link shape, served over http for benchmarks.
+
+Pages are built on demand from their number, so a site of a million pages costs no memory
+until it is crawled. Every page is /page/<n>, and the crawl starts from /page/0.
+"""
+import multiprocessing
+import re
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import Connection
+from typing import Any, Iterator
+
+SHAPES = ('tree', 'chain', 'fanout', 'clique')
+PAGE_PATH = re.compile(r'^/page/(\d+)$')
+# Stand ins for a site's static files, at typical sizes
+ASSETS = {
+    '/assets/site.css': ('text/css', b"@font-face{font-family:Site;src:url(/assets/site.woff2)}"
+                                     b"body{font-family:Site,sans-serif}" + b"/* padding */" * 2000),
+    '/assets/site.woff2': ('font/woff2', bytes(40_000)),
+}
+IMAGE_PATH = re.compile(r'^/assets/page-\d+\.png$')
+IMAGE_SIZE = 60_000
+
+
+@dataclass(frozen=True)
+class SyntheticSite:
+    """pages pages linked as shape:
+
+    tree - each page links to the next branching pages, about log(pages) deep
+    chain - each page links only to the next, pages deep
+    fanout - the first page links to every other page
+    clique - groups of clique_size pages all link to each other, and to the next group
+
+    Every button_every pages, one link is a button that navigates with JavaScript instead. With
+    assets, every page also loads a stylesheet, a web font and an image of its own, as real pages
+    do, to measure what a browser spends on resources that play no part in finding links.
+    """
+    pages: int = 10_000
+    shape: str = 'tree'
+    branching: int = 10
+    clique_size: int = 20
+    button_every: int = 0
+    assets: bool = False
+
+    def __post_init__(self) -> None:
+        if self.shape not in SHAPES:
+            raise ValueError(f"Unknown shape {self.shape}, expected one of {', '.join(SHAPES)}")
+
+    def links(self, page: int) -> list[int]:
+        """The pages a page links to, in order."""
+        if self.shape == 'chain':
+            targets = [page + 1]
+        elif self.shape == 'fanout':
+            targets = list(range(1, self.pages)) if page == 0 else [0]
+        elif self.shape == 'clique':
+            group_start = page - page % self.clique_size
+            targets = [other for other in range(group_start, group_start + self.clique_size) if other != page]
+            targets.append(group_start + self.clique_size)
+        else:
+            targets = list(range(page * self.branching + 1, page * self.branching + self.branching + 1))
+        return [target for target in targets if target < self.pages]
+
+    def has_button(self, page: int) -> bool:
+        return bool(self.button_every) and page % self.button_every == 0 and bool(self.links(page))
+
+    def html(self, page: int) -> str:
+        links = self.links(page)
+        button = ''
+        if self.has_button(page):
+            button = (f'<button onclick="window.location.href=\'/page/{links[0]}\'">'
+                      f'Go to page {links[0]}</button>')
+            links = links[1:]
+        anchors = ''.join(f'<li><a href="/page/{link}">Page {link}</a></li>' for link in links)
+        head, image = '', ''
+        if self.assets:
+            head = '<link rel="stylesheet" href="/assets/site.css">'
+            image = f'<img src="/assets/page-{page}.png" alt="Page {page}">'
+        return (f'<!DOCTYPE html><html lang="en"><head><title>Page {page}</title>{head}</head><body>'
+                f'<nav><a href="/page/0">Home</a> <a href="https://www.example.org/">Elsewhere</a></nav>'
+                f'<h1>Page {page}</h1>{image}<ul>{anchors}</ul>{button}</body></html>')
+
+    def urls(self, base_url: str) -> Iterator[str]:
+        return (f'{base_url}/page/{page}' for page in range(self.pages))
+
+
+def _handler_for(site: SyntheticSite) -> type[BaseHTTPRequestHandler]:
+    class SyntheticSiteHandler(BaseHTTPRequestHandler):
+        # Keep connections open, as a real server would
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are sent separately, so don't let Nagle hold the body back waiting for an ack
+        disable_nagle_algorithm = True
+
+        def send_body(self, content_type: str, body: bytes) -> None:
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path in ASSETS:
+                self.send_body(*ASSETS[self.path])
+                return
+            if IMAGE_PATH.match(self.path):
+                # Each page has its own image, so the browser's cache does not hide the cost
+                self.send_body('image/png', bytes(IMAGE_SIZE))
+                return
+            match = PAGE_PATH.match(self.path)
+            if match is None or int(match.group(1)) >= site.pages:
+                self.send_error(404)
+                return
+            self.send_body('text/html; charset=utf-8', site.html(int(match.group(1))).encode())
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return SyntheticSiteHandler
+
+
+def _serve(site: SyntheticSite, port_connection: Connection) -> None:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _handler_for(site))
+    server.daemon_threads = True
+    port_connection.send(server.server_address[1])
+    server.serve_forever()
+
+
+class SyntheticSiteServer:
+    """Serves a SyntheticSite on a free local port until closed.
+
+    The server runs in its own process, so it does not compete with the crawl being measured for the GIL.
+    """
+
+    def __init__(self, site: SyntheticSite) -> None:
+        self.site = site
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.get_context('spawn').Process(target=_serve, args=(site, sender), daemon=True)
+        self._process.start()
+        self.url = f'http://127.0.0.1:{receiver.recv()}'
+
+    @property
+    def seed_url(self) -> str:
+        return f'{self.url}/page/0'
+
+    def close(self) -> None:
+        self._process.terminate()
+        self._process.join()
+
+    def __enter__(self) -> 'SyntheticSiteServer':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
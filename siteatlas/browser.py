@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+from typing import Iterable, Optional, Sequence
+from urllib.parse import urlsplit
+
+from selenium import webdriver
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+# Url patterns for each type of resource that plays no part in finding links
+RESOURCE_PATTERNS: dict[str, tuple[str, ...]] = {
+    'image': ('*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico', '*.bmp'),
+    'media': ('*.mp4', '*.webm', '*.ogg', '*.mp3', '*.wav', '*.m4a', '*.mov', '*.m3u8'),
+    'font': ('*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'),
+    'stylesheet': ('*.css',),
+}
+DEFAULT_BLOCKED_RESOURCES = ('image', 'media', 'font', 'stylesheet')
+
+# Chrome holds one of these in a user data directory while a browser is using it
+PROFILE_LOCK_FILES = ('SingletonLock', 'lockfile')
+
+CRAWL_ARGUMENTS = (
+    '--headless=new',
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--mute-audio',
+    '--no-first-run',
+)
+
+
+def blocked_url_patterns(blocked_resources: Iterable[str] = DEFAULT_BLOCKED_RESOURCES) -> list[str]:
+    """The patterns to give Network.setBlockedURLs to block the given types of resource."""
+    patterns: list[str] = []
+    for resource in blocked_resources:
+        if resource not in RESOURCE_PATTERNS:
+            raise ValueError(f"Unknown resource type {resource}, expected one of {', '.join(RESOURCE_PATTERNS)}")
+        patterns.extend(RESOURCE_PATTERNS[resource])
+    return patterns
+
+
+def host_resolver_rules(allowed_domains: Iterable[str]) -> str:
+    """Chrome --host-resolver-rules that fail to resolve every host but the allowed ones.
+
+    Third party scripts, trackers and embeds never load, and take no time to fail. Ports are
+    dropped from the allowed domains, as the rules match host names only. Subdomain rules, see
+    DomainMatcher, are passed on as Chrome's own *.example.com patterns.
+    """
+    hosts = set()
+    for domain in allowed_domains:
+        host = urlsplit(f'//{domain}').hostname or domain
+        if not host:
+            # Crawls of local files have an empty netloc, which no host needs resolving for
+            continue
+        if host.startswith('.'):
+            hosts.update({host[1:], f'*{host}'})
+        else:
+            hosts.add(host)
+    return ', '.join(['MAP * ~NOTFOUND'] + [f'EXCLUDE {host}' for host in sorted(hosts)])
+
+
+def build_crawl_options(allowed_domains: Optional[Iterable[str]] = None,
+                        page_load_strategy: str = 'eager',
+                        profile_directory: Optional[str] = None,
+                        blocked_resources: Sequence[str] = DEFAULT_BLOCKED_RESOURCES,
+                        window_size: tuple[int, int] = (1280, 1024)) -> webdriver.ChromeOptions:
+    """ChromeOptions for a headless browser tuned to find links rather than show pages.
+
+    With the 'eager' page load strategy driver.get returns once the DOM is ready rather than
+    after every subresource has loaded; use a PageReadiness to wait for pages that render their
+    links later. If allowed_domains is given, hosts outside it are never resolved. Giving a
+    profile_directory keeps the browser's cache, cookies and compiled scripts between runs.
+    """
+    options = webdriver.ChromeOptions()
+    for argument in CRAWL_ARGUMENTS:
+        options.add_argument(argument)
+    options.add_argument(f'--window-size={window_size[0]},{window_size[1]}')
+    if allowed_domains is not None:
+        options.add_argument(f'--host-resolver-rules={host_resolver_rules(allowed_domains)}')
+    if profile_directory:
+        options.add_argument(f'--user-data-dir={os.path.abspath(profile_directory)}')
+    if 'image' in blocked_resources:
+        # Also blocks images whose urls match no pattern
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    options.page_load_strategy = page_load_strategy
+    return options
+
+
+def block_resources(driver: WebDriver, blocked_resources: Sequence[str] = DEFAULT_BLOCKED_RESOURCES) -> None:
+    """Have the browser fail requests for the given types of resource through the DevTools protocol."""
+    patterns = blocked_url_patterns(blocked_resources)
+    if patterns:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+
+def create_crawl_driver(allowed_domains: Optional[Iterable[str]] = None,
+                        page_load_strategy: str = 'eager',
+                        profile_directory: Optional[str] = None,
+                        blocked_resources: Sequence[str] = DEFAULT_BLOCKED_RESOURCES) -> WebDriver:
+    """Start a headless Chrome tuned for crawling, see build_crawl_options."""
+    options = build_crawl_options(allowed_domains, page_load_strategy, profile_directory, blocked_resources)
+    driver = webdriver.Chrome(options=options)
+    try:
+        block_resources(driver, blocked_resources)
+    except Exception:
+        driver.quit()
+        raise
+    return driver
+
+
+class CrawlDriverFactory:
+    """Creates tuned crawl drivers for a DriverPool, each with a profile of its own that outlives it.
+
+    Chrome will not share a profile between running browsers, so every driver takes the first
+    profile under profiles_directory that no running browser holds. Drivers that replace
+    recycled ones pick up their profiles, and with them the warm cache.
+    """
+
+    def __init__(self,
+                 allowed_domains: Optional[Iterable[str]] = None,
+                 page_load_strategy: str = 'eager',
+                 profiles_directory: Optional[str] = None,
+                 blocked_resources: Sequence[str] = DEFAULT_BLOCKED_RESOURCES) -> None:
+        self.allowed_domains = set(allowed_domains) if allowed_domains is not None else None
+        self.page_load_strategy = page_load_strategy
+        self.profiles_directory = profiles_directory
+        self.blocked_resources = blocked_resources
+        self._lock = threading.Lock()
+        # Profiles handed out whose browser may not have locked them yet
+        self._starting: set[str] = set()
+
+    def _claim_profile(self) -> Optional[str]:
+        if not self.profiles_directory:
+            return None
+        with self._lock:
+            index = 0
+            while True:
+                profile = os.path.join(self.profiles_directory, f'profile-{index}')
+                locked = any(os.path.lexists(os.path.join(profile, lock)) for lock in PROFILE_LOCK_FILES)
+                if not locked and profile not in self._starting:
+                    self._starting.add(profile)
+                    return profile
+                index += 1
+
+    def __call__(self) -> WebDriver:
+        profile = self._claim_profile()
+        try:
+            if profile:
+                logging.info(f"Starting crawl driver with profile {profile}")
+            return create_crawl_driver(self.allowed_domains, self.page_load_strategy, profile,
+                                       self.blocked_resources)
+        finally:
+            if profile:
+                with self._lock:
+                    self._starting.discard(profile)
@@ -0,0 +1,216 @@
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+from siteatlas.url_functions import get_absolute_url
+
+# Returns the outerHTML of every button on the page in one round trip
+BUTTON_HTML_SCRIPT = """
+return Array.prototype.map.call(document.querySelectorAll('button'), function (button) {
+    return button.outerHTML;
+});
+"""
+
+# Installs hooks that record, and where possible cancel, any navigation started while a button is being clicked.
+# window.location cannot be redefined, so assignments to it are caught through the Navigation API's navigate event.
+NAVIGATION_HOOKS_SCRIPT = """
+if (window.__siteatlasProbe) {
+    return;
+}
+var probe = window.__siteatlasProbe = {
+    targets: [], listeners: [], mutations: 0, pendingTimers: 0, clicking: false, timeoutMs: 0,
+    setTimeout: window.setTimeout
+};
+probe.notify = function () {
+    var listeners = probe.listeners;
+    probe.listeners = [];
+    listeners.forEach(function (listener) { listener(); });
+};
+probe.record = function (url) {
+    if (url === undefined || url === null) {
+        return;
+    }
+    try {
+        probe.targets.push(new URL(String(url), document.baseURI).href);
+    } catch (e) {
+        return;
+    }
+    probe.notify();
+};
+
+var open = window.open;
+window.open = function (url) {
+    if (!probe.clicking) {
+        return open.apply(window, arguments);
+    }
+    probe.record(url);
+    return null;
+};
+['pushState', 'replaceState'].forEach(function (name) {
+    var original = history[name];
+    history[name] = function (state, title, url) {
+        if (!probe.clicking) {
+            return original.apply(history, arguments);
+        }
+        probe.record(url);
+    };
+});
+if (window.navigation) {
+    window.navigation.addEventListener('navigate', function (event) {
+        if (!probe.clicking) {
+            return;
+        }
+        probe.record(event.destination.url);
+        if (event.cancelable) {
+            event.preventDefault();
+        }
+    });
+}
+
+// Count timers started by a click so we can wait for them to fire rather than for a fixed time
+window.setTimeout = function (handler, delay) {
+    if (!probe.clicking || typeof handler !== 'function' || (delay || 0) > probe.timeoutMs) {
+        return probe.setTimeout.apply(window, arguments);
+    }
+    var args = Array.prototype.slice.call(arguments, 2);
+    probe.pendingTimers += 1;
+    return probe.setTimeout.call(window, function () {
+        try {
+            handler.apply(window, args);
+        } finally {
+            probe.pendingTimers -= 1;
+            probe.notify();
+        }
+    }, delay);
+};
+
+new MutationObserver(function () { probe.mutations += 1; })
+    .observe(document, {childList: true, subtree: true});
+"""
+
+# Clicks the button at arguments[0] and calls back once it has navigated, or all the timers it started have fired,
+# or arguments[1] milliseconds have passed - whichever comes first.
+CLICK_BUTTON_SCRIPT = """
+var index = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var probe = window.__siteatlasProbe;
+if (!probe) {
+    done(null);
+    return;
+}
+var button = document.querySelectorAll('button')[index];
+if (!button) {
+    done({targets: [], mutated: true});
+    return;
+}
+var targetsBefore = probe.targets.length, mutationsBefore = probe.mutations, finished = false;
+function finish() {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    probe.clicking = false;
+    done({targets: probe.targets.slice(targetsBefore), mutated: probe.mutations !== mutationsBefore});
+}
+function settle() {
+    if (probe.targets.length > targetsBefore || probe.pendingTimers === 0) {
+        finish();
+    } else {
+        probe.listeners.push(settle);
+    }
+}
+probe.timeoutMs = timeoutMs;
+probe.clicking = true;
+probe.setTimeout.call(window, finish, timeoutMs);
+button.scrollIntoView();
+['mousedown', 'mouseup', 'click'].forEach(function (type) {
+    button.dispatchEvent(new MouseEvent(type, {bubbles: true, cancelable: true, view: window}));
+});
+// Let promise callbacks run first, then wait on any timers the click started
+probe.setTimeout.call(window, settle, 0);
+"""
+
+
+@dataclass
+class ButtonProbeResult:
+    urls: set[str] = field(default_factory=set)
+    buttons_probed: int = 0
+    reloads: int = 0
+
+
+def get_button_fingerprints(driver: WebDriver) -> list[str]:
+    """Hash every button on the page, in document order, with a single script call."""
+    button_html = driver.execute_script(BUTTON_HTML_SCRIPT)
+    return [hashlib.md5(html.encode()).hexdigest() for html in button_html]
+
+
+def install_navigation_hooks(driver: WebDriver) -> None:
+    driver.execute_script(NAVIGATION_HOOKS_SCRIPT)
+
+
+def click_button(driver: WebDriver, index: int, timeout_in_seconds: float) -> Optional[dict[str, Any]]:
+    """Click a button, returning the urls it tried to open or None if the page navigated away."""
+    try:
+        result: Optional[dict[str, Any]] = driver.execute_async_script(CLICK_BUTTON_SCRIPT, index,
+                                                                       int(timeout_in_seconds * 1000))
+        return result
+    except WebDriverException as e:
+        # The page unloaded before the script could call back
+        logging.info(f"Page navigated while clicking button {index} got {e}")
+        return None
+
+
+def return_to_page(driver: WebDriver, base_url: str) -> None:
+    driver.back()
+    if driver.current_url != base_url:
+        driver.get(base_url)
+    install_navigation_hooks(driver)
+
+
+def probe_buttons(driver: WebDriver, timeout_in_seconds: float = 1.0) -> ButtonProbeResult:
+    """Click every distinct button on the current page and collect the urls they navigate to.
+
+    Navigation is caught and cancelled inside the page where the browser allows it; only a button
+    that really leaves the page costs a trip back to it.
+    """
+    base_url = driver.current_url
+    result = ButtonProbeResult()
+    install_navigation_hooks(driver)
+
+    seen: set[str] = set()
+    fingerprints = get_button_fingerprints(driver)
+    index = 0
+    while index < len(fingerprints):
+        fingerprint = fingerprints[index]
+        if fingerprint in seen:
+            index += 1
+            continue
+        seen.add(fingerprint)
+        result.buttons_probed += 1
+
+        clicked = click_button(driver, index, timeout_in_seconds)
+        if clicked is None:
+            # Hooks could not stop the navigation - record where we ended up and go back
+            if driver.current_url != base_url:
+                result.urls.add(driver.current_url)
+            return_to_page(driver, base_url)
+            result.reloads += 1
+            fingerprints = get_button_fingerprints(driver)
+            index = 0
+            continue
+
+        result.urls.update(str(url) for url in clicked['targets'])
+        if clicked['mutated']:
+            # The click changed the page, so buttons may have been added or removed
+            fingerprints = get_button_fingerprints(driver)
+            index = 0
+        else:
+            index += 1
+
+    # Strip fragments and drop navigation back to the page itself
+    result.urls = {get_absolute_url(base_url, url) for url in result.urls} - {get_absolute_url(base_url, base_url)}
+    logging.info(f"Probed {result.buttons_probed} buttons on {base_url} with {result.reloads} reloads")
+    return result
@@ -0,0 +1,131 @@
+import logging
+import sqlite3
+from typing import Callable, Optional, Sequence
+
+from siteatlas.crawler import CrawlListener, CrawlState, Frontier
+from siteatlas.site_map import SiteMap
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    queued INTEGER NOT NULL,
+    fetched INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS ignored_urls (
+    url TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS skipped_urls (
+    url TEXT PRIMARY KEY
+);
+CREATE INDEX IF NOT EXISTS urls_to_fetch ON urls (fetched, depth);
+"""
+
+
+class SqliteCrawlStore(CrawlListener):
+    """Saves a crawl's state to SQLite as it runs, so an interrupted crawl can be resumed.
+
+    Changes are buffered and written batch_size at a time, each batch in one transaction. A page
+    is only marked fetched in the same batch as the urls found on it, so after a crash the worst
+    case is refetching the pages of the last unwritten batch.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self._new_urls: list[tuple[str, int, int]] = []
+        self._new_ignored_urls: list[tuple[str]] = []
+        self._new_skipped_urls: list[tuple[str]] = []
+        self._fetched_urls: list[tuple[str]] = []
+
+    def _pending(self) -> int:
+        return (len(self._new_urls) + len(self._new_ignored_urls) + len(self._new_skipped_urls)
+                + len(self._fetched_urls))
+
+    def _maybe_flush(self) -> None:
+        if self._pending() >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered changes."""
+        if not self._pending():
+            return
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO urls (url, depth, queued) VALUES (?, ?, ?)',
+                                        self._new_urls)
+            self.connection.executemany('INSERT OR IGNORE INTO ignored_urls (url) VALUES (?)',
+                                        self._new_ignored_urls)
+            self.connection.executemany('INSERT OR IGNORE INTO skipped_urls (url) VALUES (?)',
+                                        self._new_skipped_urls)
+            self.connection.executemany('UPDATE urls SET fetched = 1 WHERE url = ?', self._fetched_urls)
+        self._new_urls.clear()
+        self._new_ignored_urls.clear()
+        self._new_skipped_urls.clear()
+        self._fetched_urls.clear()
+
+    def urls_added(self, urls: Sequence[str], depth: int, queued: bool) -> None:
+        self._new_urls.extend((url, depth, int(queued)) for url in urls)
+        self._maybe_flush()
+
+    def ignored_urls_added(self, urls: Sequence[str]) -> None:
+        self._new_ignored_urls.extend((url,) for url in urls)
+        self._maybe_flush()
+
+    def urls_skipped(self, urls: Sequence[str], depth: int) -> None:
+        self._new_skipped_urls.extend((url,) for url in urls)
+        self._maybe_flush()
+
+    def page_fetched(self, url: str, depth: int, page_map: SiteMap) -> None:
+        self._fetched_urls.append((url,))
+        self._maybe_flush()
+
+    def crawl_stopped(self) -> None:
+        self.flush()
+
+    def load_state(self,
+                   max_depth: int = 10,
+                   site_map: Optional[SiteMap] = None,
+                   url_filter: Optional[Callable[[str], bool]] = None,
+                   frontier: Optional[Frontier] = None,
+                   page_filter: Optional[Callable[[str], bool]] = None) -> CrawlState:
+        """Rebuild the last checkpointed state, listening to it so new changes are saved too.
+
+        Urls that have not been fetched go back on the frontier, shallowest first.
+        """
+        self.flush()
+        state = CrawlState(site_map=site_map if site_map is not None else SiteMap(),
+                           max_depth=max_depth,
+                           url_filter=url_filter,
+                           page_filter=page_filter,
+                           frontier=frontier if frontier is not None else Frontier())
+        for url, depth in self.connection.execute('SELECT url, depth FROM urls'):
+            state.site_map.urls.add(url)
+            state.depths[url] = depth
+        state.site_map.ignored_urls.update(url for url, in self.connection.execute('SELECT url FROM ignored_urls'))
+        state.site_map.skipped_urls.update(url for url, in self.connection.execute('SELECT url FROM skipped_urls'))
+
+        # Checked against max_depth and url_filter again, in case they have changed since the crawl was stopped
+        to_fetch = self.connection.execute('SELECT url, depth FROM urls WHERE fetched = 0 ORDER BY depth, rowid')
+        for url, depth in to_fetch:
+            if state.within_depth(depth) and (url_filter is None or url_filter(url)):
+                state.frontier.push(url, depth)
+
+        if state.depths:
+            logging.info(f"Resuming crawl from {self.path} with {len(state.site_map.urls)} urls, "
+                         f"{len(state.frontier)} left to fetch")
+        state.listeners.append(self)
+        return state
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self) -> 'SqliteCrawlStore':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
@@ -0,0 +1,305 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, MutableMapping, Optional, Sequence
+
+from siteatlas.profiling import CrawlProfiler, NO_PROFILER, PAGE
+from siteatlas.site_map import SiteMap
+from siteatlas.url_store import CompactUrlSet, CompactDepthMap
+
+# Fetches a single page and returns the urls found on it
+PageFetcher = Callable[[str], SiteMap]
+
+
+class RetryLater(Exception):
+    """Raised by a fetcher when a page could not be fetched now but may be later, e.g. its host answered 429 or 503."""
+
+
+class Frontier:
+    """First in, first out queue of urls waiting to be fetched - gives a breadth first crawl."""
+
+    def __init__(self) -> None:
+        self._queue: deque[tuple[str, int]] = deque()
+
+    def push(self, url: str, depth: int) -> None:
+        self._queue.append((url, depth))
+
+    def pop(self) -> tuple[str, int]:
+        return self._queue.popleft()
+
+    def pop_ready(self) -> Optional[tuple[str, int]]:
+        """Take the next url if one can be fetched now, without waiting."""
+        return self._queue.popleft() if self._queue else None
+
+    def seconds_until_ready(self) -> Optional[float]:
+        """How long until pop_ready has an url, or None if that waits on a fetch finishing."""
+        return 0.0 if self._queue else None
+
+    def task_done(self, url: str) -> None:
+        """An url taken from the frontier has been fetched."""
+
+    def retry(self, url: str, depth: int) -> bool:
+        """Queue an url whose fetch should be retried later, returning whether it was.
+
+        A plain frontier has no way to wait, so gives up on the url rather than hammer its host.
+        """
+        return False
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+
+class CrawlListener:
+    """Told about every change made to a CrawlState, e.g. to persist or report on a crawl.
+
+    Override the methods you need - they all do nothing by default.
+    """
+
+    def urls_added(self, urls: Sequence[str], depth: int, queued: bool) -> None:
+        """New allowed urls were found at depth, and queued for fetching if within max_depth."""
+
+    def ignored_urls_added(self, urls: Sequence[str]) -> None:
+        """New disallowed urls were found."""
+
+    def urls_skipped(self, urls: Sequence[str], depth: int) -> None:
+        """New allowed urls were found at depth, but the url filter chose not to fetch them."""
+
+    def page_fetched(self, url: str, depth: int, page_map: SiteMap) -> None:
+        """A page was fetched and the urls on it merged into the state."""
+
+    def crawl_stopped(self) -> None:
+        """The crawl finished, or was stopped by an error."""
+
+
+@dataclass(frozen=True)
+class FoundUrl:
+    """An url found by a crawl, as it is found."""
+    url: str
+    depth: int
+    # The page the url was linked from, None for seeds
+    source: Optional[str]
+    # False for urls outside the allowed domains
+    allowed: bool
+
+
+@dataclass
+class CrawlState:
+    """Everything a crawl knows: the urls seen so far, the depth each was found at and the urls still to fetch."""
+    site_map: SiteMap = field(default_factory=SiteMap)
+    frontier: Frontier = field(default_factory=Frontier)
+    depths: MutableMapping[str, int] = field(default_factory=dict)
+    max_depth: int = 10
+    listeners: list[CrawlListener] = field(default_factory=list)
+    # Urls this returns False for are never fetched, and recorded in the site map's skipped_urls instead,
+    # e.g. crawler traps or those disallowed by robots.txt
+    url_filter: Optional[Callable[[str], bool]] = None
+    # Fetched pages this returns False for, e.g. duplicates of another page, have their links passed to
+    # listeners but not followed, and are recorded in the site map's skipped_urls too
+    page_filter: Optional[Callable[[str], bool]] = None
+
+    def __post_init__(self) -> None:
+        # Keep depths compact too, rather than holding a str for every url
+        if isinstance(self.site_map.urls, CompactUrlSet) and isinstance(self.depths, dict) and not self.depths:
+            self.depths = CompactDepthMap(self.site_map.urls)
+
+    def within_depth(self, depth: int) -> bool:
+        # A max_depth of 0 means no limit
+        return not self.max_depth or depth < self.max_depth
+
+    def add_seed(self, url: str, depth: int) -> bool:
+        """Queue an url to start crawling from, returning whether it was added."""
+        # Seeds are always fetched, even if an earlier crawl already found them
+        if url in self.depths or url in self.site_map.skipped_urls or not self.within_depth(depth):
+            return False
+        if self.url_filter is not None and not self.url_filter(url):
+            logging.info(f"Not fetching seed {url}")
+            self.site_map.skipped_urls.add(url)
+            for listener in self.listeners:
+                listener.urls_skipped([url], depth)
+            return False
+        self.site_map.urls.add(url)
+        self.depths[url] = depth
+        self.frontier.push(url, depth)
+        for listener in self.listeners:
+            listener.urls_added([url], depth, True)
+        return True
+
+    def add_urls(self, urls: Iterable[str], depth: int) -> list[str]:
+        """Record allowed urls found at depth, queueing any not seen before. Returns those that were new.
+
+        Urls within max_depth that the url filter rejects are skipped rather than recorded.
+        """
+        queued_urls, unqueued_urls, skipped_urls = [], [], []
+        for new_url in dict.fromkeys(urls):
+            if new_url in self.site_map.urls or new_url in self.site_map.skipped_urls:
+                continue
+            if not self.within_depth(depth):
+                unqueued_urls.append(new_url)
+            elif self.url_filter is None or self.url_filter(new_url):
+                self.frontier.push(new_url, depth)
+                queued_urls.append(new_url)
+            else:
+                skipped_urls.append(new_url)
+
+        new_urls = queued_urls + unqueued_urls
+        self.site_map.urls.update(new_urls)
+        for new_url in new_urls:
+            self.depths[new_url] = depth
+        self.site_map.skipped_urls.update(skipped_urls)
+
+        for listener in self.listeners:
+            if queued_urls:
+                listener.urls_added(queued_urls, depth, True)
+            if unqueued_urls:
+                listener.urls_added(unqueued_urls, depth, False)
+            if skipped_urls:
+                listener.urls_skipped(skipped_urls, depth)
+        return new_urls
+
+    def add_page(self, url: str, depth: int, page_map: SiteMap) -> tuple[list[str], list[str]]:
+        """Merge the urls found on a page fetched at depth, queueing any not seen before.
+
+        Returns the allowed and ignored urls that were new.
+        """
+        if self.page_filter is not None and not self.page_filter(url):
+            logging.info(f"Not following the links on {url}")
+            self.site_map.skipped_urls.add(url)
+            for listener in self.listeners:
+                listener.urls_skipped([url], depth)
+                listener.page_fetched(url, depth, page_map)
+            return [], []
+        new_urls = self.add_urls(page_map.urls, depth + 1)
+        new_ignored_urls = [ignored_url for ignored_url in page_map.ignored_urls
+                            if ignored_url not in self.site_map.ignored_urls]
+        self.site_map.ignored_urls.update(new_ignored_urls)
+
+        for listener in self.listeners:
+            if new_ignored_urls:
+                listener.ignored_urls_added(new_ignored_urls)
+            listener.page_fetched(url, depth, page_map)
+        return new_urls, new_ignored_urls
+
+    def stop(self) -> None:
+        for listener in self.listeners:
+            listener.crawl_stopped()
+
+
+def _found_urls(url: str, depth: int, new_urls: list[str], new_ignored_urls: list[str]) -> Iterator[FoundUrl]:
+    for new_url in new_urls:
+        yield FoundUrl(new_url, depth + 1, url, True)
+    for ignored_url in new_ignored_urls:
+        yield FoundUrl(ignored_url, depth + 1, url, False)
+
+
+def _fetch_timed(fetch_page: PageFetcher, url: str, profiler: CrawlProfiler) -> SiteMap:
+    with profiler.span(PAGE, url):
+        return fetch_page(url)
+
+
+def _retry_later(state: CrawlState, url: str, depth: int, error: RetryLater) -> None:
+    if state.frontier.retry(url, depth):
+        logging.info(f"Will retry {url} later, {error}")
+    else:
+        logging.warning(f"Giving up on {url}, {error}")
+
+
+def _log_completed(state: CrawlState) -> None:
+    logging.info(f"Completed crawl with {len(state.site_map.urls)} allowed urls "
+                 f"and {len(state.site_map.ignored_urls)} disallowed urls")
+
+
+def iter_crawl(state: CrawlState,
+               fetch_page: PageFetcher,
+               profiler: Optional[CrawlProfiler] = None) -> Iterator[FoundUrl]:
+    """Fetch pages from the frontier until it is empty, yielding each new url as soon as it is found."""
+    if profiler is None:
+        profiler = NO_PROFILER
+    try:
+        while state.frontier:
+            url, depth = state.frontier.pop()
+            logging.info(f"Fetching {url} at depth {depth}")
+            try:
+                page_map = _fetch_timed(fetch_page, url, profiler)
+            except RetryLater as e:
+                _retry_later(state, url, depth, e)
+                continue
+            finally:
+                state.frontier.task_done(url)
+            with profiler.span('merge'):
+                new_urls, new_ignored_urls = state.add_page(url, depth, page_map)
+            logging.info(f"Found {len(new_urls)} new urls on {url}, {len(state.frontier)} urls left to fetch")
+            yield from _found_urls(url, depth, new_urls, new_ignored_urls)
+    finally:
+        state.stop()
+    _log_completed(state)
+
+
+def iter_crawl_concurrently(state: CrawlState,
+                            fetch_page: PageFetcher,
+                            workers: int,
+                            profiler: Optional[CrawlProfiler] = None) -> Iterator[FoundUrl]:
+    """Fetch pages from the frontier on a pool of worker threads until it is empty, yielding each new url.
+
+    Workers only fetch; their results are merged into the state by this thread alone, so the
+    site map needs no locking. Pages finish out of order, so a url reached by two paths may be
+    given the depth of the longer one if that page finished first.
+
+    Urls are only taken from the frontier when it says they are ready, so a rate limited frontier
+    such as HostScheduler holds workers back rather than blocking them.
+    """
+    if profiler is None:
+        profiler = NO_PROFILER
+    in_flight: dict[Future[SiteMap], tuple[str, int]] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='siteatlas') as executor:
+            while state.frontier or in_flight:
+                while len(in_flight) < workers:
+                    next_url = state.frontier.pop_ready()
+                    if next_url is None:
+                        break
+                    url, depth = next_url
+                    logging.info(f"Fetching {url} at depth {depth}")
+                    in_flight[executor.submit(_fetch_timed, fetch_page, url, profiler)] = (url, depth)
+
+                if not in_flight:
+                    # Every url left is waiting for its host's rate limit
+                    time.sleep(state.frontier.seconds_until_ready() or 0.0)
+                    continue
+                # With every worker busy nothing more can start, so only a fetch finishing matters
+                timeout = state.frontier.seconds_until_ready() if len(in_flight) < workers else None
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = in_flight.pop(future)
+                    state.frontier.task_done(url)
+                    try:
+                        page_map = future.result()
+                    except RetryLater as e:
+                        _retry_later(state, url, depth, e)
+                        continue
+                    with profiler.span('merge'):
+                        new_urls, new_ignored_urls = state.add_page(url, depth, page_map)
+                    logging.info(f"Found {len(new_urls)} new urls on {url}, "
+                                 f"{len(state.frontier)} urls left to fetch")
+                    yield from _found_urls(url, depth, new_urls, new_ignored_urls)
+    finally:
+        state.stop()
+    _log_completed(state)
+
+
+def crawl(state: CrawlState, fetch_page: PageFetcher, profiler: Optional[CrawlProfiler] = None) -> SiteMap:
+    """Fetch pages from the frontier until it is empty."""
+    for _ in iter_crawl(state, fetch_page, profiler):
+        pass
+    return state.site_map
+
+
+def crawl_concurrently(state: CrawlState,
+                       fetch_page: PageFetcher,
+                       workers: int,
+                       profiler: Optional[CrawlProfiler] = None) -> SiteMap:
+    """Fetch pages from the frontier on a pool of worker threads until it is empty, see iter_crawl_concurrently."""
+    for _ in iter_crawl_concurrently(state, fetch_page, workers, profiler):
+        pass
+    return state.site_map
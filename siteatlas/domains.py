@@ -0,0 +1,224 @@
+import ipaddress
+import os
+import threading
+from typing import Iterable, Optional, Union
+from urllib.parse import urlsplit
+
+# A snapshot of https://publicsuffix.org/list/public_suffix_list.dat, so no network is needed
+PUBLIC_SUFFIX_LIST = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'public_suffix_list.dat')
+PRIVATE_DOMAINS_MARKER = '// ===BEGIN PRIVATE DOMAINS==='
+
+# Keys in a LabelTrie node marking what the labels leading to it are, alongside the child labels.
+# Neither can be a label of a host name.
+RULE = '.'
+EXCEPTION = '!'
+
+# Nested dicts keyed by domain labels from the top level domain down, e.g. uk -> co -> RULE for co.uk
+LabelTrie = dict[str, 'LabelTrie']
+
+
+def split_host(netloc: str) -> list[str]:
+    """The labels of a netloc's host, without port or user, from the top level domain down."""
+    host = netloc.rsplit('@', 1)[-1]
+    if host.startswith('['):
+        return [host]
+    return host.split(':', 1)[0].rstrip('.').lower().split('.')[::-1]
+
+
+def get_netloc(url: str) -> str:
+    """The netloc of an absolute url, without the cost of fully parsing it."""
+    scheme_end = url.find('://')
+    if scheme_end == -1:
+        return urlsplit(url).netloc
+    netloc_start = scheme_end + 3
+    for index in range(netloc_start, len(url)):
+        if url[index] in '/?#':
+            return url[netloc_start:index]
+    return url[netloc_start:]
+
+
+def _add_rule(trie: LabelTrie, labels: list[str], marker: str) -> None:
+    node = trie
+    for label in labels:
+        node = node.setdefault(label, {})
+    node[marker] = {}
+
+
+def _idna(rule: str) -> Optional[str]:
+    try:
+        return rule.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+
+
+class PublicSuffixes:
+    """The public suffix list compiled into a reversed label trie, which finds a host's suffix in O(labels).
+
+    The list is read from the bundled snapshot the first time it is needed. Like browsers, and
+    tldextract by default, only the ICANN section is used unless include_private_domains is set.
+    """
+
+    def __init__(self, path: str = PUBLIC_SUFFIX_LIST, include_private_domains: bool = False) -> None:
+        self.path = path
+        self.include_private_domains = include_private_domains
+        self._trie: Optional[LabelTrie] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> LabelTrie:
+        trie: LabelTrie = {}
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line == PRIVATE_DOMAINS_MARKER and not self.include_private_domains:
+                    break
+                if not line or line.startswith('//'):
+                    continue
+                marker = EXCEPTION if line.startswith('!') else RULE
+                rule = line.lstrip('!')
+                # Urls hold internationalised domains in their ascii form, so add both
+                for form in {rule, _idna(rule) or rule}:
+                    _add_rule(trie, form.split('.')[::-1], marker)
+        return trie
+
+    @property
+    def trie(self) -> LabelTrie:
+        if self._trie is None:
+            with self._lock:
+                if self._trie is None:
+                    self._trie = self._load()
+        return self._trie
+
+    def suffix_length(self, labels: list[str]) -> int:
+        """How many of a host's labels, given from the top level domain down, are its public suffix."""
+        node = self.trie
+        # A top level domain missing from the list is still a public suffix
+        length = 1
+        for depth, label in enumerate(labels):
+            child = node.get(label)
+            if child is not None and EXCEPTION in child:
+                return depth
+            wildcard = node.get('*')
+            if (child is not None and RULE in child) or (wildcard is not None and RULE in wildcard):
+                length = depth + 1
+            if child is None:
+                break
+            node = child
+        return min(length, len(labels))
+
+    def public_suffix(self, host: str) -> str:
+        labels = split_host(host)
+        return '.'.join(reversed(labels[:self.suffix_length(labels)]))
+
+    def registered_domain(self, host: str) -> Optional[str]:
+        """The public suffix and one label more, e.g. bbc.co.uk for www.bbc.co.uk, or None for a bare suffix or ip."""
+        labels = split_host(host)
+        if _is_ip_address(labels):
+            return None
+        length = self.suffix_length(labels)
+        if len(labels) <= length:
+            return None
+        return '.'.join(reversed(labels[:length + 1]))
+
+    def is_public_suffix(self, host: str) -> bool:
+        labels = split_host(host)
+        return self.suffix_length(labels) == len(labels)
+
+
+def _is_ip_address(labels: list[str]) -> bool:
+    try:
+        ipaddress.ip_address('.'.join(reversed(labels)).strip('[]'))
+        return True
+    except ValueError:
+        return False
+
+
+PUBLIC_SUFFIXES = PublicSuffixes()
+
+# The allowed domains of a crawl, as rules or a DomainMatcher already built from them
+AllowedDomains = Union[Iterable[str], 'DomainMatcher']
+
+
+class DomainMatcher:
+    """Decides whether urls are on an allowed domain.
+
+    Each rule in allowed_domains is one of:
+    example.com or example.com:8080 - exactly that netloc, as the crawl has always matched
+    *.example.com - any subdomain of example.com, on any port, but not example.com itself
+    .example.com - example.com and any subdomain of it, on any port
+
+    Exact rules are a set lookup and subdomain rules a walk down a reversed label trie, so
+    matching costs O(labels) however many rules there are. Rules that would allow a whole public
+    suffix, like *.co.uk, are refused.
+    """
+
+    def __init__(self, allowed_domains: Iterable[str], public_suffixes: PublicSuffixes = PUBLIC_SUFFIXES) -> None:
+        self.rules = frozenset(allowed_domains)
+        self.netlocs: set[str] = set()
+        self.trie: LabelTrie = {}
+        for rule in self.rules:
+            rule = rule.lower()
+            if rule.startswith('*.') or rule.startswith('.'):
+                domain = rule.lstrip('*').lstrip('.')
+                if public_suffixes.is_public_suffix(domain):
+                    raise ValueError(f"{rule} would allow every site under the public suffix {domain}")
+                # RULE marks the domain itself, '*' any subdomain of it
+                markers = ['*'] if rule.startswith('*') else ['*', RULE]
+                for marker in markers:
+                    _add_rule(self.trie, split_host(domain), marker)
+            else:
+                self.netlocs.add(rule)
+
+    def matches_netloc(self, netloc: str) -> bool:
+        if netloc in self.netlocs or netloc.lower() in self.netlocs:
+            return True
+        if not self.trie:
+            return False
+        node = self.trie
+        labels = split_host(netloc)
+        for depth, label in enumerate(labels):
+            child = node.get(label)
+            if child is None:
+                return False
+            if depth < len(labels) - 1 and '*' in child:
+                return True
+            node = child
+        return RULE in node
+
+    def matches(self, url: str) -> bool:
+        return self.matches_netloc(get_netloc(url))
+
+    def partition(self, urls: Iterable[str]) -> tuple[set[str], set[str]]:
+        """Split urls into those on allowed domains and those not, matching each netloc only once."""
+        matched: dict[str, bool] = {}
+        allowed: set[str] = set()
+        ignored: set[str] = set()
+        for url in urls:
+            netloc = get_netloc(url)
+            is_allowed = matched.get(netloc)
+            if is_allowed is None:
+                is_allowed = matched[netloc] = self.matches_netloc(netloc)
+            (allowed if is_allowed else ignored).add(url)
+        return allowed, ignored
+
+    def filter(self, urls: Iterable[str]) -> set[str]:
+        return self.partition(urls)[0]
+
+
+_matchers: dict[frozenset[str], DomainMatcher] = {}
+_matchers_lock = threading.Lock()
+
+
+def get_domain_matcher(allowed_domains: AllowedDomains) -> DomainMatcher:
+    """A DomainMatcher for allowed_domains, reusing the one built for the same rules before."""
+    if isinstance(allowed_domains, DomainMatcher):
+        return allowed_domains
+    rules = frozenset(allowed_domains)
+    matcher = _matchers.get(rules)
+    if matcher is None:
+        matcher = DomainMatcher(rules)
+        with _matchers_lock:
+            # Crawls add seed domains to allowed_domains as they go, so don't keep every set ever seen
+            if len(_matchers) >= 64:
+                _matchers.clear()
+            _matchers[rules] = matcher
+    return matcher
@@ -0,0 +1,138 @@
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+from siteatlas.site_map import SiteMap
+
+# Creates a new, ready to use WebDriver
+DriverFactory = Callable[[], WebDriver]
+
+
+@dataclass
+class _PooledDriver:
+    driver: WebDriver
+    pages: int = 0
+    suspect: bool = False
+
+
+class DriverPool:
+    """A fixed size pool of WebDrivers shared by the threads of a concurrent crawl.
+
+    Drivers are created lazily by the factory. A driver is replaced when it fails a health check
+    after an error, or once it has loaded max_pages_per_driver pages to stop a leaky browser growing forever.
+    """
+
+    def __init__(self,
+                 factory: DriverFactory,
+                 size: int = 4,
+                 max_pages_per_driver: int = 500,
+                 attempts: int = 2) -> None:
+        self.factory = factory
+        self.size = size
+        self.max_pages_per_driver = max_pages_per_driver
+        self.attempts = attempts
+        # Most recently used last, so the warmest driver is handed out first
+        self._idle: list[_PooledDriver] = []
+        self._lock = threading.Lock()
+        # Notified whenever a driver is released or retired, so a waiting thread can take or create one
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self._all: list[_PooledDriver] = []
+
+    def _create(self) -> _PooledDriver:
+        pooled = _PooledDriver(self.factory())
+        with self._lock:
+            self._all.append(pooled)
+        return pooled
+
+    def _retire(self, pooled: _PooledDriver) -> None:
+        with self._available:
+            self._all.remove(pooled)
+            self._created -= 1
+            self._available.notify()
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logging.info(f"Could not quit driver got {e}")
+
+    def _acquire(self) -> _PooledDriver:
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            if self._created < self.size:
+                self._created += 1
+                pooled = None
+            else:
+                pooled = self._idle.pop()
+        if pooled is None:
+            try:
+                return self._create()
+            except Exception:
+                with self._available:
+                    self._created -= 1
+                    self._available.notify()
+                raise
+
+        if pooled.suspect:
+            if not is_healthy(pooled.driver):
+                logging.info("Replacing unhealthy driver")
+                self._retire(pooled)
+                return self._acquire()
+            pooled.suspect = False
+        return pooled
+
+    def _release(self, pooled: _PooledDriver) -> None:
+        pooled.pages += 1
+        if pooled.pages >= self.max_pages_per_driver:
+            logging.info(f"Recycling driver after {pooled.pages} pages")
+            self._retire(pooled)
+            return
+        with self._available:
+            self._idle.append(pooled)
+            self._available.notify()
+
+    @contextmanager
+    def driver(self) -> Iterator[WebDriver]:
+        pooled = self._acquire()
+        try:
+            yield pooled.driver
+        except Exception:
+            # Check the browser is still alive before it is next handed out
+            pooled.suspect = True
+            raise
+        finally:
+            self._release(pooled)
+
+    def fetch(self, url: str, fetch_page: Callable[[str, WebDriver], SiteMap]) -> SiteMap:
+        """Fetch a page on a pooled driver, retrying on another driver if the browser fails."""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with self.driver() as driver:
+                    return fetch_page(url, driver)
+            except WebDriverException as e:
+                if attempt == self.attempts:
+                    raise
+                logging.info(f"Driver failed on {url} (attempt {attempt}) got {e}")
+        raise RuntimeError("DriverPool.attempts must be at least 1")
+
+    def close(self) -> None:
+        while self._all:
+            self._retire(self._all[0])
+
+    def __enter__(self) -> 'DriverPool':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def is_healthy(driver: WebDriver) -> bool:
+    try:
+        return bool(driver.execute_script("return 1;") == 1)
+    except Exception:
+        return False
@@ -0,0 +1,104 @@
+import logging
+import re
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from siteatlas.crawler import PageFetcher, RetryLater
+from siteatlas.link_extraction import LinkExtractor
+from siteatlas.politeness import is_backoff_status
+from siteatlas.profiling import CrawlProfiler, NO_PROFILER
+from siteatlas.site_map import SiteMap
+from siteatlas.url_canonicalisation import CanonicalisationRules
+from siteatlas.site_nagivation import get_links_map
+from siteatlas.traps import TrapDetector
+
+# Markers left in the html by client side rendered frameworks (React, Next.js, Vue, Angular, Nuxt...)
+SPA_MARKERS = ('data-reactroot', '__next_data__', 'id="__next"', 'id="root"', 'id="app"', 'ng-app', 'ng-version',
+               'data-server-rendered', 'window.__nuxt__', 'id="__nuxt"')
+
+NOSCRIPT_SHELL = re.compile(r'<noscript[^>]*>.{0,500}?javascript', re.IGNORECASE | re.DOTALL)
+
+
+def needs_browser(html: str, links_map: SiteMap) -> bool:
+    """Guess whether a page needs a real browser to find all of its links."""
+    if not links_map.urls and not links_map.ignored_urls:
+        # No anchors at all - probably built by JavaScript
+        return True
+    lowered_html = html.lower()
+    if '<button' in lowered_html:
+        # Buttons have to be clicked by get_button_targets
+        return True
+    if NOSCRIPT_SHELL.search(html):
+        return True
+    return any(marker in lowered_html for marker in SPA_MARKERS)
+
+
+class HttpFetcher:
+    """Fetches static pages over plain HTTP, keeping connections alive between requests.
+
+    Pages that need JavaScript, and anything that is not http(s), are handed on to the browser.
+    Pages whose host answers 429 or 5xx raise RetryLater, for a HostScheduler to fetch them again
+    once the host has recovered.
+    """
+
+    def __init__(self,
+                 pool_size: int = 10,
+                 timeout_in_seconds: float = 10.0,
+                 session: Optional[requests.Session] = None,
+                 link_extractor: Optional[LinkExtractor] = None) -> None:
+        self.pool_size = pool_size
+        self.link_extractor = link_extractor
+        self.timeout_in_seconds = timeout_in_seconds
+        self.session = session if session is not None else requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url: str) -> Optional[requests.Response]:
+        try:
+            return self.session.get(url, timeout=self.timeout_in_seconds)
+        except requests.RequestException as e:
+            logging.info(f"Could not fetch {url} over http got {e}")
+            return None
+
+    def fetch_page(self,
+                   url: str,
+                   allowed_domains: set[str],
+                   browser_fetch_page: PageFetcher,
+                   canonical_rules: Optional[CanonicalisationRules] = None,
+                   profiler: Optional[CrawlProfiler] = None,
+                   trap_detector: Optional[TrapDetector] = None) -> SiteMap:
+        """Get the links on a page over HTTP, falling back to the browser when the page needs one."""
+        if urlparse(url).scheme not in ('http', 'https'):
+            return browser_fetch_page(url)
+        if profiler is None:
+            profiler = NO_PROFILER
+
+        with profiler.span('http_get', url):
+            response = self.get(url)
+        if response is None:
+            profiler.count('browser_pages')
+            return browser_fetch_page(url)
+        if is_backoff_status(response.status_code):
+            # The browser would only hit the struggling host again
+            raise RetryLater(f"{url} answered {response.status_code}")
+
+        content_type = response.headers.get('Content-Type', '')
+        if 'html' not in content_type:
+            # Nothing for the browser to find on images, pdfs etc. either
+            logging.info(f"Skipping {url} with content type {content_type}")
+            return SiteMap()
+
+        html = response.text
+        links_map = get_links_map(html, url, allowed_domains, self.link_extractor, canonical_rules, profiler)
+        if needs_browser(html, links_map):
+            logging.info(f"Rendering {url} in the browser")
+            profiler.count('browser_pages')
+            return browser_fetch_page(url)
+        profiler.count('http_pages')
+        if trap_detector:
+            trap_detector.check_content(url, html)
+        return links_map
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Optional, Iterable
+from urllib.parse import urlparse
+
+import requests
+
+from siteatlas.crawler import PageFetcher, RetryLater
+from siteatlas.http_fetch import HttpFetcher, needs_browser
+from siteatlas.politeness import is_backoff_status
+from siteatlas.site_map import SiteMap
+from siteatlas.site_nagivation import get_links_map
+from siteatlas.traps import TrapDetector
+from siteatlas.url_canonicalisation import CanonicalisationRules
+
+
+@dataclass
+class PageRecord:
+    """What a crawl found on one page, and how to tell next time whether it has changed."""
+    url: str
+    urls: list[str] = field(default_factory=list)
+    ignored_urls: list[str] = field(default_factory=list)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    # Hash of the links in the page's raw html - unchanged links mean unchanged buttons are assumed too
+    links_hash: Optional[str] = None
+
+    def site_map(self) -> SiteMap:
+        return SiteMap(set(self.urls), set(self.ignored_urls))
+
+
+def get_links_hash(links_map: SiteMap) -> str:
+    links = '\n'.join(sorted(links_map.urls)) + '\0' + '\n'.join(sorted(links_map.ignored_urls))
+    return hashlib.sha1(links.encode()).hexdigest()
+
+
+class PageIndex:
+    """The pages of a crawl and the links found on each, saved as JSON lines between runs."""
+
+    def __init__(self, records: Iterable[PageRecord] = ()) -> None:
+        self.records = {record.url: record for record in records}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[PageRecord]:
+        return self.records.get(url)
+
+    def put(self, record: PageRecord) -> None:
+        with self._lock:
+            self.records[record.url] = record
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def save(self, path: str) -> None:
+        with self._lock, open(path, 'w') as f:
+            for record in self.records.values():
+                f.write(json.dumps(asdict(record)) + '\n')
+
+    @classmethod
+    def load(cls, path: str) -> 'PageIndex':
+        with open(path) as f:
+            return cls(PageRecord(**json.loads(line)) for line in f if line.strip())
+
+
+class IncrementalFetcher:
+    """Recrawls a site using what the previous crawl found, only rendering pages that have changed.
+
+    A page is reused from the previous index when the server answers a conditional request
+    (If-None-Match / If-Modified-Since) with 304, or when the links in its html hash the same as
+    last time. Everything fetched is recorded in current, ready to save for the next run.
+
+    With use_http_fast_path, changed pages that do not need a browser are read from the html
+    already downloaded, as HttpFetcher would.
+    """
+
+    def __init__(self,
+                 previous: Optional[PageIndex] = None,
+                 http_fetcher: Optional[HttpFetcher] = None,
+                 use_http_fast_path: bool = False) -> None:
+        self.previous = previous if previous is not None else PageIndex()
+        self.current = PageIndex()
+        self.http_fetcher = http_fetcher if http_fetcher is not None else HttpFetcher()
+        self.use_http_fast_path = use_http_fast_path
+        self.reused_pages = 0
+        self._lock = threading.Lock()
+
+    def _reuse(self, record: PageRecord, etag: Optional[str], last_modified: Optional[str]) -> SiteMap:
+        self.current.put(PageRecord(record.url, record.urls, record.ignored_urls,
+                                    etag or record.etag, last_modified or record.last_modified, record.links_hash))
+        with self._lock:
+            self.reused_pages += 1
+        return record.site_map()
+
+    def fetch_page(self,
+                   url: str,
+                   allowed_domains: set[str],
+                   browser_fetch_page: PageFetcher,
+                   canonical_rules: Optional[CanonicalisationRules] = None,
+                   trap_detector: Optional[TrapDetector] = None) -> SiteMap:
+        """Get the links on a page, reusing last run's if the page has not changed."""
+        if urlparse(url).scheme not in ('http', 'https'):
+            return browser_fetch_page(url)
+
+        previous_record = self.previous.get(url)
+        headers: dict[str, str] = {}
+        if previous_record and previous_record.etag:
+            headers['If-None-Match'] = previous_record.etag
+        if previous_record and previous_record.last_modified:
+            headers['If-Modified-Since'] = previous_record.last_modified
+
+        try:
+            response = self.http_fetcher.session.get(url, headers=headers,
+                                                     timeout=self.http_fetcher.timeout_in_seconds)
+        except requests.RequestException as e:
+            logging.info(f"Could not check {url} for changes got {e}")
+            return browser_fetch_page(url)
+
+        if is_backoff_status(response.status_code):
+            raise RetryLater(f"{url} answered {response.status_code}")
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if previous_record and response.status_code == 304:
+            logging.info(f"{url} is not modified, reusing its links")
+            return self._reuse(previous_record, etag, last_modified)
+
+        links_hash = None
+        content_type = response.headers.get('Content-Type', '')
+        if 'html' in content_type:
+            html = response.text
+            links_map = get_links_map(html, url, allowed_domains, self.http_fetcher.link_extractor, canonical_rules)
+            links_hash = get_links_hash(links_map)
+            # A page with no links in its html is built by JavaScript, so its html says nothing about its links
+            has_links = bool(links_map.urls or links_map.ignored_urls)
+            if previous_record and has_links and previous_record.links_hash == links_hash:
+                logging.info(f"{url} has the same links, reusing them")
+                return self._reuse(previous_record, etag, last_modified)
+            if self.use_http_fast_path and not needs_browser(html, links_map):
+                page_map = links_map
+                if trap_detector:
+                    trap_detector.check_content(url, html)
+            else:
+                page_map = browser_fetch_page(url)
+        elif self.use_http_fast_path:
+            logging.info(f"Skipping {url} with content type {content_type}")
+            page_map = SiteMap()
+        else:
+            page_map = browser_fetch_page(url)
+
+        self.current.put(PageRecord(url, sorted(page_map.urls), sorted(page_map.ignored_urls),
+                                    etag, last_modified, links_hash))
+        return page_map
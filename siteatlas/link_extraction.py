@@ -0,0 +1,110 @@
+import re
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+from typing import Optional, Union
+
+from bs4 import BeautifulSoup
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+try:
+    from lxml import html as lxml_html
+except ImportError:  # pragma: no cover - lxml is optional
+    lxml_html = None
+
+# Either the raw html of a page or a driver that has the page loaded
+PageSource = Union[str, WebDriver]
+
+# lxml refuses str input that declares its own encoding, which xhtml pages often do
+XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+# Resolves every anchor's href against the document, in one round trip
+BROWSER_HREFS_SCRIPT = """
+return Array.prototype.map.call(document.querySelectorAll('a[href]'), function (anchor) {
+    return typeof anchor.href === 'string' ? anchor.href : anchor.href.baseVal;
+});
+"""
+
+
+class LinkExtractor(ABC):
+    """Finds the href of every anchor on a page."""
+    # Whether the extractor reads the page from the driver rather than from its html
+    reads_driver = False
+
+    def get_hrefs(self, page: PageSource) -> list[str]:
+        """Get the hrefs on a page, either as written or already resolved to absolute urls."""
+        if not isinstance(page, str):
+            page = page.page_source
+        return self.get_hrefs_from_html(page)
+
+    @abstractmethod
+    def get_hrefs_from_html(self, html: str) -> list[str]:
+        ...
+
+
+class BeautifulSoupLinkExtractor(LinkExtractor):
+    """Builds the whole document tree with BeautifulSoup and html.parser."""
+
+    def get_hrefs_from_html(self, html: str) -> list[str]:
+        page_soup = BeautifulSoup(html, 'html.parser')
+        return [str(link['href']) for link in page_soup.find_all('a') if 'href' in link.attrs]
+
+
+class _AnchorParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.hrefs: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        if tag != 'a':
+            return
+        href = None
+        found = False
+        # Like BeautifulSoup, the last of any repeated attribute wins
+        for name, value in attrs:
+            if name == 'href':
+                href = value
+                found = True
+        if found:
+            self.hrefs.append(href or '')
+
+    handle_startendtag = handle_starttag
+
+
+class StreamingLinkExtractor(LinkExtractor):
+    """Tokenizes the html with the standard library parser without building a tree."""
+
+    def get_hrefs_from_html(self, html: str) -> list[str]:
+        parser = _AnchorParser()
+        parser.feed(html)
+        parser.close()
+        return parser.hrefs
+
+
+class LxmlLinkExtractor(LinkExtractor):
+    """Parses the html with lxml's C parser. Needs lxml to be installed."""
+
+    def __init__(self) -> None:
+        if lxml_html is None:
+            raise ImportError("LxmlLinkExtractor needs lxml - pip install lxml")
+
+    def get_hrefs_from_html(self, html: str) -> list[str]:
+        if not html.strip():
+            return []
+        document = lxml_html.document_fromstring(XML_DECLARATION.sub('', html, count=1))
+        return [str(href) for href in document.xpath('//a/@href')]
+
+
+class BrowserLinkExtractor(LinkExtractor):
+    """Reads resolved hrefs straight from the browser's DOM, skipping page_source and parsing altogether."""
+    reads_driver = True
+
+    def get_hrefs(self, page: PageSource) -> list[str]:
+        if isinstance(page, str):
+            raise TypeError("BrowserLinkExtractor needs a driver with the page loaded, not html")
+        return [str(href) for href in page.execute_script(BROWSER_HREFS_SCRIPT)]
+
+    def get_hrefs_from_html(self, html: str) -> list[str]:
+        raise TypeError("BrowserLinkExtractor needs a driver with the page loaded, not html")
+
+
+DEFAULT_LINK_EXTRACTOR = StreamingLinkExtractor()
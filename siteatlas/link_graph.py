@@ -0,0 +1,240 @@
+import struct
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Sequence
+
+from siteatlas.crawler import CrawlListener
+from siteatlas.site_map import SiteMap
+from siteatlas.url_store import CompactUrlSet
+
+# Depth of a node that cannot be reached
+UNREACHABLE = -1
+# Magic, node count and edge count at the start of a saved graph
+GRAPH_HEADER = struct.Struct('<4sQQ')
+GRAPH_MAGIC = b'SAG1'
+
+
+class LinkGraphBuilder(CrawlListener):
+    """Records which page linked to which as a crawl runs, in 8 bytes an edge.
+
+    Add it to a CrawlState's listeners. Every page's links are recorded, including the targets of
+    its buttons, and with include_ignored the links to disallowed urls too. Call freeze for a
+    LinkGraph to query.
+    """
+
+    def __init__(self, include_ignored: bool = False) -> None:
+        self.include_ignored = include_ignored
+        self.nodes = CompactUrlSet()
+        self.sources = array('I')
+        self.targets = array('I')
+
+    def add_edges(self, url: str, linked_urls: Iterable[str]) -> None:
+        source = self.nodes.add_with_id(url)
+        for linked_url in linked_urls:
+            self.sources.append(source)
+            self.targets.append(self.nodes.add_with_id(linked_url))
+
+    def urls_added(self, urls: Sequence[str], depth: int, queued: bool) -> None:
+        # Seeds and unfetched urls are nodes too, even though nothing links from them
+        for url in urls:
+            self.nodes.add_with_id(url)
+
+    def page_fetched(self, url: str, depth: int, page_map: SiteMap) -> None:
+        self.add_edges(url, page_map.urls)
+        if self.include_ignored:
+            self.add_edges(url, page_map.ignored_urls)
+
+    def freeze(self) -> 'LinkGraph':
+        return LinkGraph.from_edges(self.nodes, self.sources, self.targets)
+
+
+def _compressed_rows(node_count: int, sources: array, targets: array) -> tuple[array, array]:  # type: ignore[type-arg]
+    """Sort edges by source into CSR form: the targets of node n are targets[offsets[n]:offsets[n + 1]]."""
+    offsets = array('I', bytes(4 * (node_count + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+    sorted_targets = array('I', bytes(4 * len(targets)))
+    next_slot = array('I', offsets[:-1])
+    for source, target in zip(sources, targets):
+        sorted_targets[next_slot[source]] = target
+        next_slot[source] += 1
+    return offsets, sorted_targets
+
+
+@dataclass
+class LinkGraphDiff:
+    """What changed between two crawls' link graphs."""
+    added_urls: set[str] = field(default_factory=set)
+    removed_urls: set[str] = field(default_factory=set)
+    added_links: set[tuple[str, str]] = field(default_factory=set)
+    removed_links: set[tuple[str, str]] = field(default_factory=set)
+
+
+class LinkGraph:
+    """A frozen link graph in compressed sparse row arrays, with batched queries by url or node id.
+
+    Nodes are the ids of a CompactUrlSet; edges are two arrays of 4 byte ints, one of offsets per
+    node and one of targets, plus the same again for incoming links once they are first needed.
+    """
+
+    def __init__(self, nodes: CompactUrlSet, offsets: array, targets: array) -> None:  # type: ignore[type-arg]
+        self.nodes = nodes
+        self.offsets = offsets
+        self.targets = targets
+        self._reverse: Optional[tuple[array, array]] = None  # type: ignore[type-arg]
+
+    @classmethod
+    def from_edges(cls, nodes: CompactUrlSet, sources: array, targets: array) -> 'LinkGraph':  # type: ignore[type-arg]
+        return cls(nodes, *_compressed_rows(nodes.id_count, sources, targets))
+
+    @property
+    def node_count(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def node_id(self, url: str) -> int:
+        node = self.nodes.get_id(url)
+        if node is None:
+            raise KeyError(url)
+        return node
+
+    def node_ids(self, urls: Iterable[str]) -> list[int]:
+        return [self.node_id(url) for url in urls]
+
+    def url(self, node: int) -> str:
+        return self.nodes.url_for(node)
+
+    def links_from(self, url: str) -> list[str]:
+        node = self.node_id(url)
+        return [self.url(target) for target in self.targets[self.offsets[node]:self.offsets[node + 1]]]
+
+    def _reverse_rows(self) -> tuple[array, array]:  # type: ignore[type-arg]
+        if self._reverse is None:
+            sources = array('I', bytes(4 * self.edge_count))
+            for node in range(self.node_count):
+                for edge in range(self.offsets[node], self.offsets[node + 1]):
+                    sources[edge] = node
+            self._reverse = _compressed_rows(self.node_count, self.targets, sources)
+        return self._reverse
+
+    def links_to(self, url: str) -> list[str]:
+        offsets, sources = self._reverse_rows()
+        node = self.node_id(url)
+        return [self.url(source) for source in sources[offsets[node]:offsets[node + 1]]]
+
+    def out_degrees(self) -> array:  # type: ignore[type-arg]
+        """The number of links from every node, indexed by node id."""
+        return array('I', (self.offsets[node + 1] - self.offsets[node] for node in range(self.node_count)))
+
+    def in_degrees(self) -> array:  # type: ignore[type-arg]
+        """The number of links to every node, indexed by node id."""
+        degrees = array('I', bytes(4 * self.node_count))
+        for target in self.targets:
+            degrees[target] += 1
+        return degrees
+
+    def bfs_depths(self, start_urls: Iterable[str]) -> array:  # type: ignore[type-arg]
+        """The fewest clicks from any start url to every node, indexed by node id, or UNREACHABLE."""
+        depths = array('i', [UNREACHABLE]) * self.node_count
+        queue: deque[int] = deque()
+        for node in self.node_ids(start_urls):
+            depths[node] = 0
+            queue.append(node)
+        offsets, targets = self.offsets, self.targets
+        while queue:
+            node = queue.popleft()
+            next_depth = depths[node] + 1
+            for target in targets[offsets[node]:offsets[node + 1]]:
+                if depths[target] == UNREACHABLE:
+                    depths[target] = next_depth
+                    queue.append(target)
+        return depths
+
+    def depths(self, start_urls: Iterable[str], urls: Iterable[str]) -> list[int]:
+        """The click depth of each url from the start urls, in one breadth first search."""
+        depths = self.bfs_depths(start_urls)
+        return [depths[node] for node in self.node_ids(urls)]
+
+    def shortest_path(self, from_url: str, to_url: str) -> Optional[list[str]]:
+        """The urls clicked through on the shortest path between two pages, or None if there is none."""
+        start, goal = self.node_id(from_url), self.node_id(to_url)
+        parents = array('i', [UNREACHABLE]) * self.node_count
+        parents[start] = start
+        queue = deque([start])
+        while queue and parents[goal] == UNREACHABLE:
+            node = queue.popleft()
+            for target in self.targets[self.offsets[node]:self.offsets[node + 1]]:
+                if parents[target] == UNREACHABLE:
+                    parents[target] = node
+                    queue.append(target)
+        if parents[goal] == UNREACHABLE:
+            return None
+        path = [goal]
+        while path[-1] != start:
+            path.append(parents[path[-1]])
+        return [self.url(node) for node in reversed(path)]
+
+    def reachable(self, start_urls: Iterable[str]) -> set[str]:
+        depths = self.bfs_depths(start_urls)
+        return {self.url(node) for node in range(self.node_count) if depths[node] != UNREACHABLE}
+
+    def unreachable(self, start_urls: Iterable[str]) -> set[str]:
+        """Pages the crawl knows of, e.g. from sitemaps, that cannot be reached by clicking from the start urls."""
+        depths = self.bfs_depths(start_urls)
+        return {self.url(node) for node in range(self.node_count) if depths[node] == UNREACHABLE}
+
+    def orphans(self, start_urls: Iterable[str] = ()) -> set[str]:
+        """Pages nothing links to, other than the start urls."""
+        starts = set(self.node_ids(start_urls))
+        in_degrees = self.in_degrees()
+        return {self.url(node) for node in range(self.node_count) if not in_degrees[node] and node not in starts}
+
+    def links(self) -> Iterable[tuple[str, str]]:
+        for node in range(self.node_count):
+            for target in self.targets[self.offsets[node]:self.offsets[node + 1]]:
+                yield self.url(node), self.url(target)
+
+    def diff(self, other: 'LinkGraph') -> LinkGraphDiff:
+        """What changed between this graph and an earlier one, page by page."""
+        diff = LinkGraphDiff(added_urls={url for url in self.nodes if url not in other.nodes},
+                             removed_urls={url for url in other.nodes if url not in self.nodes})
+        # One page at a time, so only the links of the page being compared are held as strings
+        for url in self.nodes:
+            links = set(self.links_from(url))
+            other_links = set(other.links_from(url)) if url in other.nodes else set()
+            diff.added_links.update((url, link) for link in links - other_links)
+            diff.removed_links.update((url, link) for link in other_links - links)
+        for url in diff.removed_urls:
+            diff.removed_links.update((url, link) for link in other.links_from(url))
+        return diff
+
+    def save(self, path: str) -> None:
+        """Save the graph in one file: a header, the urls by node id, then the CSR arrays."""
+        urls = '\n'.join(self.url(node) for node in range(self.node_count)).encode()
+        with open(path, 'wb') as f:
+            f.write(GRAPH_HEADER.pack(GRAPH_MAGIC, self.node_count, self.edge_count))
+            f.write(struct.pack('<Q', len(urls)))
+            f.write(urls)
+            self.offsets.tofile(f)
+            self.targets.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> 'LinkGraph':
+        with open(path, 'rb') as f:
+            magic, node_count, edge_count = GRAPH_HEADER.unpack(f.read(GRAPH_HEADER.size))
+            if magic != GRAPH_MAGIC:
+                raise ValueError(f"{path} is not a saved link graph")
+            urls_length, = struct.unpack('<Q', f.read(8))
+            nodes = CompactUrlSet()
+            for url in f.read(urls_length).decode().split('\n') if node_count else []:
+                nodes.add_with_id(url)
+            offsets, targets = array('I'), array('I')
+            offsets.fromfile(f, node_count + 1)
+            targets.fromfile(f, edge_count)
+        return cls(nodes, offsets, targets)
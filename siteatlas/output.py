@@ -0,0 +1,95 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+from typing import Iterable, Optional, TextIO, Union
+
+from siteatlas.crawler import FoundUrl
+
+CSV_FIELDS = ['url', 'depth', 'source', 'allowed']
+
+
+class FoundUrlWriter(ABC):
+    """Writes urls to a file as a crawl finds them, batch_size at a time.
+
+    Each batch is flushed to disk as soon as it is written, so a consumer tailing the file sees
+    urls within one batch of their being found, and memory holds at most one batch.
+    """
+
+    def __init__(self, file: Union[str, TextIO], batch_size: int = 1000) -> None:
+        self.file: TextIO = open(file, 'w', newline='') if isinstance(file, str) else file
+        self._owns_file = isinstance(file, str)
+        self.batch_size = batch_size
+        self.written = 0
+        self._batch: list[FoundUrl] = []
+
+    @abstractmethod
+    def write_batch(self, batch: list[FoundUrl]) -> None:
+        ...
+
+    def write(self, found_url: FoundUrl) -> None:
+        self._batch.append(found_url)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_all(self, found_urls: Iterable[FoundUrl]) -> int:
+        """Write every url from e.g. iter_site_map, returning how many were written."""
+        for found_url in found_urls:
+            self.write(found_url)
+        self.flush()
+        return self.written
+
+    def flush(self) -> None:
+        if self._batch:
+            self.write_batch(self._batch)
+            self.written += len(self._batch)
+            self._batch.clear()
+        self.file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self._owns_file:
+            self.file.close()
+
+    def __enter__(self) -> 'FoundUrlWriter':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class JsonLinesWriter(FoundUrlWriter):
+    """One JSON object per url."""
+
+    def write_batch(self, batch: list[FoundUrl]) -> None:
+        self.file.write(''.join(json.dumps(asdict(found_url)) + '\n' for found_url in batch))
+
+
+class CsvWriter(FoundUrlWriter):
+    """One row per url, with a header row of CSV_FIELDS."""
+
+    def __init__(self, file: Union[str, TextIO], batch_size: int = 1000) -> None:
+        super().__init__(file, batch_size)
+        self._csv = csv.writer(self.file)
+        self._csv.writerow(CSV_FIELDS)
+
+    def write_batch(self, batch: list[FoundUrl]) -> None:
+        self._csv.writerows((found_url.url, found_url.depth, found_url.source or '', int(found_url.allowed))
+                            for found_url in batch)
+
+
+def read_json_lines(file: TextIO) -> Iterable[FoundUrl]:
+    """Read back urls written by a JsonLinesWriter."""
+    for line in file:
+        if line.strip():
+            yield FoundUrl(**json.loads(line))
+
+
+def get_writer(path: str, batch_size: int = 1000, output_format: Optional[str] = None) -> FoundUrlWriter:
+    """A writer for path, choosing CSV or JSON lines from output_format or else the file's extension."""
+    output_format = output_format or path.rsplit('.', 1)[-1].lower()
+    if output_format == 'csv':
+        return CsvWriter(path, batch_size)
+    if output_format in ('jsonl', 'json'):
+        return JsonLinesWriter(path, batch_size)
+    raise ValueError(f"Unknown output format {output_format}, expected csv or jsonl")
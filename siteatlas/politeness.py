@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+import requests
+
+from siteatlas.crawler import Frontier
+from siteatlas.seeding import RobotsRules
+from siteatlas.url_functions import get_scheme_and_fully_qualified_domain
+
+
+def is_backoff_status(status_code: int) -> bool:
+    """Whether a response means the host wants us to slow down: 429 Too Many Requests or any server error."""
+    return status_code == 429 or 500 <= status_code < 600
+
+
+class TokenBucket:
+    """Allows rate requests a second on average, and up to burst at once."""
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until_available(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass
+class HostState:
+    bucket: TokenBucket
+    queue: deque[tuple[str, int]] = field(default_factory=deque)
+    in_flight: int = 0
+    failures: int = 0
+    backoff_until: float = 0.0
+
+
+def parse_retry_after(retry_after: Optional[str], now: float) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given either as seconds or as an http date."""
+    if not retry_after:
+        return None
+    if retry_after.strip().isdigit():
+        return float(retry_after)
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostScheduler(Frontier):
+    """A frontier that keeps each host within its own rate limit, so many hosts can be crawled at full speed.
+
+    Each host gets a token bucket of requests_per_second with room for a burst, and at most
+    max_concurrency_per_host pages in flight. A Crawl-delay in the host's robots.txt lowers its
+    rate to match. Hosts that answer 429 or 5xx are backed off exponentially, or for as long as
+    their Retry-After header asks - watch an HttpFetcher's session to see those responses. The
+    page that got the response is queued again for once the backoff is over, up to max_retries times.
+
+    Urls are fetched breadth first within each host, and hosts are taken in turn.
+    """
+
+    def __init__(self,
+                 requests_per_second: float = 2.0,
+                 burst: float = 2.0,
+                 max_concurrency_per_host: int = 2,
+                 robots: Optional[RobotsRules] = None,
+                 min_backoff_in_seconds: float = 1.0,
+                 max_backoff_in_seconds: float = 60.0,
+                 max_retries: int = 3,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        super().__init__()
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.robots = robots
+        self.min_backoff_in_seconds = min_backoff_in_seconds
+        self.max_backoff_in_seconds = max_backoff_in_seconds
+        self.max_retries = max_retries
+        self.clock = clock
+        self.hosts: dict[str, HostState] = {}
+        self.retries: dict[str, int] = {}
+        # Hosts with urls waiting, in the order they take turns
+        self._waiting_hosts: deque[str] = deque()
+        self._size = 0
+        # Responses are recorded from worker threads
+        self._lock = threading.Lock()
+
+    def _new_host_state(self, host: str, url: str) -> HostState:
+        """State for a host not seen before. Reading its robots.txt can take a while, so call this without the lock."""
+        rate, burst = self.requests_per_second, self.burst
+        is_http = url.startswith(('http://', 'https://'))
+        crawl_delay = self.robots.crawl_delay(url) if self.robots and is_http else None
+        if crawl_delay:
+            logging.info(f"Fetching from {host} at most once every {crawl_delay} seconds")
+            rate, burst = min(rate, 1 / crawl_delay), 1.0
+        return HostState(TokenBucket(rate, burst, self.clock()))
+
+    def push(self, url: str, depth: int) -> None:
+        host = get_scheme_and_fully_qualified_domain(url)
+        new_state = self._new_host_state(host, url) if host not in self.hosts else None
+        with self._lock:
+            # Another thread may have added the host meanwhile
+            state = self.hosts.setdefault(host, new_state) if new_state else self.hosts[host]
+            if not state.queue:
+                self._waiting_hosts.append(host)
+            state.queue.append((url, depth))
+            self._size += 1
+
+    def _seconds_until_host_ready(self, state: HostState, now: float) -> Optional[float]:
+        if state.in_flight >= self.max_concurrency_per_host:
+            return None
+        return max(state.backoff_until - now, state.bucket.seconds_until_available(now), 0.0)
+
+    def pop_ready(self) -> Optional[tuple[str, int]]:
+        with self._lock:
+            now = self.clock()
+            for _ in range(len(self._waiting_hosts)):
+                host = self._waiting_hosts[0]
+                self._waiting_hosts.rotate(-1)
+                state = self.hosts[host]
+                if self._seconds_until_host_ready(state, now) != 0:
+                    continue
+                state.bucket.take(now)
+                state.in_flight += 1
+                self._size -= 1
+                if len(state.queue) == 1:
+                    self._waiting_hosts.remove(host)
+                return state.queue.popleft()
+        return None
+
+    def seconds_until_ready(self) -> Optional[float]:
+        with self._lock:
+            now = self.clock()
+            waits = [self._seconds_until_host_ready(self.hosts[host], now) for host in self._waiting_hosts]
+        known_waits = [wait for wait in waits if wait is not None]
+        return min(known_waits) if known_waits else None
+
+    def pop(self) -> tuple[str, int]:
+        """Take the next url, sleeping until a host is ready if needed."""
+        while True:
+            next_url = self.pop_ready()
+            if next_url is not None:
+                return next_url
+            wait = self.seconds_until_ready()
+            if wait is None:
+                raise IndexError('every host with urls waiting is at its concurrency limit')
+            time.sleep(wait)
+
+    def task_done(self, url: str) -> None:
+        with self._lock:
+            state = self.hosts.get(get_scheme_and_fully_qualified_domain(url))
+            if state is not None and state.in_flight:
+                state.in_flight -= 1
+
+    def record_response(self, url: str, status_code: int, retry_after: Optional[str] = None) -> None:
+        """Back off from a host that is struggling, or reset its backoff once it answers again."""
+        host = get_scheme_and_fully_qualified_domain(url)
+        with self._lock:
+            state = self.hosts.get(host)
+            if state is None:
+                return
+            if not is_backoff_status(status_code):
+                state.failures = 0
+                return
+            backoff = self._back_off(state, retry_after)
+        logging.info(f"{host} answered {status_code}, backing off for {backoff:.1f} seconds")
+
+    def _back_off(self, state: HostState, retry_after: Optional[str] = None) -> float:
+        state.failures += 1
+        backoff: float = min(self.max_backoff_in_seconds, self.min_backoff_in_seconds * 2 ** (state.failures - 1))
+        requested = parse_retry_after(retry_after, time.time())
+        if requested is not None:
+            backoff = min(self.max_backoff_in_seconds, max(backoff, requested))
+        state.backoff_until = max(state.backoff_until, self.clock() + backoff)
+        return backoff
+
+    def retry(self, url: str, depth: int) -> bool:
+        """Queue an url again for once its host's backoff is over, unless it has been retried max_retries times."""
+        attempts = self.retries.get(url, 0)
+        if attempts >= self.max_retries:
+            return False
+        self.retries[url] = attempts + 1
+        host = get_scheme_and_fully_qualified_domain(url)
+        with self._lock:
+            state = self.hosts.get(host)
+            # Back off even if the response was not seen, so the retry does not follow straight on
+            if state is not None and state.backoff_until <= self.clock():
+                self._back_off(state)
+        self.push(url, depth)
+        return True
+
+    def response_hook(self, response: requests.Response, *args: Any, **kwargs: Any) -> None:
+        self.record_response(response.url, response.status_code, response.headers.get('Retry-After'))
+
+    def watch(self, session: requests.Session) -> None:
+        """Record every response the session gets, to back off from hosts that ask us to."""
+        if self.response_hook not in session.hooks['response']:
+            session.hooks['response'].append(self.response_hook)
+
+    def __len__(self) -> int:
+        return self._size
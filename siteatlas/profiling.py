@@ -0,0 +1,162 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import ContextManager, Iterator, Optional
+
+from siteatlas.url_functions import get_scheme_and_fully_qualified_domain
+
+# The span around fetching a whole page, the others are phases within it
+PAGE = 'page'
+
+
+@dataclass
+class PhaseTimings:
+    count: int = 0
+    total_in_seconds: float = 0.0
+    max_in_seconds: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total_in_seconds += seconds
+        self.max_in_seconds = max(self.max_in_seconds, seconds)
+
+    @property
+    def mean_in_seconds(self) -> float:
+        return self.total_in_seconds / self.count if self.count else 0.0
+
+
+class MetricsHook:
+    """Told about every span and counter a CrawlProfiler records, e.g. to send them to a metrics service.
+
+    Override the methods you need - they all do nothing by default. They are called on the
+    thread that recorded the metric, so should be quick.
+    """
+
+    def span_finished(self, phase: str, url: Optional[str], seconds: float) -> None:
+        """A phase of fetching url, or of the crawl if url is None, took seconds."""
+
+    def counted(self, name: str, count: int) -> None:
+        """A counter was increased by count."""
+
+
+class CrawlProfiler:
+    """Times each phase of a crawl, overall and per host, and counts what it did.
+
+    Phases are timed with span, e.g. navigate, wait, page_source, parse_html, canonicalise,
+    buttons and merge, around the whole page span. The slowest slowest_pages pages are kept for
+    the report.
+    """
+
+    def __init__(self, hooks: Optional[list[MetricsHook]] = None, slowest_pages: int = 10) -> None:
+        self.hooks = hooks if hooks is not None else []
+        self.slowest_pages = slowest_pages
+        self.phases: dict[str, PhaseTimings] = defaultdict(PhaseTimings)
+        self.host_phases: dict[str, dict[str, PhaseTimings]] = defaultdict(lambda: defaultdict(PhaseTimings))
+        self.counters: dict[str, int] = defaultdict(int)
+        # A min heap of (seconds, url), so the fastest of the slowest pages is the one replaced
+        self._slowest: list[tuple[float, str]] = []
+        self.started = time.perf_counter()
+        self.stopped: Optional[float] = None
+        # Pages are fetched on worker threads
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float, url: Optional[str] = None) -> None:
+        with self._lock:
+            self.phases[phase].add(seconds)
+            if url is not None:
+                self.host_phases[get_scheme_and_fully_qualified_domain(url)][phase].add(seconds)
+                if phase == PAGE:
+                    if len(self._slowest) < self.slowest_pages:
+                        heapq.heappush(self._slowest, (seconds, url))
+                    elif self._slowest and seconds > self._slowest[0][0]:
+                        heapq.heapreplace(self._slowest, (seconds, url))
+        for hook in self.hooks:
+            hook.span_finished(phase, url, seconds)
+
+    @contextmanager
+    def _span(self, phase: str, url: Optional[str]) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start, url)
+
+    def span(self, phase: str, url: Optional[str] = None) -> ContextManager[None]:
+        """Time the code in a with block as one phase of fetching url."""
+        return self._span(phase, url)
+
+    def count(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += count
+        for hook in self.hooks:
+            hook.counted(name, count)
+
+    def stop(self) -> None:
+        self.stopped = time.perf_counter()
+
+    @property
+    def elapsed_in_seconds(self) -> float:
+        return (self.stopped if self.stopped is not None else time.perf_counter()) - self.started
+
+    @property
+    def pages(self) -> int:
+        return self.phases[PAGE].count if PAGE in self.phases else 0
+
+    @property
+    def pages_per_second(self) -> float:
+        elapsed = self.elapsed_in_seconds
+        return self.pages / elapsed if elapsed else 0.0
+
+    def slowest(self) -> list[tuple[float, str]]:
+        """The slowest pages and how long each took, slowest first."""
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
+
+    def report(self) -> str:
+        """A summary of where the crawl's time went."""
+        with self._lock:
+            phases = sorted(self.phases.items(), key=lambda item: item[1].total_in_seconds, reverse=True)
+            hosts = sorted(((host, phases_for_host[PAGE]) for host, phases_for_host in self.host_phases.items()
+                            if PAGE in phases_for_host),
+                           key=lambda item: item[1].total_in_seconds, reverse=True)
+            counters = sorted(self.counters.items())
+
+        lines = [f"Crawled {self.pages} pages in {self.elapsed_in_seconds:.1f}s "
+                 f"({self.pages_per_second:.2f} pages/second)",
+                 '',
+                 f"{'Phase':<16}{'Count':>8}{'Total s':>10}{'Mean ms':>10}{'Max ms':>10}"]
+        for phase, timings in phases:
+            lines.append(f"{phase:<16}{timings.count:>8}{timings.total_in_seconds:>10.2f}"
+                         f"{timings.mean_in_seconds * 1000:>10.1f}{timings.max_in_seconds * 1000:>10.1f}")
+        if hosts:
+            lines += ['', 'Hosts:']
+            lines += [f"  {host} {timings.count} pages, {timings.mean_in_seconds * 1000:.1f}ms mean"
+                      for host, timings in hosts]
+        slowest = self.slowest()
+        if slowest:
+            lines += ['', 'Slowest pages:']
+            lines += [f"  {seconds:.2f}s {url}" for seconds, url in slowest]
+        if counters:
+            lines += ['', 'Counters: ' + ', '.join(f"{name}={count}" for name, count in counters)]
+        return '\n'.join(lines)
+
+
+class _NoProfiler(CrawlProfiler):
+    """Records nothing, so the hot path costs next to nothing when no profiler is given."""
+
+    _NULL_SPAN: ContextManager[None] = nullcontext()
+
+    def span(self, phase: str, url: Optional[str] = None) -> ContextManager[None]:
+        return self._NULL_SPAN
+
+    def record(self, phase: str, seconds: float, url: Optional[str] = None) -> None:
+        pass
+
+    def count(self, name: str, count: int = 1) -> None:
+        pass
+
+
+NO_PROFILER: CrawlProfiler = _NoProfiler()
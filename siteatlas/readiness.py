@@ -0,0 +1,222 @@
+import heapq
+import logging
+import threading
+import time
+from typing import Optional, Sequence
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.webdriver import WebDriver
+
+from siteatlas.url_functions import get_fully_qualified_domain_name
+
+DOCUMENT_READY_SCRIPT = """
+var timeoutMs = arguments[0], done = arguments[arguments.length - 1];
+if (document.readyState === 'complete') {
+    done(true);
+    return;
+}
+var deadline = setTimeout(function () { done(false); }, timeoutMs);
+window.addEventListener('load', function () {
+    clearTimeout(deadline);
+    done(true);
+});
+"""
+
+# Ready once no resource (script, xhr, fetch, image...) has finished loading for idleMs
+NETWORK_IDLE_SCRIPT = """
+var idleMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var finished = false, idleTimer, observer;
+function finish(ready) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearTimeout(idleTimer);
+    clearTimeout(deadline);
+    if (observer) {
+        observer.disconnect();
+    }
+    done(ready);
+}
+function reset() {
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(function () { finish(true); }, idleMs);
+}
+var deadline = setTimeout(function () { finish(false); }, timeoutMs);
+if (window.PerformanceObserver) {
+    observer = new PerformanceObserver(reset);
+    observer.observe({type: 'resource'});
+}
+reset();
+"""
+
+# Ready once the DOM has not changed for quietMs
+DOM_QUIESCENCE_SCRIPT = """
+var quietMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var finished = false, quietTimer;
+var observer = new MutationObserver(reset);
+function finish(ready) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    clearTimeout(quietTimer);
+    clearTimeout(deadline);
+    observer.disconnect();
+    done(ready);
+}
+function reset() {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(function () { finish(true); }, quietMs);
+}
+var deadline = setTimeout(function () { finish(false); }, timeoutMs);
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+reset();
+"""
+
+
+class ReadinessStrategy:
+    """Waits, up to a time limit, for a loaded page to be ready to read links from."""
+    script = ''
+
+    def __init__(self, timeout_in_seconds: float = 10.0) -> None:
+        self.timeout_in_seconds = timeout_in_seconds
+
+    def script_arguments(self, timeout_in_milliseconds: int) -> list[int]:
+        return [timeout_in_milliseconds]
+
+    def wait(self, driver: WebDriver, timeout_in_seconds: float) -> bool:
+        """Wait for the page, returning False if it was not ready within the limit."""
+        timeout_in_milliseconds = int(min(timeout_in_seconds, self.timeout_in_seconds) * 1000)
+        try:
+            return bool(driver.execute_async_script(self.script, *self.script_arguments(timeout_in_milliseconds)))
+        except WebDriverException as e:
+            logging.info(f"{type(self).__name__} could not wait for page got {e}")
+            return False
+
+
+class DocumentReadyState(ReadinessStrategy):
+    """Ready once document.readyState is complete."""
+    script = DOCUMENT_READY_SCRIPT
+
+
+class NetworkIdle(ReadinessStrategy):
+    """Ready once no resources have finished loading for idle_in_seconds."""
+    script = NETWORK_IDLE_SCRIPT
+
+    def __init__(self, idle_in_seconds: float = 0.5, timeout_in_seconds: float = 10.0) -> None:
+        super().__init__(timeout_in_seconds)
+        self.idle_in_seconds = idle_in_seconds
+
+    def script_arguments(self, timeout_in_milliseconds: int) -> list[int]:
+        return [int(self.idle_in_seconds * 1000), timeout_in_milliseconds]
+
+
+class DomQuiescence(ReadinessStrategy):
+    """Ready once a MutationObserver has seen no changes to the DOM for quiet_in_seconds."""
+    script = DOM_QUIESCENCE_SCRIPT
+
+    def __init__(self, quiet_in_seconds: float = 0.25, timeout_in_seconds: float = 10.0) -> None:
+        super().__init__(timeout_in_seconds)
+        self.quiet_in_seconds = quiet_in_seconds
+
+    def script_arguments(self, timeout_in_milliseconds: int) -> list[int]:
+        return [int(self.quiet_in_seconds * 1000), timeout_in_milliseconds]
+
+
+class HostTimings:
+    """Learns how long each host's pages take to become ready.
+
+    Keeps a moving average of the waits seen per host and gives each page headroom times that
+    average, kept within [min_wait_in_seconds, max_wait_in_seconds]. Hosts not seen yet get the maximum.
+    """
+
+    def __init__(self,
+                 min_wait_in_seconds: float = 0.5,
+                 max_wait_in_seconds: float = 10.0,
+                 headroom: float = 3.0,
+                 smoothing: float = 0.2) -> None:
+        self.min_wait_in_seconds = min_wait_in_seconds
+        self.max_wait_in_seconds = max_wait_in_seconds
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.average_waits: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def budget(self, host: str) -> float:
+        with self._lock:
+            average_wait = self.average_waits.get(host)
+        if average_wait is None:
+            return self.max_wait_in_seconds
+        return min(self.max_wait_in_seconds, max(self.min_wait_in_seconds, average_wait * self.headroom))
+
+    def record(self, host: str, wait_in_seconds: float, ready: bool) -> None:
+        if not ready:
+            # The page outlasted its budget, so count it as needing the maximum
+            wait_in_seconds = self.max_wait_in_seconds
+        with self._lock:
+            average_wait = self.average_waits.get(host)
+            if average_wait is None:
+                self.average_waits[host] = wait_in_seconds
+            else:
+                self.average_waits[host] = average_wait + self.smoothing * (wait_in_seconds - average_wait)
+
+
+class PageReadiness:
+    """Waits for each page using a sequence of strategies within a per-host learned time budget.
+
+    How many pages were waited for and for how long in total is kept so savings can be measured,
+    along with the slowest slowest_pages pages; a CrawlProfiler's wait span times every page.
+    """
+
+    def __init__(self,
+                 strategies: Optional[Sequence[ReadinessStrategy]] = None,
+                 host_timings: Optional[HostTimings] = None,
+                 slowest_pages: int = 10) -> None:
+        self.strategies = strategies if strategies is not None else [DocumentReadyState(), DomQuiescence()]
+        self.host_timings = host_timings if host_timings is not None else HostTimings()
+        self.slowest_pages = slowest_pages
+        self.pages_waited = 0
+        self.pages_not_ready = 0
+        self._total_wait_in_seconds = 0.0
+        # A min heap of (seconds, url), so the fastest of the slowest pages is the one replaced
+        self._slowest: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def wait(self, driver: WebDriver, url: str) -> float:
+        """Wait until the page at url is ready, returning the seconds waited."""
+        host = get_fully_qualified_domain_name(url)
+        budget = self.host_timings.budget(host)
+        start = time.perf_counter()
+
+        ready = True
+        for strategy in self.strategies:
+            remaining = budget - (time.perf_counter() - start)
+            if remaining <= 0 or not strategy.wait(driver, remaining):
+                ready = False
+                break
+
+        waited = time.perf_counter() - start
+        self.host_timings.record(host, waited, ready)
+        with self._lock:
+            self.pages_waited += 1
+            if not ready:
+                self.pages_not_ready += 1
+            self._total_wait_in_seconds += waited
+            if len(self._slowest) < self.slowest_pages:
+                heapq.heappush(self._slowest, (waited, url))
+            elif self._slowest and waited > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (waited, url))
+        if not ready:
+            logging.info(f"{url} was not ready after {waited:.2f}s")
+        return waited
+
+    @property
+    def total_wait_in_seconds(self) -> float:
+        with self._lock:
+            return self._total_wait_in_seconds
+
+    def slowest(self) -> list[tuple[float, str]]:
+        """The slowest pages to become ready and how long each took, slowest first."""
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
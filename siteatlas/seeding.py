@@ -0,0 +1,182 @@
+import gzip
+import io
+import logging
+import threading
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from typing import Any, Iterator, Optional, IO, cast
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from siteatlas.domains import AllowedDomains, get_domain_matcher
+from siteatlas.url_canonicalisation import CanonicalisationRules, canonicalise_url
+from siteatlas.url_functions import get_scheme_and_fully_qualified_domain
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _local_name(tag: str) -> str:
+    # Drop the xml namespace, e.g. {http://www.sitemaps.org/schemas/sitemap/0.9}loc -> loc
+    return tag.rsplit('}', 1)[-1]
+
+
+class _PrefixedStream(io.RawIOBase):
+    """A stream that replays bytes already read from another stream before reading on."""
+
+    def __init__(self, prefix: bytes, stream: IO[bytes]) -> None:
+        self.prefix = prefix
+        self.stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.prefix[:len(buffer)] if self.prefix else self.stream.read(len(buffer))
+        self.prefix = self.prefix[len(data):]
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_sitemap_stream(response: requests.Response) -> IO[bytes]:
+    """Get the body of a sitemap response as a stream, gunzipping it if needed.
+
+    Servers often send .xml.gz sitemaps as plain application/octet-stream, so the body is
+    sniffed for the gzip magic number rather than trusting the headers.
+    """
+    response.raw.decode_content = True
+    prefix = response.raw.read(len(GZIP_MAGIC))
+    stream = io.BufferedReader(_PrefixedStream(prefix, response.raw))
+    if prefix == GZIP_MAGIC:
+        return cast(IO[bytes], gzip.GzipFile(fileobj=stream))
+    return stream
+
+
+def iter_sitemap_locations(stream: IO[bytes]) -> Iterator[tuple[bool, str]]:
+    """Stream parse a sitemap or sitemap index, yielding (is_index, loc) for each entry.
+
+    Entries are cleared as soon as they are read, so only one is held in memory at a time.
+    """
+    is_index = False
+    root = None
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        tag = _local_name(element.tag)
+        if event == 'start':
+            if root is None:
+                root = element
+                is_index = tag == 'sitemapindex'
+            continue
+        if tag == 'loc' and element.text:
+            yield is_index, element.text.strip()
+        elif tag in ('url', 'sitemap') and root is not None:
+            root.clear()
+
+
+# The rules assumed for a host whose robots.txt could not be read, as RFC 9309 asks
+DISALLOW_ALL = ['User-agent: *', 'Disallow: /']
+
+
+class RobotsRules:
+    """Fetches and caches robots.txt for each host a crawl visits.
+
+    A host that answers 404 or another 4xx has no robots.txt, so may be crawled in full. One that
+    answers 401, 403 or 5xx, or cannot be reached, is not crawled at all.
+    """
+
+    def __init__(self,
+                 session: Optional[requests.Session] = None,
+                 user_agent: str = '*',
+                 timeout_in_seconds: float = 10.0) -> None:
+        self.session = session if session is not None else requests.Session()
+        self.user_agent = user_agent
+        self.timeout_in_seconds = timeout_in_seconds
+        self._parsers: dict[str, RobotFileParser] = {}
+        self._lock = threading.Lock()
+
+    def parser_for(self, url: str) -> RobotFileParser:
+        origin = get_scheme_and_fully_qualified_domain(url)
+        with self._lock:
+            parser = self._parsers.get(origin)
+        if parser is not None:
+            return parser
+
+        parser = RobotFileParser(f'{origin}/robots.txt')
+        try:
+            response = self.session.get(f'{origin}/robots.txt', timeout=self.timeout_in_seconds)
+            if response.status_code in (401, 403) or response.status_code >= 500:
+                parser.parse(DISALLOW_ALL)
+            elif response.status_code >= 400:
+                # There is no robots.txt, so nothing is disallowed
+                parser.parse([])
+            else:
+                parser.parse(response.text.splitlines())
+        except requests.RequestException as e:
+            logging.info(f"Could not fetch {origin}/robots.txt got {e}, so not crawling {origin}")
+            parser.parse(DISALLOW_ALL)
+
+        with self._lock:
+            self._parsers[origin] = parser
+        return parser
+
+    def can_fetch(self, url: str) -> bool:
+        if urlparse(url).scheme not in ('http', 'https'):
+            return True
+        return self.parser_for(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        delay = self.parser_for(url).crawl_delay(self.user_agent)
+        return float(delay) if delay is not None else None
+
+    def sitemaps(self, url: str) -> list[str]:
+        """The sitemaps robots.txt lists for the url's host, or the conventional /sitemap.xml."""
+        sitemaps = self.parser_for(url).site_maps()
+        return list(sitemaps) if sitemaps else [f'{get_scheme_and_fully_qualified_domain(url)}/sitemap.xml']
+
+
+class SitemapSeeder:
+    """Seeds a crawl with the urls in a site's sitemaps, and optionally keeps it within robots.txt."""
+
+    def __init__(self,
+                 robots: Optional[RobotsRules] = None,
+                 obey_robots: bool = True,
+                 max_sitemaps: int = 10_000) -> None:
+        self.robots = robots if robots is not None else RobotsRules()
+        self.obey_robots = obey_robots
+        self.max_sitemaps = max_sitemaps
+
+    def is_allowed(self, url: str) -> bool:
+        return not self.obey_robots or self.robots.can_fetch(url)
+
+    def iter_seed_urls(self,
+                       url: str,
+                       allowed_domains: AllowedDomains,
+                       canonical_rules: Optional[CanonicalisationRules] = None) -> Iterator[str]:
+        """Yield the canonical, allowed urls listed in the sitemaps of url's site."""
+        if urlparse(url).scheme not in ('http', 'https'):
+            return
+
+        sitemaps = deque(self.robots.sitemaps(url))
+        seen_sitemaps: set[str] = set()
+        domain_matcher = get_domain_matcher(allowed_domains)
+        while sitemaps and len(seen_sitemaps) < self.max_sitemaps:
+            sitemap_url = sitemaps.popleft()
+            if sitemap_url in seen_sitemaps:
+                continue
+            seen_sitemaps.add(sitemap_url)
+
+            try:
+                with self.robots.session.get(sitemap_url, stream=True,
+                                             timeout=self.robots.timeout_in_seconds) as response:
+                    if response.status_code >= 400:
+                        logging.info(f"Could not fetch sitemap {sitemap_url} got {response.status_code}")
+                        continue
+                    for is_index, location in iter_sitemap_locations(open_sitemap_stream(response)):
+                        if is_index:
+                            sitemaps.append(location)
+                            continue
+                        seed_url = canonicalise_url(location, canonical_rules)
+                        if domain_matcher.matches(seed_url) and self.is_allowed(seed_url):
+                            yield seed_url
+            except (requests.RequestException, ElementTree.ParseError, OSError) as e:
+                logging.info(f"Could not read sitemap {sitemap_url} got {e}")
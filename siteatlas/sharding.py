@@ -0,0 +1,382 @@
+import hashlib
+import logging
+import multiprocessing
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import defaultdict, deque
+from multiprocessing.managers import BaseManager
+from typing import Callable, Iterable, Optional
+
+from siteatlas.crawler import CrawlState, PageFetcher
+from siteatlas.site_map import SiteMap
+from siteatlas.url_store import CompactDepthMap, CompactUrlSet
+
+# A url sent to the shard that owns it, and the depth it was found at
+ShardMessage = tuple[str, int]
+
+
+def shard_for(url: str, shards: int) -> int:
+    """The shard that owns a canonical url - the same in every process and on every machine."""
+    return int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), 'big') % shards
+
+
+class ShardQueues(ABC):
+    """Carries urls between the shards of a crawl, and knows when the crawl is finished.
+
+    Each shard has an inbox of urls owned by it. pending counts the urls that are in an inbox,
+    or taken from one but not yet fetched, across every shard; when it reaches 0 there is
+    nothing left for any shard to do.
+    """
+
+    @abstractmethod
+    def put(self, shard: int, messages: list[ShardMessage]) -> None:
+        """Send urls to a shard's inbox, adding them to pending."""
+
+    @abstractmethod
+    def get(self, shard: int, max_messages: int) -> list[ShardMessage]:
+        """Take up to max_messages urls from a shard's inbox."""
+
+    @abstractmethod
+    def task_done(self, finished: int, started: int = 0) -> None:
+        """Take finished urls off pending, and add urls started without going through an inbox."""
+
+    @abstractmethod
+    def pending(self) -> int:
+        ...
+
+    @abstractmethod
+    def put_result(self, shard: int, site_map: SiteMap) -> None:
+        ...
+
+    @abstractmethod
+    def results(self) -> dict[int, SiteMap]:
+        ...
+
+
+class InMemoryShardQueues(ShardQueues):
+    """Queues held in one process - share them between processes or machines with ShardQueueManager."""
+
+    def __init__(self, shards: int) -> None:
+        self.shards = shards
+        self._inboxes: list[deque[ShardMessage]] = [deque() for _ in range(shards)]
+        self._pending = 0
+        self._results: dict[int, SiteMap] = {}
+        self._lock = threading.Lock()
+
+    def put(self, shard: int, messages: list[ShardMessage]) -> None:
+        with self._lock:
+            self._pending += len(messages)
+            self._inboxes[shard].extend(messages)
+
+    def get(self, shard: int, max_messages: int) -> list[ShardMessage]:
+        with self._lock:
+            inbox = self._inboxes[shard]
+            return [inbox.popleft() for _ in range(min(max_messages, len(inbox)))]
+
+    def task_done(self, finished: int, started: int = 0) -> None:
+        with self._lock:
+            self._pending += started - finished
+
+    def pending(self) -> int:
+        return self._pending
+
+    def put_result(self, shard: int, site_map: SiteMap) -> None:
+        with self._lock:
+            self._results[shard] = site_map
+
+    def results(self) -> dict[int, SiteMap]:
+        with self._lock:
+            return dict(self._results)
+
+
+class SqliteShardQueues(ShardQueues):
+    """Queues in a SQLite file, shared by worker processes on one machine.
+
+    Each process opens its own connection, so pass a factory such as partial(SqliteShardQueues, path)
+    to the workers rather than an instance.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY, shard INTEGER NOT NULL, url TEXT NOT NULL,
+                                         depth INTEGER NOT NULL);
+    CREATE INDEX IF NOT EXISTS messages_by_shard ON messages (shard, id);
+    CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY CHECK (id = 0), count INTEGER NOT NULL);
+    INSERT OR IGNORE INTO pending (id, count) VALUES (0, 0);
+    CREATE TABLE IF NOT EXISTS results (shard INTEGER NOT NULL, url TEXT NOT NULL, allowed INTEGER NOT NULL);
+    """
+
+    def __init__(self, path: str, timeout_in_seconds: float = 60.0) -> None:
+        self.path = path
+        # Transactions are begun explicitly, so that reads and writes of a shard's inbox are atomic
+        self.connection = sqlite3.connect(path, timeout=timeout_in_seconds, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(self.SCHEMA)
+
+    def _transaction(self) -> sqlite3.Connection:
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def _commit(self) -> None:
+        self.connection.execute('COMMIT')
+
+    def put(self, shard: int, messages: list[ShardMessage]) -> None:
+        connection = self._transaction()
+        connection.executemany('INSERT INTO messages (shard, url, depth) VALUES (?, ?, ?)',
+                               ((shard, url, depth) for url, depth in messages))
+        connection.execute('UPDATE pending SET count = count + ?', (len(messages),))
+        self._commit()
+
+    def get(self, shard: int, max_messages: int) -> list[ShardMessage]:
+        connection = self._transaction()
+        rows = connection.execute('SELECT id, url, depth FROM messages WHERE shard = ? ORDER BY id LIMIT ?',
+                                  (shard, max_messages)).fetchall()
+        if rows:
+            connection.execute('DELETE FROM messages WHERE shard = ? AND id <= ?', (shard, rows[-1][0]))
+        self._commit()
+        return [(url, depth) for _, url, depth in rows]
+
+    def task_done(self, finished: int, started: int = 0) -> None:
+        connection = self._transaction()
+        connection.execute('UPDATE pending SET count = count + ?', (started - finished,))
+        self._commit()
+
+    def pending(self) -> int:
+        return int(self.connection.execute('SELECT count FROM pending').fetchone()[0])
+
+    def put_result(self, shard: int, site_map: SiteMap) -> None:
+        connection = self._transaction()
+        connection.execute('DELETE FROM results WHERE shard = ?', (shard,))
+        connection.executemany('INSERT INTO results (shard, url, allowed) VALUES (?, ?, 1)',
+                               ((shard, url) for url in site_map.urls))
+        connection.executemany('INSERT INTO results (shard, url, allowed) VALUES (?, ?, 0)',
+                               ((shard, url) for url in site_map.ignored_urls))
+        self._commit()
+
+    def results(self) -> dict[int, SiteMap]:
+        results: dict[int, SiteMap] = defaultdict(SiteMap)
+        for shard, url, allowed in self.connection.execute('SELECT shard, url, allowed FROM results'):
+            (results[shard].urls if allowed else results[shard].ignored_urls).add(url)
+        return dict(results)
+
+
+# The queues served by this process, when it is a ShardQueueManager's server
+_served_queues: dict[int, InMemoryShardQueues] = {}
+
+
+def _get_served_queues(shards: int) -> InMemoryShardQueues:
+    return _served_queues.setdefault(shards, InMemoryShardQueues(shards))
+
+
+class ShardQueueManager(BaseManager):
+    """Serves InMemoryShardQueues over a socket, for workers in other processes or on other machines.
+
+    Start one with serve_shard_queues, and connect workers to it with connect_shard_queues.
+    """
+
+
+ShardQueueManager.register('queues', callable=_get_served_queues)
+
+
+def serve_shard_queues(address: tuple[str, int], authkey: bytes) -> ShardQueueManager:
+    """Start a server process holding the queues; shut it down when the crawl is done."""
+    manager = ShardQueueManager(address=address, authkey=authkey)
+    manager.start()
+    return manager
+
+
+def connect_shard_queues(address: tuple[str, int], authkey: bytes, shards: int) -> ShardQueues:
+    manager = ShardQueueManager(address=address, authkey=authkey)
+    manager.connect()
+    queues: ShardQueues = manager.queues(shards)  # type: ignore[attr-defined]
+    return queues
+
+
+class _PageLinks:
+    """The links on each page a shard has fetched, in 4 bytes a link."""
+
+    def __init__(self) -> None:
+        self.urls = CompactUrlSet()
+        # Where each fetched page's links start and end in targets, by url id, or -1 if not fetched
+        self.starts = array('q')
+        self.ends = array('q')
+        self.targets = array('I')
+
+    def add(self, url: str, linked_urls: Iterable[str]) -> None:
+        page = self.urls.add_with_id(url)
+        start = len(self.targets)
+        self.targets.extend(self.urls.add_with_id(linked_url) for linked_url in linked_urls)
+        if page >= len(self.starts):
+            missing = page + 1 - len(self.starts)
+            self.starts.extend([-1] * missing)
+            self.ends.extend([-1] * missing)
+        self.starts[page], self.ends[page] = start, len(self.targets)
+
+    def fetched(self, url: str) -> bool:
+        page = self.urls.get_id(url)
+        return page is not None and page < len(self.starts) and self.starts[page] != -1
+
+    def links_from(self, url: str) -> list[str]:
+        page = self.urls.get_id(url)
+        if page is None or page >= len(self.starts):
+            return []
+        return [self.urls.url_for(target) for target in self.targets[self.starts[page]:self.ends[page]]]
+
+
+class _ShardDepths:
+    """Gives every url a shard knows the depth of its shortest path, fetching each page only once.
+
+    Shards take urls in the order they arrive rather than breadth first, so a url may be found
+    by a long path before a short one. A shorter path only makes the url worth fetching if it was
+    beyond max_depth before. Otherwise its depth is lowered in place, and if it has been fetched
+    the shorter path is passed on to the urls it links to from the links recorded when it was.
+    """
+
+    def __init__(self, state: CrawlState, shard: int, shards: int) -> None:
+        self.state = state
+        self.shard = shard
+        self.shards = shards
+        self.page_links = _PageLinks()
+        # Urls already sent to other shards and the depth they were sent at, so links on every page are
+        # not sent again and again - only when a shorter path to them is found
+        self.sent_urls = CompactUrlSet()
+        self.sent_depths = CompactDepthMap(self.sent_urls)
+
+    def add(self, found: Iterable[ShardMessage]) -> dict[int, list[ShardMessage]]:
+        """Record urls found at their depths, returning those to send to the shards that own them."""
+        outbox: dict[int, list[ShardMessage]] = defaultdict(list)
+        to_record = deque(found)
+        while to_record:
+            url, depth = to_record.popleft()
+            owner = shard_for(url, self.shards)
+            if owner != self.shard:
+                if depth < self.sent_depths.get(url, depth + 1):
+                    self.sent_urls.add(url)
+                    self.sent_depths[url] = depth
+                    outbox[owner].append((url, depth))
+                continue
+            known_depth = self.state.depths.get(url)
+            if known_depth is None:
+                self.state.add_urls([url], depth)
+            elif depth < known_depth:
+                self.state.depths[url] = depth
+                if self.page_links.fetched(url):
+                    to_record.extend((linked_url, depth + 1) for linked_url in self.page_links.links_from(url))
+                elif not self.state.within_depth(known_depth) and self.state.within_depth(depth):
+                    self.state.frontier.push(url, depth)
+        return outbox
+
+    def add_page(self, url: str, page_map: SiteMap) -> dict[int, list[ShardMessage]]:
+        """Record the links on a fetched page, returning those to send to the shards that own them."""
+        self.page_links.add(url, page_map.urls)
+        depth = self.state.depths[url]
+        self.state.add_page(url, depth, SiteMap(set(), page_map.ignored_urls))
+        return self.add((found_url, depth + 1) for found_url in page_map.urls)
+
+
+def run_shard_worker(queues_factory: Callable[[], ShardQueues],
+                     shard: int,
+                     shards: int,
+                     fetcher_factory: Callable[[], PageFetcher],
+                     max_depth: int = 10,
+                     batch_size: int = 100,
+                     poll_in_seconds: float = 0.05) -> SiteMap:
+    """Crawl the urls owned by one shard until no shard has anything left to do.
+
+    Urls a page links to are kept if this shard owns them, and sent to their owner otherwise, so
+    each url is only ever known to one shard and is fetched at most once. Every url ends with the
+    depth of its shortest path, as in a single process crawl, see _ShardDepths. Ignored urls are
+    kept by the shard that found them, and deduplicated when the results are merged.
+    """
+    queues = queues_factory()
+    fetch_page = fetcher_factory()
+    state = CrawlState(max_depth=max_depth)
+    depths = _ShardDepths(state, shard, shards)
+    fetched_pages = 0
+    try:
+        while True:
+            received = queues.get(shard, batch_size)
+            if received:
+                queued_before = len(state.frontier)
+                depths.add(received)
+                queues.task_done(finished=len(received), started=len(state.frontier) - queued_before)
+
+            if state.frontier:
+                url, _ = state.frontier.pop()
+                logging.info(f"Shard {shard} fetching {url} at depth {state.depths[url]}")
+                page_map = fetch_page(url)
+                fetched_pages += 1
+
+                queued_before = len(state.frontier)
+                outbox = depths.add_page(url, page_map)
+                for owner, messages in outbox.items():
+                    queues.put(owner, messages)
+                queues.task_done(finished=1, started=len(state.frontier) - queued_before)
+            elif not received:
+                if not queues.pending():
+                    break
+                time.sleep(poll_in_seconds)
+    finally:
+        state.stop()
+
+    logging.info(f"Shard {shard} fetched {fetched_pages} pages and owns {len(state.site_map.urls)} urls")
+    queues.put_result(shard, state.site_map)
+    return state.site_map
+
+
+def crawl_sharded(urls: Iterable[str],
+                  fetcher_factory: Callable[[], PageFetcher],
+                  queues_factory: Callable[[], ShardQueues],
+                  shards: int,
+                  max_depth: int = 10,
+                  batch_size: int = 100,
+                  processes: Optional[int] = None,
+                  poll_in_seconds: float = 0.05) -> SiteMap:
+    """Crawl from canonical seed urls with one worker process per shard, merging their site maps at the end.
+
+    fetcher_factory and queues_factory are called in each worker, so must be picklable, e.g. a
+    partial of a module level function. Use partial(SqliteShardQueues, path) on one machine, or
+    partial(connect_shard_queues, address, authkey, shards) with a served ShardQueueManager - workers
+    on other machines can join that crawl by calling run_shard_worker for the shards they own.
+    The shards run here are range(processes), all of them by default.
+    """
+    queues = queues_factory()
+    seeds: dict[int, list[ShardMessage]] = defaultdict(list)
+    for url in dict.fromkeys(urls):
+        seeds[shard_for(url, shards)].append((url, 0))
+    for shard, messages in seeds.items():
+        queues.put(shard, messages)
+
+    workers = [multiprocessing.Process(target=run_shard_worker,
+                                       args=(queues_factory, shard, shards, fetcher_factory, max_depth, batch_size,
+                                             poll_in_seconds),
+                                       name=f'siteatlas-shard-{shard}')
+               for shard in range(shards if processes is None else processes)]
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        failed = [worker.name for worker in workers if worker.exitcode not in (None, 0)]
+        if failed:
+            # The urls a failed shard owned will never be done, so the others would wait forever
+            for worker in workers:
+                worker.terminate()
+            raise RuntimeError(f"Shard workers {', '.join(failed)} failed")
+        time.sleep(poll_in_seconds)
+    failed = [worker.name for worker in workers if worker.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Shard workers {', '.join(failed)} failed")
+
+    results = queues.results()
+    while len(results) < shards:
+        # Shards run elsewhere finish in their own time
+        time.sleep(poll_in_seconds)
+        results = queues.results()
+
+    site_map = SiteMap()
+    for shard_map in results.values():
+        site_map += shard_map
+    logging.info(f"Completed sharded crawl with {len(site_map.urls)} allowed urls "
+                 f"and {len(site_map.ignored_urls)} disallowed urls")
+    return site_map
@@ -0,0 +1,58 @@
+from dataclasses import dataclass, field
+from typing import Union
+
+from siteatlas.url_functions import get_fully_qualified_domain_name
+from siteatlas.url_store import CompactUrlSet
+
+# Either a plain set, or a CompactUrlSet for crawls of millions of urls
+UrlSet = Union[set[str], CompactUrlSet]
+
+
+@dataclass
+class SiteMap:
+    urls: UrlSet = field(default_factory=set)
+    ignored_urls: UrlSet = field(default_factory=set)
+    # Allowed urls the crawl chose not to fetch, e.g. crawler traps or pages disallowed by robots.txt,
+    # or fetched but chose not to follow the links of, e.g. pages duplicating another
+    skipped_urls: UrlSet = field(default_factory=set)
+
+    @classmethod
+    def compact(cls) -> 'SiteMap':
+        """An empty SiteMap backed by CompactUrlSets."""
+        return cls(CompactUrlSet(), CompactUrlSet(), CompactUrlSet())
+
+    def _empty(self) -> 'SiteMap':
+        return SiteMap.compact() if isinstance(self.urls, CompactUrlSet) else SiteMap()
+
+    def diff_site_maps(self, other: 'SiteMap') -> 'SiteMap':
+        """Get the urls in this map that are not in the other one."""
+        diff = self._empty()
+        diff.urls.update(url for url in self.urls if url not in other.urls)
+        diff.ignored_urls.update(url for url in self.ignored_urls if url not in other.ignored_urls)
+        diff.skipped_urls.update(url for url in self.skipped_urls if url not in other.skipped_urls)
+        return diff
+
+    def get_ignored_url_domains(self) -> set[str]:
+        return {get_fully_qualified_domain_name(url) for url in self.ignored_urls}
+
+    def update(self, other: 'SiteMap') -> None:
+        """Add the urls of another map to this one in place."""
+        self.urls.update(other.urls)
+        self.ignored_urls.update(other.ignored_urls)
+        self.skipped_urls.update(other.skipped_urls)
+
+    def difference_update(self, other: 'SiteMap') -> None:
+        """Remove the urls of another map from this one in place."""
+        self.urls.difference_update(other.urls)
+        self.ignored_urls.difference_update(other.ignored_urls)
+        self.skipped_urls.difference_update(other.skipped_urls)
+
+    def __add__(self, other: 'SiteMap') -> 'SiteMap':
+        combined = self._empty()
+        combined.update(self)
+        combined.update(other)
+        return combined
+
+    def __iadd__(self, other: 'SiteMap') -> 'SiteMap':
+        self.update(other)
+        return self
@@ -1,140 +1,311 @@
-import hashlib
 import logging
 import time
-from dataclasses import dataclass, field
-from typing import Optional, Union, List
+from functools import partial
+from typing import Callable, Iterator, Optional, Union, List, TYPE_CHECKING
 
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.common.by import By
 
+from siteatlas.button_probe import probe_buttons
+from siteatlas.crawler import CrawlState, FoundUrl, Frontier, PageFetcher, iter_crawl, iter_crawl_concurrently
+from siteatlas.crawl_store import SqliteCrawlStore
+from siteatlas.domains import AllowedDomains, get_domain_matcher
+from siteatlas.driver_pool import DriverPool
+from siteatlas.link_extraction import LinkExtractor, PageSource, DEFAULT_LINK_EXTRACTOR
+from siteatlas.link_graph import LinkGraphBuilder
+from siteatlas.politeness import HostScheduler
+from siteatlas.profiling import CrawlProfiler, NO_PROFILER
+from siteatlas.readiness import PageReadiness
+from siteatlas.seeding import SitemapSeeder
+from siteatlas.site_map import SiteMap
+from siteatlas.traps import TrapDetector
+from siteatlas.url_canonicalisation import CanonicalisationRules, canonicalise_url
 from siteatlas.url_functions import get_fully_qualified_domain_name, get_absolute_url
 
-
-@dataclass
-class SiteMap:
-    urls: set[str] = field(default_factory=set)
-    ignored_urls: set[str] = field(default_factory=set)
-
-    def diff_site_maps(self, other: 'SiteMap') -> 'SiteMap':
-        urls_diff = self.urls = self.urls.difference(other.urls)
-        ignored_urls_diff = self.ignored_urls.difference(other.ignored_urls)
-        return SiteMap(urls_diff, ignored_urls_diff)
-
-    def get_ignored_url_domains(self) -> set[str]:
-        return {get_fully_qualified_domain_name(url) for url in self.ignored_urls}
-
-    def __add__(self, other: 'SiteMap') -> 'SiteMap':
-        combined_urls = self.urls.union(other.urls)
-        combined_ignored_urls = self.ignored_urls.union(other.ignored_urls)
-        return SiteMap(combined_urls, combined_ignored_urls)
-
-
-def get_element_hash(driver: WebDriver, element):  # type: ignore
-    inner_html = driver.execute_script("return arguments[0].outerHTML;", element)  # type: ignore
-    return hashlib.md5(inner_html.encode()).hexdigest()
+if TYPE_CHECKING:
+    from siteatlas.http_fetch import HttpFetcher
+    from siteatlas.incremental import IncrementalFetcher
 
 
 def get_button_targets(driver: WebDriver,
-                       allowed_domains: set[str]) -> SiteMap:
-    # Attempt to find all buttons on the page
-    button_urls = set()
-    base_url = driver.current_url
-
-    buttons_seen = []
-    # find the next unseen button
-
-    more_buttons = True
-    while more_buttons:
-        all_buttons = driver.find_elements(By.TAG_NAME, 'button')
-        next_button = [button for button in all_buttons if get_element_hash(driver, button) not in buttons_seen]
-        if next_button:
-            button = next_button[0]
-            try:
-                # scroll the button into view
-                buttons_seen.append(get_element_hash(driver, button))
-                driver.execute_script("arguments[0].scrollIntoView();", button)  # type: ignore
-                # click the button via execute script
-                # JavaScript to create and dispatch the event
-                mousedown_script = """
-                var targetElement = arguments[0];
-                var mouseDownEvent = document.createEvent('MouseEvents');
-                mouseDownEvent.initMouseEvent(
-                    'mousedown', true, true, window, 0, 0, 0, 0, 0, 
-                    false, false, false, false, 0, null
-                );
-                targetElement.dispatchEvent(mouseDownEvent);
-                """
-                # Execute the script
-                driver.execute_script(mousedown_script, button)  # type: ignore
-                time.sleep(0.25)
-                if driver.current_url != base_url:
-                    button_urls.add(driver.current_url)
-                    driver.get(base_url)
-            except Exception as e:
-                logging.info(f"Could not click on button got {e}")
-        else:
-            more_buttons = False
-
-    urls = {url for url in button_urls if get_fully_qualified_domain_name(url) in allowed_domains}
+                       allowed_domains: AllowedDomains,
+                       canonical_rules: Optional[CanonicalisationRules] = None,
+                       profiler: Optional[CrawlProfiler] = None) -> SiteMap:
+    """Get the urls the buttons on the current page navigate to."""
+    try:
+        probe_result = probe_buttons(driver)
+        if profiler:
+            profiler.count('buttons_probed', probe_result.buttons_probed)
+            profiler.count('reloads', probe_result.reloads)
+        button_urls = {canonicalise_url(url, canonical_rules) for url in probe_result.urls}
+    except WebDriverException as e:
+        logging.info(f"Could not probe buttons on {driver.current_url} got {e}")
+        button_urls = set()
+
+    urls = get_domain_matcher(allowed_domains).filter(button_urls)
     # Return the buttons as a list of urls
-    return SiteMap(set(urls), set())
+    return SiteMap(urls, set())
 
 
-def get_links_map(html: str,
+def get_links_map(html: PageSource,
                   base_url: str,
-                  allowed_domains: set[str]) -> SiteMap:
-    """Get a links from a single page."""
-    # Create a BeautifulSoup object from the html
-    page_soup = BeautifulSoup(html, 'html.parser')
-    # Find all the links in the html
-    link_tags = page_soup.findAll('a')
-    urls = set([str(link['href']) for link in link_tags if 'href' in link.attrs])
-
-    # map relative links to absolute links
-    absolute_urls = set()
-    for url in urls:
-        absolute_urls.add(get_absolute_url(base_url, url))
-
-    urls = {url for url in absolute_urls if get_fully_qualified_domain_name(url) in allowed_domains}
-    ignored_urls = absolute_urls.difference(urls)
+                  allowed_domains: AllowedDomains,
+                  link_extractor: Optional[LinkExtractor] = None,
+                  canonical_rules: Optional[CanonicalisationRules] = None,
+                  profiler: Optional[CrawlProfiler] = None) -> SiteMap:
+    """Get a links from a single page.
+
+    html is the page's html, or the driver showing it when using a BrowserLinkExtractor.
+    """
+    if link_extractor is None:
+        link_extractor = DEFAULT_LINK_EXTRACTOR
+    if profiler is None:
+        profiler = NO_PROFILER
+    # Find all the links in the html, ignoring whitespace around them as browsers do
+    with profiler.span('parse_html', base_url):
+        urls = {href.strip() for href in link_extractor.get_hrefs(html)}
+
+    # map relative links to absolute, canonical links
+    with profiler.span('canonicalise', base_url):
+        absolute_urls = set()
+        for url in urls:
+            absolute_urls.add(canonicalise_url(get_absolute_url(base_url, url), canonical_rules))
+
+        urls, ignored_urls = get_domain_matcher(allowed_domains).partition(absolute_urls)
 
     logging.info(f"Found {len(urls)} allowed urls and {len(ignored_urls)} disallowed urls in {base_url}")
     # Return the links as a list of urls
     return SiteMap(urls, ignored_urls)
 
 
-def get_site_map(url: Union[str, List[str]],
+def get_page_map(url: str,
                  driver: WebDriver,
-                 site_map: SiteMap = SiteMap(),
-                 current_depth: int = 0,
-                 max_depth: int = 10,
-                 allowed_domains: Optional[set[str]] = None,
-                 wait_in_seconds: float = 0.1) -> SiteMap:
-    """Map a whole site."""
+                 allowed_domains: set[str],
+                 wait_in_seconds: float,
+                 readiness: Optional[PageReadiness] = None,
+                 link_extractor: Optional[LinkExtractor] = None,
+                 canonical_rules: Optional[CanonicalisationRules] = None,
+                 profiler: Optional[CrawlProfiler] = None,
+                 trap_detector: Optional[TrapDetector] = None) -> SiteMap:
+    """Load a single page and get the links and button targets on it.
+
+    Buttons are not probed on a page the trap detector finds duplicates one already fetched, as
+    its links will not be followed.
+    """
+    if profiler is None:
+        profiler = NO_PROFILER
+    with profiler.span('navigate', url):
+        driver.get(url)
+    with profiler.span('wait', url):
+        if readiness:
+            readiness.wait(driver, url)
+        else:
+            time.sleep(wait_in_seconds)
+    with profiler.span('page_source', url):
+        page: PageSource = driver if link_extractor and link_extractor.reads_driver else driver.page_source
+
+    # Get any new links from the page
+    links_map = get_links_map(page, url, allowed_domains, link_extractor, canonical_rules, profiler)
+    if trap_detector and trap_detector.skip_duplicate_content:
+        # Only read the html a BrowserLinkExtractor skipped when it will be fingerprinted
+        if not isinstance(page, str):
+            with profiler.span('page_source', url):
+                page = driver.page_source
+        if trap_detector.check_content(url, page):
+            return links_map
+
+    # Get any new links via buttons
+    with profiler.span('buttons', url):
+        buttons_map = get_button_targets(driver, allowed_domains, canonical_rules, profiler)
+
+    return buttons_map + links_map
+
+
+def _passes_all(url_filters: list[Callable[[str], bool]], url: str) -> bool:
+    return all(url_filter(url) for url_filter in url_filters)
+
+
+def iter_site_map(url: Union[str, List[str]],
+                  driver: Union[WebDriver, DriverPool],
+                  site_map: Optional[SiteMap] = None,
+                  current_depth: int = 0,
+                  max_depth: int = 10,
+                  allowed_domains: Optional[set[str]] = None,
+                  wait_in_seconds: float = 0.1,
+                  http_fetcher: Optional['HttpFetcher'] = None,
+                  readiness: Optional[PageReadiness] = None,
+                  link_extractor: Optional[LinkExtractor] = None,
+                  canonical_rules: Optional[CanonicalisationRules] = None,
+                  crawl_store: Optional[SqliteCrawlStore] = None,
+                  incremental: Optional['IncrementalFetcher'] = None,
+                  sitemap_seeder: Optional[SitemapSeeder] = None,
+                  scheduler: Optional[HostScheduler] = None,
+                  profiler: Optional[CrawlProfiler] = None,
+                  trap_detector: Optional[TrapDetector] = None,
+                  link_graph: Optional[LinkGraphBuilder] = None) -> Iterator[FoundUrl]:
+    """Map a whole site, yielding each url with its depth, source page and whether it is allowed as soon as it is found.
+
+    The urls seen so far are still kept to avoid fetching a page twice, but in site_map, which
+    defaults to a compact SiteMap so memory stays small however many urls are yielded. Urls found
+    by an earlier run of a resumed crawl are not yielded again.
+
+    Pass a DriverPool instead of a single driver to render pages in parallel, and an HttpFetcher
+    to fetch static pages without the browser. Pass a PageReadiness to wait for each page to be
+    ready instead of sleeping for wait_in_seconds, and a LinkExtractor to choose how links are
+    read from rendered pages. Urls are canonicalised with canonical_rules, or DEFAULT_RULES.
+
+    Pass a SqliteCrawlStore to checkpoint the crawl as it runs; calling again with the same store
+    resumes from the last checkpoint without refetching pages that were already done.
+
+    Pass an IncrementalFetcher holding the previous run's PageIndex to only render pages that have
+    changed since; it then takes the place of http_fetcher. Pass a SitemapSeeder to also start
+    from every url in the site's sitemaps and, if it obeys robots.txt, never fetch disallowed pages.
+
+    Pass a HostScheduler to rate limit each host separately; it watches the http fetcher's session
+    so it can back off from hosts that answer 429 or 5xx.
+
+    Pass a CrawlProfiler to time each phase of every page; its report is logged when the crawl ends.
+
+    Pass a TrapDetector to skip urls in crawler traps such as calendars and faceted search, and
+    with skip_duplicate_content not to follow the links on pages whose content duplicates another's.
+    Urls skipped by it, or disallowed by robots.txt, are recorded in the site map's skipped_urls.
+
+    Pass a LinkGraphBuilder to also record which page links to which, buttons included; freeze it
+    once the crawl ends to query the link graph.
+    """
     if not isinstance(url, list):
         url = [url]
+    url = [canonicalise_url(single_url, canonical_rules) for single_url in url]
 
     if not allowed_domains:
         allowed_domains = set()
 
-    result = SiteMap()
-
+    # If allowed_domains does not include the seed domains then add them
     for single_url in url:
-        # If allowed_domains does not include the current domains then add it
-        if get_fully_qualified_domain_name(single_url) not in allowed_domains:
-            allowed_domains.add(get_fully_qualified_domain_name(single_url))
+        allowed_domains.add(get_fully_qualified_domain_name(single_url))
+
+    url_filters: list[Callable[[str], bool]] = []
+    if sitemap_seeder and sitemap_seeder.obey_robots:
+        url_filters.append(sitemap_seeder.is_allowed)
+    if trap_detector:
+        # After robots.txt, so disallowed urls are not counted against a template's budget
+        url_filters.append(trap_detector.is_allowed)
+    url_filter = partial(_passes_all, url_filters) if url_filters else None
+    page_filter = trap_detector.follows_links if trap_detector else None
+    frontier = scheduler if scheduler is not None else Frontier()
+    if site_map is None:
+        site_map = SiteMap.compact()
+    if crawl_store:
+        state = crawl_store.load_state(max_depth=max_depth, site_map=site_map, url_filter=url_filter,
+                                       frontier=frontier, page_filter=page_filter)
+    else:
+        state = CrawlState(site_map=site_map,
+                           frontier=frontier,
+                           max_depth=max_depth,
+                           url_filter=url_filter,
+                           page_filter=page_filter)
+    if link_graph:
+        state.listeners.append(link_graph)
+    for single_url in url:
+        if state.add_seed(single_url, current_depth):
+            yield FoundUrl(single_url, current_depth, None, True)
+    if sitemap_seeder:
+        for single_url in url:
+            for seed_url in sitemap_seeder.iter_seed_urls(single_url, allowed_domains, canonical_rules):
+                if state.add_seed(seed_url, current_depth):
+                    yield FoundUrl(seed_url, current_depth, None, True)
+
+    fetch_page: PageFetcher
+    if isinstance(driver, DriverPool):
+        pooled_fetch_page = partial(get_page_map,
+                                    allowed_domains=allowed_domains,
+                                    wait_in_seconds=wait_in_seconds,
+                                    readiness=readiness,
+                                    link_extractor=link_extractor,
+                                    canonical_rules=canonical_rules,
+                                    profiler=profiler,
+                                    trap_detector=trap_detector)
+        fetch_page = partial(driver.fetch, fetch_page=pooled_fetch_page)
+    else:
+        fetch_page = partial(get_page_map,
+                             driver=driver,
+                             allowed_domains=allowed_domains,
+                             wait_in_seconds=wait_in_seconds,
+                             readiness=readiness,
+                             link_extractor=link_extractor,
+                             canonical_rules=canonical_rules,
+                             profiler=profiler,
+                             trap_detector=trap_detector)
+
+    if incremental:
+        http_fetcher = incremental.http_fetcher
+        fetch_page = partial(incremental.fetch_page,
+                             allowed_domains=allowed_domains,
+                             browser_fetch_page=fetch_page,
+                             canonical_rules=canonical_rules,
+                             trap_detector=trap_detector)
+    elif http_fetcher:
+        fetch_page = partial(http_fetcher.fetch_page,
+                             allowed_domains=allowed_domains,
+                             browser_fetch_page=fetch_page,
+                             canonical_rules=canonical_rules,
+                             profiler=profiler,
+                             trap_detector=trap_detector)
+    if scheduler and http_fetcher:
+        scheduler.watch(http_fetcher.session)
+
+    if isinstance(driver, DriverPool):
+        # Pages fetched over http don't hold a driver, so run as many workers as there are connections
+        workers = max(driver.size, http_fetcher.pool_size) if http_fetcher else driver.size
+        yield from iter_crawl_concurrently(state, fetch_page, workers, profiler)
+    else:
+        yield from iter_crawl(state, fetch_page, profiler)
+    if profiler:
+        profiler.stop()
+        logging.info(profiler.report())
 
-        site_map = get_site_map_recursive(url=single_url,
-                                          driver=driver,
-                                          site_map=site_map,
-                                          allowed_domains=allowed_domains,
-                                          current_depth=current_depth,
-                                          max_depth=max_depth,
-                                          wait_in_seconds=wait_in_seconds)
-        result = result + site_map
 
-    return result
+def get_site_map(url: Union[str, List[str]],
+                 driver: Union[WebDriver, DriverPool],
+                 site_map: Optional[SiteMap] = None,
+                 current_depth: int = 0,
+                 max_depth: int = 10,
+                 allowed_domains: Optional[set[str]] = None,
+                 wait_in_seconds: float = 0.1,
+                 http_fetcher: Optional['HttpFetcher'] = None,
+                 readiness: Optional[PageReadiness] = None,
+                 link_extractor: Optional[LinkExtractor] = None,
+                 canonical_rules: Optional[CanonicalisationRules] = None,
+                 crawl_store: Optional[SqliteCrawlStore] = None,
+                 incremental: Optional['IncrementalFetcher'] = None,
+                 sitemap_seeder: Optional[SitemapSeeder] = None,
+                 scheduler: Optional[HostScheduler] = None,
+                 profiler: Optional[CrawlProfiler] = None,
+                 trap_detector: Optional[TrapDetector] = None,
+                 link_graph: Optional[LinkGraphBuilder] = None) -> SiteMap:
+    """Map a whole site, returning every url once the crawl has finished. See iter_site_map for the options."""
+    if site_map is None:
+        site_map = SiteMap()
+    for _ in iter_site_map(url=url,
+                           driver=driver,
+                           site_map=site_map,
+                           current_depth=current_depth,
+                           max_depth=max_depth,
+                           allowed_domains=allowed_domains,
+                           wait_in_seconds=wait_in_seconds,
+                           http_fetcher=http_fetcher,
+                           readiness=readiness,
+                           link_extractor=link_extractor,
+                           canonical_rules=canonical_rules,
+                           crawl_store=crawl_store,
+                           incremental=incremental,
+                           sitemap_seeder=sitemap_seeder,
+                           scheduler=scheduler,
+                           profiler=profiler,
+                           trap_detector=trap_detector,
+                           link_graph=link_graph):
+        pass
+    return site_map
 
 
 def get_site_map_recursive(url: str,
@@ -144,45 +315,14 @@ def get_site_map_recursive(url: str,
                            current_depth: int,
                            max_depth: int,
                            wait_in_seconds: float) -> SiteMap:
-    """Map a whole site."""
-    logging.info(f"Starting get_site_map map for {url} at depth {current_depth}")
-
-    if max_depth and current_depth >= max_depth:
-        return site_map
-
-    driver.get(url)
-    time.sleep(wait_in_seconds)
-    html = driver.page_source
-
-    # Add self to all
-    site_map.urls.add(url)
-
-    # Get any new links from the page
-    links_map = get_links_map(html, url, allowed_domains)
-
-    # Get any new links via buttons
-    buttons_map = get_button_targets(driver, allowed_domains)
-
-    new_map = buttons_map + links_map
-
-    # Get any new (unseen) urls for recursion
-    unseen_site_map = new_map.diff_site_maps(site_map)
-
-    # Add new links to all_links
-    site_map = site_map + new_map
-
-    # Recursively call get_site_map for each new link
-    for unseen_url in unseen_site_map.urls:
-        unseen_site_map = get_site_map_recursive(url=unseen_url,
-                                                 driver=driver,
-                                                 site_map=site_map,
-                                                 current_depth=current_depth + 1,
-                                                 max_depth=max_depth,
-                                                 allowed_domains=allowed_domains,
-                                                 wait_in_seconds=wait_in_seconds)
-        site_map = site_map + unseen_site_map
-
-    logging.info(f"Completed get_site_map for {url} at depth {current_depth} "
-                 f"with {len(site_map.urls)} allowed urls "
-                 f"and {len(site_map.ignored_urls)} disallowed urls")
-    return site_map
+    """Map a whole site from a single url.
+
+    Kept for existing callers - the crawl is now iterative, see siteatlas.crawler.
+    """
+    return get_site_map(url=url,
+                        driver=driver,
+                        site_map=site_map,
+                        current_depth=current_depth,
+                        max_depth=max_depth,
+                        allowed_domains=allowed_domains,
+                        wait_in_seconds=wait_in_seconds)
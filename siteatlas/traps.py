@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Optional
+from urllib.parse import urlsplit, parse_qsl
+
+
+NUMBER = re.compile(r'\d+')
+# Long tokens mixing letters and digits, e.g. session ids, hashes and uuids
+TOKEN = re.compile(r'^(?=.*\d)(?=.*[a-zA-Z])[0-9a-zA-Z_-]{16,}$')
+
+# Why TrapDetector skipped an url
+OVER_BUDGET = 'over_budget'
+REPEATING_SEGMENTS = 'repeating_segments'
+DUPLICATE_CONTENT = 'duplicate_content'
+
+
+def _segment_template(segment: str) -> str:
+    if TOKEN.match(segment):
+        return '{id}'
+    return NUMBER.sub('{n}', segment)
+
+
+def url_template(url: str) -> str:
+    """Cluster an url with others like it, by stripping out the parts that vary.
+
+    Numbers in path segments become {n}, long ids become {id}, path parameters such as
+    ;jsessionid=... are dropped and only the sorted names of query parameters are kept, e.g.
+    https://example.com/calendar/2024/05?view=month&sid=a1b2 -> https://example.com/calendar/{n}/{n}?sid&view
+    """
+    parts = urlsplit(url)
+    segments = [_segment_template(segment.split(';', 1)[0]) for segment in parts.path.split('/')]
+    template = f"{parts.scheme}://{parts.netloc}{'/'.join(segments)}"
+    query_keys = sorted({key for key, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    return f"{template}?{'&'.join(query_keys)}" if query_keys else template
+
+
+def has_repeating_segments(url: str, max_repeats: int) -> bool:
+    """Whether any path segment appears more than max_repeats times, as in /a/b/a/b/a/b from relative links."""
+    segments = [segment for segment in urlsplit(url).path.split('/') if segment]
+    return any(count > max_repeats for count in Counter(segments).values())
+
+
+def get_content_fingerprint(html: str) -> str:
+    """A fingerprint of a page's html, ignoring differences in whitespace."""
+    return hashlib.sha1(' '.join(html.split()).encode()).hexdigest()
+
+
+class TrapDetector:
+    """Keeps a crawl out of near-infinite url spaces such as calendars, faceted search and session ids.
+
+    Use is_allowed as a CrawlState's url_filter. Urls are clustered by url_template, and only
+    template_budget urls of each template are fetched; urls whose path repeats a segment more than
+    max_segment_repeats times are never fetched. Both are skipped, and reported in the site map's
+    skipped_urls.
+
+    With skip_duplicate_content, fetchers given the detector fingerprint the html each page's
+    links are read from with check_content. Use follows_links as the CrawlState's page_filter so
+    the links on a page whose html is the same as one already fetched, e.g. the same page under
+    another session id, are not followed; such pages are also reported in skipped_urls.
+    """
+
+    def __init__(self,
+                 template_budget: int = 1000,
+                 max_segment_repeats: int = 3,
+                 skip_duplicate_content: bool = False) -> None:
+        self.template_budget = template_budget
+        self.max_segment_repeats = max_segment_repeats
+        self.skip_duplicate_content = skip_duplicate_content
+        self.template_counts: Counter[str] = Counter()
+        self.skipped: Counter[str] = Counter()
+        # The first page seen with each content fingerprint, and the pages that duplicated it
+        self.fingerprints: dict[str, str] = {}
+        self.duplicate_pages: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def skip_reason(self, url: str) -> Optional[str]:
+        """Why url should not be fetched, or None if it should - counting it against its template's budget."""
+        if has_repeating_segments(url, self.max_segment_repeats):
+            return REPEATING_SEGMENTS
+        template = url_template(url)
+        if self.template_counts[template] >= self.template_budget:
+            return OVER_BUDGET
+        self.template_counts[template] += 1
+        if self.template_counts[template] == self.template_budget:
+            logging.info(f"Spent the budget of {self.template_budget} urls like {template}, skipping any more")
+        return None
+
+    def is_allowed(self, url: str) -> bool:
+        reason = self.skip_reason(url)
+        if reason is None:
+            return True
+        self.skipped[reason] += 1
+        return False
+
+    def check_content(self, url: str, html: str) -> Optional[str]:
+        """The page already fetched with the same html as this one, or None if it is the first."""
+        if not self.skip_duplicate_content:
+            return None
+        fingerprint = get_content_fingerprint(html)
+        with self._lock:
+            first_url = self.fingerprints.setdefault(fingerprint, url)
+            if first_url == url:
+                return None
+            self.duplicate_pages[url] = first_url
+            self.skipped[DUPLICATE_CONTENT] += 1
+        logging.info(f"{url} has the same content as {first_url}, not following its links")
+        return first_url
+
+    def follows_links(self, url: str) -> bool:
+        """Whether the links on a fetched page should be followed, i.e. its content was not a duplicate."""
+        return url not in self.duplicate_pages
+
+    def over_budget_templates(self) -> list[str]:
+        """The templates whose budget was spent, to audit which ones were traps."""
+        return [template for template, count in self.template_counts.items() if count >= self.template_budget]
@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+
+from siteatlas.url_functions import URL_CACHE_SIZE, get_fully_qualified_domain_name, get_absolute_url
+
+# Query parameters that only track where a visitor came from. Names ending in _ are prefixes.
+TRACKING_PARAMETERS = ('utm_', 'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'mc_cid',
+                       'mc_eid', '_ga', '_gl', 'igshid')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+@dataclass(frozen=True)
+class CanonicalisationRules:
+    """Which differences between two urls should not make them different pages."""
+    lowercase_host: bool = True
+    remove_default_port: bool = True
+    # Give http(s) urls with no path the root path, so example.com and example.com/ are one page
+    add_root_path: bool = True
+    remove_fragment: bool = True
+    remove_tracking_parameters: bool = True
+    tracking_parameters: tuple[str, ...] = TRACKING_PARAMETERS
+    sort_query_parameters: bool = True
+    # Off by default - many servers treat /page and /page/ as different resources
+    remove_trailing_slash: bool = False
+
+
+DEFAULT_RULES = CanonicalisationRules()
+
+
+def _is_tracking_parameter(parameter: str, tracking_parameters: tuple[str, ...]) -> bool:
+    name = unquote_plus(parameter.split('=', 1)[0]).lower()
+    return any(name.startswith(tracking) if tracking.endswith('_') else name == tracking
+               for tracking in tracking_parameters)
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _canonicalise_url(url: str, rules: CanonicalisationRules) -> str:
+    scheme, netloc, path, query, fragment = urlsplit(url)
+
+    if netloc and (rules.lowercase_host or rules.remove_default_port):
+        user_info, _, host_and_port = netloc.rpartition('@')
+        host, has_port, port = host_and_port.rpartition(':') if not host_and_port.endswith(']') else ('', '', '')
+        if not has_port:
+            host, port = host_and_port, ''
+        if rules.lowercase_host:
+            host = host.lower()
+        if rules.remove_default_port and port and port.isdigit() and DEFAULT_PORTS.get(scheme) == int(port):
+            port = ''
+        netloc = (f'{user_info}@' if user_info else '') + host + (f':{port}' if port else '')
+
+    if rules.add_root_path and not path and netloc and scheme in DEFAULT_PORTS:
+        path = '/'
+    if rules.remove_trailing_slash and len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+
+    if query:
+        parameters = [parameter for parameter in query.split('&') if parameter]
+        if rules.remove_tracking_parameters:
+            parameters = [parameter for parameter in parameters
+                          if not _is_tracking_parameter(parameter, rules.tracking_parameters)]
+        if rules.sort_query_parameters:
+            # Sort on the raw text so the original encoding is kept
+            parameters.sort()
+        query = '&'.join(parameters)
+
+    if rules.remove_fragment:
+        fragment = ''
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+def canonicalise_url(url: str, rules: Optional[CanonicalisationRules] = None) -> str:
+    """Rewrite an absolute url into the one form used for it throughout a SiteMap."""
+    return _canonicalise_url(url, rules if rules is not None else DEFAULT_RULES)
+
+
+def clear_url_caches() -> None:
+    _canonicalise_url.cache_clear()
+    get_fully_qualified_domain_name.cache_clear()
+    get_absolute_url.cache_clear()
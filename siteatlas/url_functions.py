@@ -1,6 +1,10 @@
+from functools import lru_cache
 from urllib.parse import urlparse, urljoin, urldefrag
 
-import tldextract
+from siteatlas.domains import PUBLIC_SUFFIXES
+
+# The same urls are looked up over and over during a crawl, so remember this many of each
+URL_CACHE_SIZE = 2 ** 16
 
 
 # Helper function to get the scheme and domain from an url
@@ -26,14 +30,18 @@ def get_scheme_and_fully_qualified_domain(url: str) -> str:
 
 
 def get_domain_and_suffix(url: str) -> str:
-    tld = tldextract.extract(url)
-    return f"{tld.domain}.{tld.suffix}"
+    """The registered domain of an url's host, e.g. bbc.co.uk for https://www.bbc.co.uk/news, or the host itself."""
+    host = urlparse(url).hostname or ''
+    return PUBLIC_SUFFIXES.registered_domain(host) or host
 
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def get_fully_qualified_domain_name(url: str) -> str:
     parsed_url = urlparse(url)
     return parsed_url.netloc
 
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def get_absolute_url(base_url: str, relative_url: str) -> str:
     absolute_url = urljoin(base_url, relative_url)
     # strip any fragments from the resulting URL
@@ -0,0 +1,205 @@
+from array import array
+from collections.abc import MutableSet, MutableMapping
+from typing import Iterable, Iterator, Optional
+
+_EMPTY = -1
+
+
+def split_url(url: str) -> tuple[str, str]:
+    """Split an url into the part it shares with its neighbours (scheme, host and directory) and the rest."""
+    scheme_end = url.find('://')
+    path_start = url.find('/', scheme_end + 3) if scheme_end >= 0 else -1
+    if path_start < 0:
+        return url, ''
+    query_start = url.find('?', path_start)
+    directory_end = url.rfind('/', path_start, query_start if query_start >= 0 else len(url)) + 1
+    return url[:directory_end], url[directory_end:]
+
+
+class CompactUrlSet(MutableSet[str]):
+    """A set of urls stored in flat arrays rather than as one Python string object per url.
+
+    Every url is interned to an integer id. Its scheme, host and directory are stored once per
+    distinct prefix and the remainder as utf-8 bytes in one shared buffer, so a url costs a few
+    dozen bytes plus its unshared tail instead of a whole str object and a set slot. Lookups go
+    through an open addressing hash table of ids. Removed urls keep their id and are just marked
+    dead, so ids stay stable for the life of the set.
+    """
+
+    def __init__(self, urls: Iterable[str] = ()) -> None:
+        self._prefixes: list[str] = []
+        self._prefix_ids: dict[str, int] = {}
+        self._prefix_of = array('I')
+        self._suffixes = bytearray()
+        self._offsets = array('Q', [0])
+        self._hashes = array('q')
+        self._live = bytearray()
+        self._live_count = 0
+        self._table = array('i', [_EMPTY]) * 8
+        for url in urls:
+            self.add(url)
+
+    def url_for(self, url_id: int) -> str:
+        start, end = self._offsets[url_id], self._offsets[url_id + 1]
+        return self._prefixes[self._prefix_of[url_id]] + self._suffixes[start:end].decode()
+
+    def _find_slot(self, url: str, url_hash: int) -> int:
+        """Get the table slot holding url, or the empty slot it would go in."""
+        mask = len(self._table) - 1
+        slot = url_hash & mask
+        while True:
+            url_id = self._table[slot]
+            if url_id == _EMPTY or (self._hashes[url_id] == url_hash and self.url_for(url_id) == url):
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow(self) -> None:
+        table = array('i', [_EMPTY]) * (len(self._table) * 2)
+        mask = len(table) - 1
+        for url_id, url_hash in enumerate(self._hashes):
+            slot = url_hash & mask
+            while table[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            table[slot] = url_id
+        self._table = table
+
+    def get_id(self, url: str) -> Optional[int]:
+        """Get the id of an url in the set, or None."""
+        url_id = self._table[self._find_slot(url, hash(url))]
+        if url_id == _EMPTY or not self._live[url_id]:
+            return None
+        return url_id
+
+    def add_with_id(self, url: str) -> int:
+        """Add an url, returning its id."""
+        url_hash = hash(url)
+        slot = self._find_slot(url, url_hash)
+        url_id = self._table[slot]
+        if url_id != _EMPTY:
+            if not self._live[url_id]:
+                self._live[url_id] = 1
+                self._live_count += 1
+            return url_id
+
+        prefix, suffix = split_url(url)
+        prefix_id = self._prefix_ids.get(prefix)
+        if prefix_id is None:
+            prefix_id = self._prefix_ids[prefix] = len(self._prefixes)
+            self._prefixes.append(prefix)
+
+        url_id = len(self._hashes)
+        self._prefix_of.append(prefix_id)
+        self._suffixes += suffix.encode()
+        self._offsets.append(len(self._suffixes))
+        self._hashes.append(url_hash)
+        self._live.append(1)
+        self._live_count += 1
+        self._table[slot] = url_id
+        # Keep the table at most half full so probe chains stay short
+        if len(self._hashes) * 2 > len(self._table):
+            self._grow()
+        return url_id
+
+    def add(self, url: str) -> None:
+        self.add_with_id(url)
+
+    def discard(self, url: str) -> None:
+        url_id = self.get_id(url)
+        if url_id is not None:
+            self._live[url_id] = 0
+            self._live_count -= 1
+
+    def __contains__(self, url: object) -> bool:
+        return isinstance(url, str) and self.get_id(url) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        live = self._live
+        for url_id in range(len(live)):
+            if live[url_id]:
+                yield self.url_for(url_id)
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({len(self)} urls)'
+
+    # The parts of the set API the rest of siteatlas uses, so a CompactUrlSet can stand in for a set[str]
+    def update(self, *others: Iterable[str]) -> None:
+        for other in others:
+            for url in other:
+                self.add(url)
+
+    def difference_update(self, *others: Iterable[str]) -> None:
+        for other in others:
+            for url in other:
+                self.discard(url)
+
+    def copy(self) -> 'CompactUrlSet':
+        return CompactUrlSet(self)
+
+    def union(self, *others: Iterable[str]) -> 'CompactUrlSet':
+        result = self.copy()
+        result.update(*others)
+        return result
+
+    def difference(self, *others: Iterable[str]) -> 'CompactUrlSet':
+        result = self.copy()
+        result.difference_update(*others)
+        return result
+
+    @property
+    def id_count(self) -> int:
+        """How many ids have been handed out, including those of removed urls."""
+        return len(self._hashes)
+
+    def memory_in_bytes(self) -> int:
+        """The size of the arrays and strings backing the set."""
+        return (sum(len(prefix) + 49 for prefix in self._prefixes) + len(self._suffixes)
+                + self._prefix_of.itemsize * len(self._prefix_of) + self._offsets.itemsize * len(self._offsets)
+                + self._hashes.itemsize * len(self._hashes) + len(self._live)
+                + self._table.itemsize * len(self._table))
+
+
+class CompactDepthMap(MutableMapping[str, int]):
+    """Depths of the urls in a CompactUrlSet, held in an array indexed by url id.
+
+    Only urls already in the set can be given a depth; add them to the set first.
+    """
+    _UNSET = 0xFFFF
+
+    def __init__(self, urls: CompactUrlSet) -> None:
+        self._urls = urls
+        self._depths = array('H')
+        self._count = 0
+
+    def __getitem__(self, url: str) -> int:
+        url_id = self._urls.get_id(url)
+        if url_id is None or url_id >= len(self._depths) or self._depths[url_id] == self._UNSET:
+            raise KeyError(url)
+        return self._depths[url_id]
+
+    def __setitem__(self, url: str, depth: int) -> None:
+        url_id = self._urls.get_id(url)
+        if url_id is None:
+            raise KeyError(url)
+        if url_id >= len(self._depths):
+            self._depths.extend([self._UNSET] * (url_id + 1 - len(self._depths)))
+        if self._depths[url_id] == self._UNSET:
+            self._count += 1
+        self._depths[url_id] = min(depth, self._UNSET - 1)
+
+    def __delitem__(self, url: str) -> None:
+        url_id = self._urls.get_id(url)
+        if url_id is None or url_id >= len(self._depths) or self._depths[url_id] == self._UNSET:
+            raise KeyError(url)
+        self._depths[url_id] = self._UNSET
+        self._count -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        for url_id, depth in enumerate(self._depths):
+            if depth != self._UNSET:
+                yield self._urls.url_for(url_id)
+
+    def __len__(self) -> int:
+        return self._count
@@ -0,0 +1,27 @@
+import functools
+import os
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from typing import Any, Generator
+
+from _pytest.fixtures import fixture
+
+CURRENT_LOCATION = os.path.dirname(os.path.realpath(__file__))
+TEST_RESOURCES = os.path.join(CURRENT_LOCATION, 'resources/sample_basic_website')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@fixture(scope='module')
+def sample_website_url() -> Generator[str, None, None]:
+    """Serve the sample website over http on a free local port."""
+    handler = functools.partial(QuietHandler, directory=TEST_RESOURCES)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
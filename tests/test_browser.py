@@ -0,0 +1,86 @@
+import os
+import threading
+from typing import Any
+
+import pytest
+
+from benchmarks.synthetic_site import SyntheticSite, SyntheticSiteServer
+from siteatlas import browser
+from siteatlas.browser import (CrawlDriverFactory, blocked_url_patterns, build_crawl_options, create_crawl_driver,
+                               host_resolver_rules)
+from siteatlas.site_nagivation import get_site_map
+
+
+def test_blocked_url_patterns() -> None:
+    assert blocked_url_patterns(['font']) == ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot']
+    assert '*.css' in blocked_url_patterns()
+    assert blocked_url_patterns([]) == []
+    with pytest.raises(ValueError):
+        blocked_url_patterns(['script'])
+
+
+def test_host_resolver_rules_allow_only_allowed_domains() -> None:
+    assert host_resolver_rules({'example.com', '127.0.0.1:8000'}) == \
+        'MAP * ~NOTFOUND, EXCLUDE 127.0.0.1, EXCLUDE example.com'
+    assert host_resolver_rules({'.example.com', '*.example.org'}) == \
+        'MAP * ~NOTFOUND, EXCLUDE *.example.com, EXCLUDE *.example.org, EXCLUDE example.com'
+    assert host_resolver_rules({''}) == 'MAP * ~NOTFOUND'
+
+
+def test_build_crawl_options(tmp_path: str) -> None:
+    # Given options for crawling example.com with a profile
+    options = build_crawl_options({'example.com'}, profile_directory=os.path.join(tmp_path, 'profile'))
+    # Then the browser is headless, returns once the DOM is ready and resolves only example.com
+    assert '--headless=new' in options.arguments
+    assert options.page_load_strategy == 'eager'
+    assert '--host-resolver-rules=MAP * ~NOTFOUND, EXCLUDE example.com' in options.arguments
+    assert f"--user-data-dir={os.path.join(tmp_path, 'profile')}" in options.arguments
+    assert options.experimental_options['prefs'] == {'profile.managed_default_content_settings.images': 2}
+    # And without allowed domains or images blocked, neither is set
+    options = build_crawl_options(page_load_strategy='normal', blocked_resources=['font'])
+    assert not any(argument.startswith('--host-resolver-rules') for argument in options.arguments)
+    assert 'prefs' not in options.experimental_options
+    assert options.page_load_strategy == 'normal'
+
+
+def test_factory_gives_each_driver_a_free_profile(tmp_path: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Given a factory whose browsers take a while to start, and a profile held by a running browser
+    os.makedirs(os.path.join(tmp_path, 'profile-0'))
+    os.symlink('host-1234', os.path.join(tmp_path, 'profile-0', 'SingletonLock'))
+    profiles: list[str] = []
+    started = threading.Barrier(2)
+
+    def create_driver(*args: Any) -> Any:
+        profiles.append(args[2])
+        started.wait(timeout=5)
+        return object()
+
+    monkeypatch.setattr(browser, 'create_crawl_driver', create_driver)
+    factory = CrawlDriverFactory({'example.com'}, profiles_directory=str(tmp_path))
+    # When two drivers are started at once
+    threads = [threading.Thread(target=factory) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Then each has a profile of its own, and neither has the locked one
+    assert sorted(profiles) == [os.path.join(tmp_path, 'profile-1'), os.path.join(tmp_path, 'profile-2')]
+
+
+@pytest.mark.integration("Needs Chrome")
+def test_tuned_driver_finds_the_same_links() -> None:
+    # Given a site whose pages load a stylesheet, font and image
+    site = SyntheticSite(50, 'tree', branching=3, button_every=5, assets=True)
+    with SyntheticSiteServer(site) as server:
+        allowed_domains = {server.url.split('//')[1]}
+        driver = create_crawl_driver(allowed_domains)
+        try:
+            # When I crawl it with a driver that blocks them
+            site_map = get_site_map(server.seed_url, driver, allowed_domains=allowed_domains)
+            # Then every page is still found
+            assert site_map.urls == set(site.urls(server.url))
+            # And the image was never fetched
+            assert not driver.execute_script("return performance.getEntriesByType('resource')"
+                                             ".filter(entry => entry.name.endsWith('.png')).length")
+        finally:
+            driver.quit()
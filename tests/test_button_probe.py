@@ -0,0 +1,83 @@
+from typing import Any, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+from siteatlas.button_probe import BUTTON_HTML_SCRIPT, NAVIGATION_HOOKS_SCRIPT, CLICK_BUTTON_SCRIPT, probe_buttons
+
+BASE_URL = 'https://example.com/page'
+
+
+class FakeButtonPage:
+    """Stands in for a WebDriver on a page of buttons.
+
+    Each button is (outer html, url it opens, whether the in-page hooks catch the navigation).
+    """
+
+    def __init__(self, buttons: list[tuple[str, Optional[str], bool]]) -> None:
+        self.buttons = buttons
+        self.current_url = BASE_URL
+        self.fingerprint_calls = 0
+        self.clicks: list[int] = []
+        self.back_calls = 0
+
+    def execute_script(self, script: str, *args: Any) -> Any:
+        if script == BUTTON_HTML_SCRIPT:
+            self.fingerprint_calls += 1
+            return [html for html, _, _ in self.buttons]
+        assert script == NAVIGATION_HOOKS_SCRIPT
+        return None
+
+    def execute_async_script(self, script: str, index: int, timeout: int) -> Any:
+        assert script == CLICK_BUTTON_SCRIPT
+        self.clicks.append(index)
+        _, url, hooked = self.buttons[index]
+        if url and not hooked:
+            self.current_url = url
+            raise WebDriverException("javascript error: document unloaded while waiting for result")
+        return {'targets': [url] if url else [], 'mutated': False}
+
+    def back(self) -> None:
+        self.back_calls += 1
+        self.current_url = BASE_URL
+
+    def get(self, url: str) -> None:
+        self.current_url = url
+
+
+def test_buttons_fingerprinted_in_one_call() -> None:
+    # Given a page with many buttons that navigate inside the page
+    page = FakeButtonPage([(f'<button id="{i}">Go</button>', f'https://example.com/{i}', True) for i in range(50)])
+    # When I probe the buttons
+    result = probe_buttons(page)  # type: ignore
+    # Then every target is found
+    assert result.urls == {f'https://example.com/{i}' for i in range(50)}
+    # And the buttons were fingerprinted once and each clicked once without leaving the page
+    assert page.fingerprint_calls == 1
+    assert page.clicks == list(range(50))
+    assert result.reloads == 0
+    assert page.back_calls == 0
+
+
+def test_duplicate_buttons_clicked_once() -> None:
+    # Given a page where the same button appears twice
+    page = FakeButtonPage([('<button>Go</button>', 'https://example.com/a', True),
+                           ('<button>Go</button>', 'https://example.com/a', True),
+                           ('<button>Other</button>', None, True)])
+    # When I probe the buttons
+    result = probe_buttons(page)  # type: ignore
+    # Then the duplicate is skipped
+    assert page.clicks == [0, 2]
+    assert result.buttons_probed == 2
+    assert result.urls == {'https://example.com/a'}
+
+
+def test_navigation_that_escapes_the_hooks() -> None:
+    # Given a button that really leaves the page
+    page = FakeButtonPage([('<button>Leave</button>', 'https://example.com/left#top', False),
+                           ('<button>Stay</button>', 'https://example.com/stay', True)])
+    # When I probe the buttons
+    result = probe_buttons(page)  # type: ignore
+    # Then the target is recorded without its fragment and we return to the page
+    assert result.urls == {'https://example.com/left', 'https://example.com/stay'}
+    assert result.reloads == 1
+    assert page.current_url == BASE_URL
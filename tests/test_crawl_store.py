@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from siteatlas.crawl_store import SqliteCrawlStore
+from siteatlas.crawler import crawl
+from siteatlas.site_map import SiteMap
+from tests.test_crawler import SITE, GraphFetcher
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingFetcher(GraphFetcher):
+    """Fails after fetching a number of pages, like a browser dying mid crawl."""
+
+    def __init__(self, site: dict[str, set[str]], pages_before_crash: int) -> None:
+        super().__init__(site)
+        self.pages_before_crash = pages_before_crash
+
+    def __call__(self, url: str) -> SiteMap:
+        if len(self.fetched) == self.pages_before_crash:
+            raise Crash(url)
+        return super().__call__(url)
+
+
+def test_resume_crawl_after_crash(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, 'crawl.sqlite')
+    # Given a crawl that crashes after three pages
+    with SqliteCrawlStore(path, batch_size=1) as store:
+        state = store.load_state()
+        state.add_seed('https://example.com/', 0)
+        crashing_fetcher = CrashingFetcher(SITE, pages_before_crash=3)
+        with pytest.raises(Crash):
+            crawl(state, crashing_fetcher)
+
+    # When I resume it from the store
+    with SqliteCrawlStore(path) as store:
+        state = store.load_state()
+        state.add_seed('https://example.com/', 0)
+        fetcher = GraphFetcher(SITE)
+        site_map = crawl(state, fetcher)
+
+    # Then the whole site is mapped
+    assert site_map.urls == set(SITE)
+    assert site_map.ignored_urls == {'https://www.google.com/search'}
+    # And no page fetched before the crash is fetched again
+    assert not set(crashing_fetcher.fetched) & set(fetcher.fetched)
+    assert sorted(crashing_fetcher.fetched + fetcher.fetched) == sorted(SITE)
+
+
+def test_writes_are_batched(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, 'crawl.sqlite')
+    # Given a store that writes in large batches
+    with SqliteCrawlStore(path, batch_size=1000) as store:
+        state = store.load_state()
+        state.add_seed('https://example.com/', 0)
+        state.add_page('https://example.com/', 0, GraphFetcher(SITE)('https://example.com/'))
+        # Then nothing is written until the batch fills or the store is flushed
+        assert store.connection.execute('SELECT COUNT(*) FROM urls').fetchone() == (0,)
+        store.flush()
+        assert store.connection.execute('SELECT COUNT(*) FROM urls').fetchone() == (3,)
+        assert store.connection.execute('SELECT url FROM urls WHERE fetched = 1').fetchall() == [
+            ('https://example.com/',)]
+
+
+def test_resume_with_larger_max_depth(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, 'crawl.sqlite')
+    # Given a finished crawl limited to depth 2
+    with SqliteCrawlStore(path) as store:
+        state = store.load_state(max_depth=2)
+        state.add_seed('https://example.com/', 0)
+        crawl(state, GraphFetcher(SITE))
+    # When I resume it with a larger max_depth
+    with SqliteCrawlStore(path) as store:
+        fetcher = GraphFetcher(SITE)
+        site_map = crawl(store.load_state(max_depth=10), fetcher)
+    # Then only the pages that were beyond the old limit are fetched
+    assert sorted(fetcher.fetched) == ['https://example.com/deep', 'https://example.com/deeper',
+                                       'https://example.com/founder']
+    assert site_map.urls == set(SITE)
+
+
+def test_skipped_urls_are_saved(tmp_path: str) -> None:
+    path = os.path.join(tmp_path, 'crawl.sqlite')
+    # Given a crawl that skips a page
+    with SqliteCrawlStore(path) as store:
+        state = store.load_state(url_filter=lambda url: not url.endswith('/founder'))
+        state.add_seed('https://example.com/', 0)
+        crawl(state, GraphFetcher(SITE))
+    # When I load it again
+    with SqliteCrawlStore(path) as store:
+        state = store.load_state()
+    # Then the skipped page is still reported as skipped
+    assert state.site_map.skipped_urls == {'https://example.com/founder'}
+    assert 'https://example.com/founder' not in state.site_map.urls
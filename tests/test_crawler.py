@@ -0,0 +1,131 @@
+import sys
+import time
+from typing import Optional
+
+from siteatlas.crawler import CrawlState, Frontier, crawl, crawl_concurrently
+from siteatlas.site_map import SiteMap
+
+# A small site: index -> about/contact, about -> founder, founder -> deep -> deeper
+SITE = {
+    'https://example.com/': {'https://example.com/about', 'https://example.com/contact',
+                             'https://www.google.com/search'},
+    'https://example.com/about': {'https://example.com/founder', 'https://example.com/'},
+    'https://example.com/contact': {'https://example.com/'},
+    'https://example.com/founder': {'https://example.com/deep'},
+    'https://example.com/deep': {'https://example.com/deeper'},
+    'https://example.com/deeper': set(),
+}
+
+
+class GraphFetcher:
+    """Serves pages from a dict of url -> linked urls, recording every fetch."""
+
+    def __init__(self, site: dict[str, set[str]]) -> None:
+        self.site = site
+        self.fetched: list[str] = []
+
+    def __call__(self, url: str) -> SiteMap:
+        self.fetched.append(url)
+        links = self.site.get(url, set())
+        return SiteMap({link for link in links if link.startswith('https://example.com')},
+                       {link for link in links if not link.startswith('https://example.com')})
+
+
+def test_crawl_whole_site() -> None:
+    # Given a crawl seeded with the home page
+    state = CrawlState(max_depth=10)
+    state.add_seed('https://example.com/', 0)
+    fetcher = GraphFetcher(SITE)
+    # When I crawl
+    site_map = crawl(state, fetcher)
+    # Then every page is found and fetched exactly once
+    assert site_map.urls == set(SITE)
+    assert sorted(fetcher.fetched) == sorted(SITE)
+    # And off site links are ignored
+    assert site_map.ignored_urls == {'https://www.google.com/search'}
+    # And each url has the depth of its shortest path from the seed
+    assert state.depths['https://example.com/about'] == 1
+    assert state.depths['https://example.com/deeper'] == 4
+
+
+def test_crawl_respects_max_depth() -> None:
+    # Given a crawl limited to a depth of 3
+    state = CrawlState(max_depth=3)
+    state.add_seed('https://example.com/', 0)
+    fetcher = GraphFetcher(SITE)
+    # When I crawl
+    site_map = crawl(state, fetcher)
+    # Then pages at depth 3 are found but not fetched
+    assert 'https://example.com/deep' in site_map.urls
+    assert 'https://example.com/deep' not in fetcher.fetched
+    assert 'https://example.com/founder' in fetcher.fetched
+    # And nothing beyond them is found
+    assert 'https://example.com/deeper' not in site_map.urls
+
+
+def test_crawl_deep_chain_does_not_recurse() -> None:
+    # Given a chain of pages far longer than the recursion limit
+    length = sys.getrecursionlimit() * 2
+    chain = {f'https://example.com/{i}': {f'https://example.com/{i + 1}'} for i in range(length)}
+    state = CrawlState(max_depth=0)
+    state.add_seed('https://example.com/0', 0)
+    # When I crawl with no depth limit
+    site_map = crawl(state, GraphFetcher(chain))
+    # Then the whole chain is mapped
+    assert len(site_map.urls) == length + 1
+
+
+def test_crawl_multiple_seeds() -> None:
+    # Given two seeds where the second is also linked from the first
+    state = CrawlState()
+    state.add_seed('https://example.com/', 0)
+    state.add_seed('https://example.com/contact', 0)
+    fetcher = GraphFetcher(SITE)
+    # When I crawl
+    crawl(state, fetcher)
+    # Then the second seed is only fetched once
+    assert fetcher.fetched.count('https://example.com/contact') == 1
+
+
+def test_crawl_concurrently_matches_serial_crawl() -> None:
+    # Given the same site crawled serially and on four workers
+    serial_state = CrawlState()
+    serial_state.add_seed('https://example.com/', 0)
+    concurrent_state = CrawlState()
+    concurrent_state.add_seed('https://example.com/', 0)
+    fetcher = GraphFetcher(SITE)
+    # When I crawl concurrently
+    site_map = crawl_concurrently(concurrent_state, fetcher, workers=4)
+    # Then I get the same site map and depths as a serial crawl
+    assert site_map == crawl(serial_state, GraphFetcher(SITE))
+    assert concurrent_state.depths == serial_state.depths
+    # And each page was fetched once
+    assert sorted(fetcher.fetched) == sorted(SITE)
+
+
+class WatchedFrontier(Frontier):
+    def __init__(self) -> None:
+        super().__init__()
+        self.ready_checks = 0
+
+    def seconds_until_ready(self) -> Optional[float]:
+        self.ready_checks += 1
+        return super().seconds_until_ready()
+
+
+def test_busy_workers_do_not_spin_the_crawl_loop() -> None:
+    # Given a concurrent crawl whose workers are slower than the urls they find
+    frontier = WatchedFrontier()
+    state = CrawlState(frontier=frontier)
+    state.add_seed('https://example.com/', 0)
+    fetcher = GraphFetcher(SITE)
+
+    def slow_fetch(url: str) -> SiteMap:
+        time.sleep(0.05)
+        return fetcher(url)
+
+    # When I crawl with one worker, so urls wait in the frontier while it is busy
+    crawl_concurrently(state, slow_fetch, workers=1)
+    # Then the loop waits on the worker rather than asking the frontier again and again
+    assert len(fetcher.fetched) == len(SITE)
+    assert frontier.ready_checks <= len(SITE)
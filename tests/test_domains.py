@@ -0,0 +1,77 @@
+import pytest
+
+from siteatlas.domains import DomainMatcher, PublicSuffixes, get_domain_matcher
+from siteatlas.site_nagivation import get_links_map
+
+
+def test_public_suffix_rules() -> None:
+    suffixes = PublicSuffixes()
+    assert suffixes.public_suffix('www.bbc.co.uk') == 'co.uk'
+    assert suffixes.registered_domain('www.bbc.co.uk') == 'bbc.co.uk'
+    # Wildcard and exception rules, *.ck and !www.ck
+    assert suffixes.registered_domain('a.b.shop.ck') == 'b.shop.ck'
+    assert suffixes.registered_domain('a.www.ck') == 'www.ck'
+    # Internationalised domains, in the ascii form urls hold them in
+    assert suffixes.public_suffix('example.xn--55qx5d.cn') == 'xn--55qx5d.cn'
+    # Top level domains missing from the list, bare suffixes and ip addresses
+    assert suffixes.registered_domain('intranet.corp') == 'intranet.corp'
+    assert suffixes.registered_domain('co.uk') is None
+    assert suffixes.registered_domain('127.0.0.1') is None
+
+
+def test_private_domains_are_optional() -> None:
+    assert PublicSuffixes().registered_domain('mysite.blogspot.com') == 'blogspot.com'
+    assert PublicSuffixes(include_private_domains=True).registered_domain('mysite.blogspot.com') == \
+        'mysite.blogspot.com'
+
+
+def test_public_suffixes_load_lazily() -> None:
+    suffixes = PublicSuffixes(path='missing.dat')
+    with pytest.raises(FileNotFoundError):
+        suffixes.public_suffix('example.com')
+
+
+def test_exact_rules_match_the_whole_netloc() -> None:
+    matcher = DomainMatcher({'example.com', '127.0.0.1:8000'})
+    assert matcher.matches('https://example.com/about')
+    assert matcher.matches('https://EXAMPLE.com/about')
+    assert not matcher.matches('https://www.example.com/')
+    assert matcher.matches('http://127.0.0.1:8000/page/1')
+    assert not matcher.matches('http://127.0.0.1:9000/page/1')
+
+
+def test_subdomain_rules() -> None:
+    matcher = DomainMatcher({'*.example.com', '.example.org'})
+    # *.example.com allows any subdomain but not the domain itself
+    assert matcher.matches('https://www.example.com/')
+    assert matcher.matches('https://a.b.example.com:8443/')
+    assert not matcher.matches('https://example.com/')
+    assert not matcher.matches('https://notexample.com/')
+    # .example.org allows both
+    assert matcher.matches('https://example.org/')
+    assert matcher.matches('https://docs.example.org/')
+    assert not matcher.matches('https://example.net/')
+
+
+def test_rules_for_a_whole_public_suffix_are_refused() -> None:
+    with pytest.raises(ValueError):
+        DomainMatcher({'*.co.uk'})
+    with pytest.raises(ValueError):
+        DomainMatcher({'.com'})
+
+
+def test_partition() -> None:
+    matcher = get_domain_matcher({'.example.com'})
+    allowed, ignored = matcher.partition(['https://example.com/', 'https://www.example.com/a',
+                                          'https://www.google.com/', 'https://www.example.com/b'])
+    assert allowed == {'https://example.com/', 'https://www.example.com/a', 'https://www.example.com/b'}
+    assert ignored == {'https://www.google.com/'}
+    assert get_domain_matcher({'.example.com'}) is matcher
+
+
+def test_links_map_with_subdomain_rules() -> None:
+    html = ('<a href="/about">About</a><a href="https://docs.example.com/">Docs</a>'
+            '<a href="https://www.google.com/">Elsewhere</a>')
+    links_map = get_links_map(html, 'https://example.com/', {'.example.com'})
+    assert links_map.urls == {'https://example.com/about', 'https://docs.example.com/'}
+    assert links_map.ignored_urls == {'https://www.google.com/'}
@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Any
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+from siteatlas.driver_pool import DriverPool
+from siteatlas.site_map import SiteMap
+
+
+class FakeDriver:
+    """Stands in for a WebDriver, optionally crashing on its first page."""
+
+    def __init__(self, crash: bool = False) -> None:
+        self.crash = crash
+        self.alive = True
+        self.quit_called = False
+
+    def execute_script(self, script: str, *args: Any) -> Any:
+        if not self.alive:
+            raise WebDriverException("browser has gone away")
+        return 1
+
+    def quit(self) -> None:
+        self.quit_called = True
+
+
+class FakeDriverFactory:
+    def __init__(self, crash_first: bool = False) -> None:
+        self.crash_first = crash_first
+        self.created: list[FakeDriver] = []
+        self.lock = threading.Lock()
+
+    def __call__(self) -> Any:
+        with self.lock:
+            driver = FakeDriver(crash=self.crash_first and not self.created)
+            self.created.append(driver)
+        return driver
+
+
+def fetch_page(url: str, driver: Any) -> SiteMap:
+    if driver.crash:
+        driver.alive = False
+        raise WebDriverException("browser crashed")
+    return SiteMap({url}, set())
+
+
+def test_pool_never_creates_more_than_size_drivers() -> None:
+    # Given a pool of two drivers
+    factory = FakeDriverFactory()
+    with DriverPool(factory, size=2) as pool:
+        # When I fetch many pages from several threads
+        threads = [threading.Thread(target=pool.fetch, args=(f'https://example.com/{i}', fetch_page))
+                   for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Then only two drivers were ever created
+        assert len(factory.created) == 2
+    # And closing the pool quits them
+    assert all(driver.quit_called for driver in factory.created)
+
+
+def test_pool_replaces_crashed_driver() -> None:
+    # Given a pool whose first browser crashes
+    factory = FakeDriverFactory(crash_first=True)
+    with DriverPool(factory, size=1) as pool:
+        # When I fetch a page
+        site_map = pool.fetch('https://example.com/', fetch_page)
+    # Then the page is retried on a fresh driver
+    assert site_map.urls == {'https://example.com/'}
+    assert len(factory.created) == 2
+    assert factory.created[0].quit_called
+
+
+def test_pool_gives_up_after_attempts() -> None:
+    # Given a pool that is only allowed one attempt and a browser that crashes
+    with DriverPool(FakeDriverFactory(crash_first=True), size=1, attempts=1) as pool:
+        # Then the failure is raised
+        with pytest.raises(WebDriverException):
+            pool.fetch('https://example.com/', fetch_page)
+
+
+def test_pool_recycles_drivers_after_max_pages() -> None:
+    # Given a pool that recycles drivers every three pages
+    factory = FakeDriverFactory()
+    with DriverPool(factory, size=1, max_pages_per_driver=3) as pool:
+        # When I fetch seven pages
+        for i in range(7):
+            pool.fetch(f'https://example.com/{i}', fetch_page)
+        # Then three drivers have been used and the first two quit
+        assert len(factory.created) == 3
+        assert [driver.quit_called for driver in factory.created] == [True, True, False]
+
+
+def test_threads_waiting_for_a_driver_get_one_when_drivers_are_recycled() -> None:
+    # Given more threads than drivers, and a driver recycled after every page
+    factory = FakeDriverFactory()
+    all_waiting = threading.Event()
+
+    def slow_fetch_page(url: str, driver: Any) -> SiteMap:
+        all_waiting.wait(timeout=5)
+        return fetch_page(url, driver)
+
+    with DriverPool(factory, size=1, max_pages_per_driver=1) as pool:
+        # When they all fetch at once, so the others are waiting when the first driver is retired
+        threads = [threading.Thread(target=pool.fetch, args=(f'https://example.com/{i}', slow_fetch_page), daemon=True)
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        all_waiting.set()
+        for thread in threads:
+            thread.join(timeout=5)
+        # Then none is left waiting, and each page had a fresh driver
+        assert not any(thread.is_alive() for thread in threads)
+        assert len(factory.created) == 4
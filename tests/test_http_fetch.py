@@ -0,0 +1,68 @@
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.http_fetch import HttpFetcher, needs_browser
+from siteatlas.site_map import SiteMap
+
+
+class BrowserFetcher:
+    """Records the pages handed on to the browser."""
+
+    def __init__(self) -> None:
+        self.fetched: list[str] = []
+
+    def __call__(self, url: str) -> SiteMap:
+        self.fetched.append(url)
+        return SiteMap()
+
+
+def test_needs_browser() -> None:
+    links = SiteMap({'https://example.com/about'}, set())
+    # A plain server rendered page does not
+    assert not needs_browser('<html><body><a href="/about">About</a></body></html>', links)
+    # A page with no links does
+    assert needs_browser('<html><body><p>Hello</p></body></html>', SiteMap())
+    # A page with buttons does
+    assert needs_browser('<html><body><a href="/about">About</a><button>Go</button></body></html>', links)
+    # A single page app does
+    assert needs_browser('<html><body><div id="root"></div><a href="/about">About</a></body></html>', links)
+    # A noscript shell does
+    assert needs_browser('<html><body><noscript>You need to enable JavaScript to run this app.</noscript>'
+                         '<a href="/about">About</a></body></html>', links)
+
+
+def test_static_page_fetched_over_http(sample_website_url: str) -> None:
+    # Given a static page served over http
+    browser = BrowserFetcher()
+    fetcher = HttpFetcher()
+    # When I fetch it
+    page_map = fetcher.fetch_page(f'{sample_website_url}/about.html',
+                                  allowed_domains={sample_website_url.split('//')[1]},
+                                  browser_fetch_page=browser)
+    # Then I get its links without using the browser
+    assert page_map.urls == {f'{sample_website_url}/index.html', f'{sample_website_url}/founder_profile.html'}
+    assert browser.fetched == []
+
+
+def test_button_page_escalated_to_browser(sample_website_url: str) -> None:
+    # Given a page whose links are behind buttons
+    browser = BrowserFetcher()
+    url = f'{sample_website_url}/button_source.html'
+    # When I fetch it
+    HttpFetcher().fetch_page(url, allowed_domains={sample_website_url.split('//')[1]}, browser_fetch_page=browser)
+    # Then it is rendered in the browser
+    assert browser.fetched == [url]
+
+
+def test_crawl_sample_website_over_http(sample_website_url: str) -> None:
+    # Given a crawl of the sample website with the http fast path
+    browser = BrowserFetcher()
+    fetcher = HttpFetcher()
+    state = CrawlState()
+    state.add_seed(f'{sample_website_url}/about.html', 0)
+    allowed_domains = {sample_website_url.split('//')[1]}
+    # When I crawl it
+    site_map = crawl(state, lambda url: fetcher.fetch_page(url, allowed_domains, browser))
+    # Then the linked pages are found
+    assert site_map.urls == {f'{sample_website_url}/{page}.html' for page in ('index', 'about', 'founder_profile')}
+    # And only the page with a button and the page without any links needed the browser
+    assert sorted(browser.fetched) == [f'{sample_website_url}/founder_profile.html',
+                                       f'{sample_website_url}/index.html']
@@ -0,0 +1,102 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Generator
+
+from _pytest.fixtures import fixture
+
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.incremental import IncrementalFetcher, PageIndex
+from siteatlas.site_map import SiteMap
+from tests.test_http_fetch import BrowserFetcher
+
+# Pages served by the changing website - edit between crawls to change the site
+PAGES = {
+    '/': '<a href="/about">About</a><a href="/news">News</a>',
+    '/about': '<a href="/">Home</a><p>Version 1</p>',
+    '/news': '<a href="/">Home</a>',
+}
+
+
+class ChangingSiteHandler(BaseHTTPRequestHandler):
+    """Serves PAGES without any caching headers, so changes can only be spotted from the content."""
+
+    def do_GET(self) -> None:
+        body = PAGES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@fixture
+def changing_website_url() -> Generator[str, None, None]:
+    original_pages = dict(PAGES)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ChangingSiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    PAGES.clear()
+    PAGES.update(original_pages)
+
+
+def map_site(seed: str, fetcher: IncrementalFetcher, browser: BrowserFetcher) -> SiteMap:
+    state = CrawlState()
+    state.add_seed(seed, 0)
+    allowed_domains = {seed.split('//')[1].split('/')[0]}
+    return crawl(state, lambda url: fetcher.fetch_page(url, allowed_domains, browser))
+
+
+class LinkReadingBrowser(BrowserFetcher):
+    """A browser that finds the links in the served html."""
+
+    def __init__(self, fetcher: IncrementalFetcher) -> None:
+        super().__init__()
+        self.fetcher = fetcher
+
+    def __call__(self, url: str) -> SiteMap:
+        super().__call__(url)
+        return self.fetcher.http_fetcher.fetch_page(url, {url.split('//')[1].split('/')[0]}, lambda u: SiteMap())
+
+
+def test_unmodified_pages_are_not_rendered(sample_website_url: str, tmp_path: str) -> None:
+    # Given a first crawl of a site served with Last-Modified headers
+    first = IncrementalFetcher()
+    first_browser = LinkReadingBrowser(first)
+    first_map = map_site(f'{sample_website_url}/about.html', first, first_browser)
+    path = os.path.join(tmp_path, 'pages.jsonl')
+    first.current.save(path)
+    # When I recrawl with the saved index
+    second = IncrementalFetcher(PageIndex.load(path))
+    second_browser = LinkReadingBrowser(second)
+    second_map = map_site(f'{sample_website_url}/about.html', second, second_browser)
+    # Then the same site map is found without rendering any page
+    assert second_map == first_map
+    assert len(first_browser.fetched) == len(first_map.urls)
+    assert second_browser.fetched == []
+    assert second.reused_pages == len(first_map.urls)
+
+
+def test_only_changed_pages_are_rendered(changing_website_url: str) -> None:
+    # Given a first crawl of a site without caching headers
+    first = IncrementalFetcher()
+    map_site(f'{changing_website_url}/', first, LinkReadingBrowser(first))
+    # When one page gets a new link and another only new text
+    PAGES['/news'] = '<a href="/">Home</a><a href="/news/1">Story</a>'
+    PAGES['/news/1'] = '<a href="/news">News</a>'
+    PAGES['/about'] = '<a href="/">Home</a><p>Version 2</p>'
+    second = IncrementalFetcher(first.current)
+    browser = LinkReadingBrowser(second)
+    site_map = map_site(f'{changing_website_url}/', second, browser)
+    # Then only the page whose links changed and the new page are rendered
+    assert sorted(browser.fetched) == [f'{changing_website_url}/news', f'{changing_website_url}/news/1']
+    assert f'{changing_website_url}/news/1' in site_map.urls
+    # And the new index has every page for next time
+    assert len(second.current) == 4
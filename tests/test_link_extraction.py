@@ -0,0 +1,82 @@
+import os
+from typing import Any
+
+import pytest
+
+from siteatlas.link_extraction import BeautifulSoupLinkExtractor, StreamingLinkExtractor, LxmlLinkExtractor, \
+    BrowserLinkExtractor, BROWSER_HREFS_SCRIPT, lxml_html
+from siteatlas.site_nagivation import get_links_map
+
+CURRENT_LOCATION = os.path.dirname(os.path.realpath(__file__))
+TEST_RESOURCES = os.path.join(CURRENT_LOCATION, 'resources/sample_basic_website')
+
+AWKWARD_HTML = """<html><body>
+<a href="one.html">One</a>
+<A HREF="/two?x=1&amp;y=2">Two</A>
+<a href=" three.html ">Three</a>
+<a name="no-href">Not a link</a>
+<a href="">Self</a>
+<a href="#fragment">Fragment</a>
+<p><a href="https://other.example.org/four">Four</a>
+<svg><a href="five.html"><text>Five</text></a></svg>
+<a href="six.html"/>
+</body></html>"""
+
+# The same page as xhtml, whose xml declaration names an encoding the html has already been decoded from
+XHTML = f"""<?xml version="1.0" encoding="ISO-8859-1"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">
+{AWKWARD_HTML.replace('<html>', '<html xmlns="http://www.w3.org/1999/xhtml">')}"""
+
+AWKWARD_PAGES = {'html': AWKWARD_HTML, 'xhtml': XHTML}
+
+RAW_HTML_EXTRACTORS = [BeautifulSoupLinkExtractor(), StreamingLinkExtractor()]
+if lxml_html is not None:
+    RAW_HTML_EXTRACTORS.append(LxmlLinkExtractor())
+
+
+@pytest.mark.parametrize('html', AWKWARD_PAGES.values(), ids=AWKWARD_PAGES.keys())
+@pytest.mark.parametrize('link_extractor', RAW_HTML_EXTRACTORS, ids=lambda extractor: type(extractor).__name__)
+def test_raw_html_extractors_agree(link_extractor: Any, html: str) -> None:
+    # Given awkward html
+    base_url = 'https://example.com/dir/page.html'
+    # When I get the links map with each backend
+    page_map = get_links_map(html, base_url, {'example.com'}, link_extractor)
+    # Then I get the same results as BeautifulSoup
+    expected = get_links_map(html, base_url, {'example.com'}, BeautifulSoupLinkExtractor())
+    assert page_map == expected
+    assert 'https://example.com/two?x=1&y=2' in page_map.urls
+    assert 'https://example.com/dir/three.html' in page_map.urls
+    assert base_url in page_map.urls
+    assert page_map.ignored_urls == {'https://other.example.org/four'}
+
+
+@pytest.mark.parametrize('page', sorted(os.listdir(TEST_RESOURCES)))
+def test_streaming_extractor_matches_beautiful_soup_on_sample_site(page: str) -> None:
+    with open(os.path.join(TEST_RESOURCES, page)) as f:
+        html = f.read()
+    assert StreamingLinkExtractor().get_hrefs(html) == BeautifulSoupLinkExtractor().get_hrefs(html)
+
+
+class FakeDriver:
+    def __init__(self, hrefs: list[str]) -> None:
+        self.hrefs = hrefs
+        self.scripts: list[str] = []
+
+    def execute_script(self, script: str) -> list[str]:
+        self.scripts.append(script)
+        return self.hrefs
+
+    @property
+    def page_source(self) -> str:
+        raise AssertionError("page_source should not be read")
+
+
+def test_browser_extractor_reads_hrefs_in_one_call() -> None:
+    # Given a page the browser has already resolved the links on
+    driver = FakeDriver(['https://example.com/about.html', 'https://example.com/#top', 'https://www.google.com/'])
+    # When I get the links map from the driver
+    page_map = get_links_map(driver, 'https://example.com/', {'example.com'}, BrowserLinkExtractor())  # type: ignore
+    # Then the links are read with a single script and no page source
+    assert driver.scripts == [BROWSER_HREFS_SCRIPT]
+    assert page_map.urls == {'https://example.com/about.html', 'https://example.com/'}
+    assert page_map.ignored_urls == {'https://www.google.com/'}
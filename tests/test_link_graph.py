@@ -0,0 +1,82 @@
+import os
+
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.link_graph import LinkGraph, LinkGraphBuilder, UNREACHABLE
+from tests.test_crawler import SITE, GraphFetcher
+
+HOME = 'https://example.com/'
+
+
+def crawl_graph(site: dict[str, set[str]], *seeds: str, include_ignored: bool = False) -> LinkGraph:
+    builder = LinkGraphBuilder(include_ignored)
+    state = CrawlState(max_depth=10, listeners=[builder])
+    for seed in seeds:
+        state.add_seed(seed, 0)
+    crawl(state, GraphFetcher(site))
+    return builder.freeze()
+
+
+def test_links_are_recorded() -> None:
+    # Given a crawl of a small site with a link graph
+    graph = crawl_graph(SITE, HOME)
+    # Then every page is a node and every link on a fetched page an edge
+    assert graph.node_count == len(SITE)
+    assert graph.edge_count == 7
+    assert sorted(graph.links_from(HOME)) == ['https://example.com/about', 'https://example.com/contact']
+    assert sorted(graph.links_to(HOME)) == ['https://example.com/about', 'https://example.com/contact']
+    # And off site links only with include_ignored
+    assert 'https://www.google.com/search' in crawl_graph(SITE, HOME, include_ignored=True).links_from(HOME)
+
+
+def test_degrees() -> None:
+    graph = crawl_graph(SITE, HOME)
+    out_degrees, in_degrees = graph.out_degrees(), graph.in_degrees()
+    assert out_degrees[graph.node_id(HOME)] == 2
+    assert in_degrees[graph.node_id(HOME)] == 2
+    assert out_degrees[graph.node_id('https://example.com/deeper')] == 0
+    assert sum(in_degrees) == sum(out_degrees) == graph.edge_count
+
+
+def test_depths_and_paths() -> None:
+    graph = crawl_graph(SITE, HOME)
+    assert graph.depths([HOME], ['https://example.com/about', 'https://example.com/deeper']) == [1, 4]
+    assert graph.depths(['https://example.com/founder'], [HOME]) == [UNREACHABLE]
+    assert graph.shortest_path(HOME, 'https://example.com/deep') == \
+        [HOME, 'https://example.com/about', 'https://example.com/founder', 'https://example.com/deep']
+    assert graph.shortest_path('https://example.com/deeper', HOME) is None
+
+
+def test_reachability_and_orphans() -> None:
+    # Given a page found only as a second seed, e.g. from a sitemap
+    site = {**SITE, 'https://example.com/landing': {'https://example.com/deeper'}}
+    graph = crawl_graph(site, HOME, 'https://example.com/landing')
+    # Then it cannot be reached by clicking from the home page, and nothing links to it
+    assert graph.unreachable([HOME]) == {'https://example.com/landing'}
+    assert graph.reachable([HOME]) == set(SITE)
+    assert graph.orphans([HOME]) == {'https://example.com/landing'}
+
+
+def test_diff() -> None:
+    # Given two crawls, where the second adds a page linked from contact and about no longer links home
+    site = {**SITE,
+            'https://example.com/about': {'https://example.com/founder'},
+            'https://example.com/contact': {HOME, 'https://example.com/jobs'}}
+    before, after = crawl_graph(SITE, HOME), crawl_graph(site, HOME)
+    # When I diff them
+    diff = after.diff(before)
+    # Then the added page and the changed links are reported
+    assert diff.added_urls == {'https://example.com/jobs'}
+    assert diff.removed_urls == set()
+    assert diff.added_links == {('https://example.com/contact', 'https://example.com/jobs')}
+    assert diff.removed_links == {('https://example.com/about', HOME)}
+    # And the reverse diff is the other way round
+    assert before.diff(after).removed_urls == {'https://example.com/jobs'}
+
+
+def test_save_and_load(tmp_path: str) -> None:
+    graph = crawl_graph(SITE, HOME)
+    path = os.path.join(tmp_path, 'links.graph')
+    graph.save(path)
+    loaded = LinkGraph.load(path)
+    assert set(loaded.links()) == set(graph.links())
+    assert loaded.depths([HOME], ['https://example.com/deeper']) == [4]
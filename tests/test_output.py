@@ -0,0 +1,78 @@
+import csv
+import io
+import os
+
+import pytest
+
+from siteatlas.crawler import CrawlState, FoundUrl, iter_crawl, iter_crawl_concurrently
+from siteatlas.output import CsvWriter, JsonLinesWriter, get_writer, read_json_lines
+from tests.test_crawler import SITE, GraphFetcher
+
+
+def test_iter_crawl_yields_urls_as_they_are_found() -> None:
+    # Given a crawl seeded with the home page
+    state = CrawlState()
+    state.add_seed('https://example.com/', 0)
+    fetcher = GraphFetcher(SITE)
+    found_urls = iter_crawl(state, fetcher)
+    # When I take the first url
+    first = next(found_urls)
+    # Then it is yielded after fetching only the home page, with where it was found
+    assert fetcher.fetched == ['https://example.com/']
+    assert first.source == 'https://example.com/' and first.depth == 1
+    # And the rest of the crawl yields every other url once
+    found = [first] + list(found_urls)
+    allowed_urls = sorted(found_url.url for found_url in found if found_url.allowed)
+    assert allowed_urls == sorted(set(SITE) - {'https://example.com/'})
+    assert [found_url.url for found_url in found if not found_url.allowed] == ['https://www.google.com/search']
+
+
+def test_iter_crawl_concurrently() -> None:
+    # Given a concurrent crawl
+    state = CrawlState()
+    state.add_seed('https://example.com/', 0)
+    # When I iterate over it
+    found = list(iter_crawl_concurrently(state, GraphFetcher(SITE), workers=3))
+    # Then every url but the seed is yielded once
+    assert len(found) == len({found_url.url for found_url in found}) == len(SITE)
+
+
+def test_json_lines_writer_flushes_in_batches() -> None:
+    # Given a writer with a batch size of 2
+    file = io.StringIO()
+    writer = JsonLinesWriter(file, batch_size=2)
+    # When I write one url, nothing is written yet
+    writer.write(FoundUrl('https://example.com/', 0, None, True))
+    assert file.getvalue() == ''
+    # And when I write a second the batch is written
+    writer.write(FoundUrl('https://example.com/about', 1, 'https://example.com/', True))
+    assert file.getvalue().count('\n') == 2
+    # And urls read back match those written
+    writer.write(FoundUrl('https://www.google.com/', 1, 'https://example.com/', False))
+    writer.close()
+    assert list(read_json_lines(io.StringIO(file.getvalue()))) == [
+        FoundUrl('https://example.com/', 0, None, True),
+        FoundUrl('https://example.com/about', 1, 'https://example.com/', True),
+        FoundUrl('https://www.google.com/', 1, 'https://example.com/', False),
+    ]
+
+
+def test_csv_writer(tmp_path: str) -> None:
+    # Given a crawl written to a csv file
+    path = os.path.join(tmp_path, 'site.csv')
+    state = CrawlState()
+    state.add_seed('https://example.com/', 0)
+    with get_writer(path, batch_size=2) as writer:
+        written = writer.write_all(iter_crawl(state, GraphFetcher(SITE)))
+    # Then every url found is a row
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == written == len(SITE)
+    assert {'url': 'https://www.google.com/search', 'depth': '1', 'source': 'https://example.com/',
+            'allowed': '0'} in rows
+    assert isinstance(writer, CsvWriter)
+
+
+def test_unknown_output_format(tmp_path: str) -> None:
+    with pytest.raises(ValueError):
+        get_writer(os.path.join(tmp_path, 'site.xml'))
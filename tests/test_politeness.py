@@ -0,0 +1,230 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from siteatlas.crawler import CrawlState, Frontier, crawl, crawl_concurrently
+from siteatlas.http_fetch import HttpFetcher
+from siteatlas.politeness import HostScheduler, is_backoff_status, parse_retry_after
+from siteatlas.seeding import RobotsRules
+from siteatlas.site_map import SiteMap
+from tests.test_crawler import SITE, GraphFetcher
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CrawlDelayRobots(RobotsRules):
+    def __init__(self, delays: dict[str, float]) -> None:
+        super().__init__()
+        self.delays = delays
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        return next((delay for host, delay in self.delays.items() if url.startswith(host)), None)
+
+
+def test_each_host_has_its_own_rate_limit() -> None:
+    # Given two hosts limited to one request a second each
+    clock = FakeClock()
+    scheduler = HostScheduler(requests_per_second=1, burst=1, max_concurrency_per_host=10, clock=clock)
+    for url in ['https://a.com/1', 'https://a.com/2', 'https://b.com/1', 'https://b.com/2']:
+        scheduler.push(url, 1)
+    # When I take the urls that are ready
+    # Then both hosts are fetched from at once, but each only once
+    assert scheduler.pop_ready() == ('https://a.com/1', 1)
+    assert scheduler.pop_ready() == ('https://b.com/1', 1)
+    assert scheduler.pop_ready() is None
+    assert scheduler.seconds_until_ready() == 1.0
+    # And once a second has passed each host can be fetched from again
+    clock.now = 1.0
+    assert scheduler.pop_ready() == ('https://a.com/2', 1)
+    assert scheduler.pop_ready() == ('https://b.com/2', 1)
+    assert len(scheduler) == 0
+
+
+def test_crawl_delay_lowers_the_rate() -> None:
+    # Given a host whose robots.txt asks for 5 seconds between requests
+    clock = FakeClock()
+    scheduler = HostScheduler(requests_per_second=10, burst=10, robots=CrawlDelayRobots({'https://a.com': 5}),
+                              clock=clock)
+    for url in ['https://a.com/1', 'https://a.com/2', 'https://b.com/1', 'https://b.com/2']:
+        scheduler.push(url, 1)
+    # Then only the other host can be fetched from more often
+    popped = [scheduler.pop_ready() for _ in range(4)]
+    assert popped == [('https://a.com/1', 1), ('https://b.com/1', 1), ('https://b.com/2', 1), None]
+    assert scheduler.seconds_until_ready() == 5.0
+
+
+def test_concurrency_cap() -> None:
+    # Given a host allowed one page in flight
+    scheduler = HostScheduler(requests_per_second=100, burst=100, max_concurrency_per_host=1, clock=FakeClock())
+    scheduler.push('https://a.com/1', 1)
+    scheduler.push('https://a.com/2', 1)
+    # When one page is taken
+    assert scheduler.pop_ready() == ('https://a.com/1', 1)
+    # Then the next waits until it is done
+    assert scheduler.pop_ready() is None
+    assert scheduler.seconds_until_ready() is None
+    scheduler.task_done('https://a.com/1')
+    assert scheduler.pop_ready() == ('https://a.com/2', 1)
+
+
+def test_backoff_on_errors() -> None:
+    # Given a host that starts failing
+    clock = FakeClock()
+    scheduler = HostScheduler(requests_per_second=100, burst=100, min_backoff_in_seconds=1, clock=clock)
+    scheduler.push('https://a.com/1', 1)
+    # When it answers 503 twice
+    scheduler.record_response('https://a.com/0', 503)
+    scheduler.record_response('https://a.com/0', 503)
+    # Then it is backed off exponentially
+    assert scheduler.seconds_until_ready() == 2.0
+    # And for as long as a 429 asks
+    scheduler.record_response('https://a.com/0', 429, retry_after='30')
+    assert scheduler.seconds_until_ready() == 30.0
+    # And once it recovers the backoff starts again from the minimum
+    clock.now = 30.0
+    scheduler.record_response('https://a.com/0', 200)
+    assert scheduler.pop_ready() == ('https://a.com/1', 1)
+    assert scheduler.hosts['https://a.com'].failures == 0
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after('120', 0) == 120.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', 1445412470.0) == 10.0
+    assert parse_retry_after('soon', 0) is None
+    assert parse_retry_after(None, 0) is None
+
+
+class SlowFetcher(GraphFetcher):
+    """Records the most pages ever fetched at once."""
+
+    def __init__(self, site: dict[str, set[str]]) -> None:
+        super().__init__(site)
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, url: str) -> SiteMap:
+        with self.lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return super().__call__(url)
+
+
+def test_concurrent_crawl_with_scheduler() -> None:
+    # Given a concurrent crawl scheduled one page at a time per host
+    state = CrawlState(frontier=HostScheduler(requests_per_second=1000, burst=1000, max_concurrency_per_host=1))
+    state.add_seed('https://example.com/', 0)
+    fetcher = SlowFetcher(SITE)
+    # When I crawl with many workers
+    site_map = crawl_concurrently(state, fetcher, workers=4)
+    # Then the whole site is found without ever fetching two pages of it at once
+    assert site_map.urls == set(SITE)
+    assert sorted(fetcher.fetched) == sorted(SITE)
+    assert fetcher.most_in_flight == 1
+
+
+def test_retry_waits_for_backoff() -> None:
+    # Given a host backed off for 2 seconds after a 503
+    clock = FakeClock()
+    scheduler = HostScheduler(requests_per_second=100, burst=100, min_backoff_in_seconds=2, max_retries=1,
+                              clock=clock)
+    scheduler.push('https://a.com/1', 1)
+    assert scheduler.pop_ready() == ('https://a.com/1', 1)
+    scheduler.record_response('https://a.com/1', 503)
+    scheduler.task_done('https://a.com/1')
+    # When the page is retried
+    assert scheduler.retry('https://a.com/1', 1)
+    # Then it is only ready once the backoff is over
+    assert scheduler.pop_ready() is None
+    clock.now = 2.0
+    assert scheduler.pop_ready() == ('https://a.com/1', 1)
+    # And it is only retried max_retries times
+    assert not scheduler.retry('https://a.com/1', 1)
+    # And a plain frontier does not retry at all
+    assert not Frontier().retry('https://a.com/1', 1)
+
+
+def test_is_backoff_status() -> None:
+    assert is_backoff_status(429)
+    assert is_backoff_status(503)
+    assert not is_backoff_status(404)
+    assert not is_backoff_status(200)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 to the first request for /about, and serves two small pages."""
+    requests: list[str] = []
+
+    def do_GET(self) -> None:
+        self.requests.append(self.path)
+        if self.path == '/about' and self.requests.count('/about') == 1:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = b'<a href="/about">About</a>' if self.path == '/' else b'<a href="/contact">Contact</a>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def test_page_that_answers_503_is_retried_not_rendered() -> None:
+    # Given a site whose about page fails once
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        scheduler = HostScheduler(requests_per_second=1000, burst=1000, min_backoff_in_seconds=0.01)
+        fetcher = HttpFetcher()
+        scheduler.watch(fetcher.session)
+        browser_fetched: list[str] = []
+
+        def browser_fetch_page(url: str) -> SiteMap:
+            browser_fetched.append(url)
+            return SiteMap()
+
+        state = CrawlState(frontier=scheduler)
+        state.add_seed(f'{base_url}/', 0)
+        # When I crawl it
+        site_map = crawl(state, lambda url: fetcher.fetch_page(url, {base_url.split('//')[1]}, browser_fetch_page))
+    finally:
+        server.shutdown()
+        server.server_close()
+    # Then the about page is fetched again once its host has backed off, and its links found
+    assert FlakyHandler.requests.count('/about') == 2
+    assert f'{base_url}/contact' in site_map.urls
+    # And the failed response was never handed to the browser
+    assert browser_fetched == []
+
+
+def test_robots_txt_is_read_without_holding_the_lock() -> None:
+    # Given robots rules that note whether the scheduler is locked while they are read
+    locked_while_reading: list[bool] = []
+
+    class WatchedRobots(RobotsRules):
+        def crawl_delay(self, url: str) -> Optional[float]:
+            locked_while_reading.append(scheduler._lock.locked())
+            return None
+
+    scheduler = HostScheduler(robots=WatchedRobots())
+    # When urls on a new host are pushed
+    scheduler.push('https://a.com/1', 1)
+    scheduler.push('https://a.com/2', 1)
+    # Then robots.txt was read once, with other workers free to use the scheduler meanwhile
+    assert locked_while_reading == [False]
@@ -0,0 +1,82 @@
+import time
+from typing import Optional
+
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.http_fetch import HttpFetcher
+from siteatlas.profiling import CrawlProfiler, MetricsHook, NO_PROFILER, PAGE
+from siteatlas.site_nagivation import get_links_map
+from tests.test_crawler import SITE, GraphFetcher
+from tests.test_http_fetch import BrowserFetcher
+
+
+class RecordingHook(MetricsHook):
+    def __init__(self) -> None:
+        self.spans: list[tuple[str, Optional[str]]] = []
+        self.counts: dict[str, int] = {}
+
+    def span_finished(self, phase: str, url: Optional[str], seconds: float) -> None:
+        self.spans.append((phase, url))
+
+    def counted(self, name: str, count: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + count
+
+
+def test_spans_are_timed_per_phase_and_host() -> None:
+    # Given a profiler with a hook
+    hook = RecordingHook()
+    profiler = CrawlProfiler(hooks=[hook], slowest_pages=2)
+    # When pages on two hosts are timed
+    for url, seconds in [('https://a.com/1', 0.03), ('https://a.com/2', 0.01), ('https://b.com/1', 0.02)]:
+        with profiler.span(PAGE, url):
+            time.sleep(seconds)
+    profiler.count('reloads', 3)
+    # Then the phase and each host have their totals
+    assert profiler.pages == 3
+    assert profiler.phases[PAGE].max_in_seconds >= 0.03
+    assert profiler.host_phases['https://a.com'][PAGE].count == 2
+    # And only the slowest pages are kept, slowest first
+    assert [url for _, url in profiler.slowest()] == ['https://a.com/1', 'https://b.com/1']
+    # And the hook is told everything
+    assert hook.spans == [(PAGE, 'https://a.com/1'), (PAGE, 'https://a.com/2'), (PAGE, 'https://b.com/1')]
+    assert hook.counts == {'reloads': 3}
+    # And the report shows it all
+    report = profiler.report()
+    assert 'Crawled 3 pages' in report
+    assert 'https://a.com 2 pages' in report
+    assert 'reloads=3' in report
+
+
+def test_crawl_is_profiled() -> None:
+    # Given a crawl with a profiler
+    profiler = CrawlProfiler()
+    state = CrawlState()
+    state.add_seed('https://example.com/', 0)
+    # When I crawl
+    crawl(state, GraphFetcher(SITE), profiler)
+    # Then every page fetch and merge is timed
+    assert profiler.pages == len(SITE)
+    assert profiler.phases['merge'].count == len(SITE)
+    assert profiler.pages_per_second > 0
+
+
+def test_link_extraction_and_http_fetch_are_profiled(sample_website_url: str) -> None:
+    # Given a profiler
+    profiler = CrawlProfiler()
+    allowed_domains = {sample_website_url.split('//')[1]}
+    # When I read links from html and fetch a static page over http
+    get_links_map('<a href="/about">About</a>', 'https://example.com/', {'example.com'}, profiler=profiler)
+    HttpFetcher().fetch_page(f'{sample_website_url}/about.html', allowed_domains, BrowserFetcher(),
+                             profiler=profiler)
+    # Then parsing, canonicalising and fetching are timed
+    assert profiler.phases['parse_html'].count == 2
+    assert profiler.phases['canonicalise'].count == 2
+    assert profiler.phases['http_get'].count == 1
+    assert profiler.counters == {'http_pages': 1}
+
+
+def test_no_profiler_records_nothing() -> None:
+    with NO_PROFILER.span(PAGE, 'https://a.com/'):
+        pass
+    NO_PROFILER.count('reloads')
+    assert NO_PROFILER.pages == 0
+    assert not NO_PROFILER.counters
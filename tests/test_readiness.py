@@ -0,0 +1,73 @@
+from typing import Any
+
+from siteatlas.readiness import HostTimings, PageReadiness, DocumentReadyState, DomQuiescence, \
+    DOM_QUIESCENCE_SCRIPT
+
+
+class FakeDriver:
+    """Records the readiness scripts run and the limits they were given."""
+
+    def __init__(self, ready: bool = True) -> None:
+        self.ready = ready
+        self.calls: list[tuple[str, tuple[Any, ...]]] = []
+
+    def execute_async_script(self, script: str, *args: Any) -> bool:
+        self.calls.append((script, args))
+        return self.ready
+
+
+def test_host_timings_learn_per_host() -> None:
+    # Given host timings with nothing learnt yet
+    timings = HostTimings(min_wait_in_seconds=0.1, max_wait_in_seconds=5.0, headroom=2.0)
+    # Then an unseen host gets the maximum budget
+    assert timings.budget('slow.example.com') == 5.0
+    # When one host is fast and another is slow
+    timings.record('fast.example.com', 0.2, ready=True)
+    timings.record('slow.example.com', 2.0, ready=True)
+    # Then each host gets its own budget
+    assert timings.budget('fast.example.com') == 0.4
+    assert timings.budget('slow.example.com') == 4.0
+    # And a page that was not ready in time pushes its host's budget up
+    timings.record('fast.example.com', 0.4, ready=False)
+    assert timings.budget('fast.example.com') > 0.4
+
+
+def test_page_readiness_uses_each_strategy_and_records_waits() -> None:
+    # Given readiness checks for the document and the DOM
+    readiness = PageReadiness([DocumentReadyState(), DomQuiescence(quiet_in_seconds=0.1)])
+    driver = FakeDriver()
+    # When I wait for a page
+    readiness.wait(driver, 'https://example.com/')  # type: ignore
+    # Then both strategies are run, the DOM with its quiet period
+    assert len(driver.calls) == 2
+    script, args = driver.calls[1]
+    assert script == DOM_QUIESCENCE_SCRIPT
+    assert args[0] == 100
+    # And the wait is counted, with the page among the slowest
+    assert readiness.pages_waited == 1
+    assert readiness.pages_not_ready == 0
+    assert readiness.slowest() == [(readiness.total_wait_in_seconds, 'https://example.com/')]
+
+
+def test_page_readiness_stops_at_first_strategy_not_ready() -> None:
+    # Given a page that never becomes ready
+    readiness = PageReadiness([DocumentReadyState(), DomQuiescence()])
+    driver = FakeDriver(ready=False)
+    # When I wait for it
+    readiness.wait(driver, 'https://example.com/')  # type: ignore
+    # Then the later strategies are not tried
+    assert len(driver.calls) == 1
+    # And its host is given the maximum budget next time
+    assert readiness.host_timings.budget('example.com') == readiness.host_timings.max_wait_in_seconds
+
+
+def test_page_readiness_keeps_only_the_slowest_pages() -> None:
+    # Given readiness that keeps the two slowest pages
+    readiness = PageReadiness([], slowest_pages=2)
+    # When many pages are waited for
+    for i in range(100):
+        readiness.wait(FakeDriver(), f'https://example.com/{i}')  # type: ignore
+    # Then every wait is counted, but only two pages are kept
+    assert readiness.pages_waited == 100
+    assert len(readiness.slowest()) == 2
+    assert readiness.total_wait_in_seconds >= sum(seconds for seconds, _ in readiness.slowest())
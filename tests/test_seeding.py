@@ -0,0 +1,111 @@
+import functools
+import gzip
+import io
+import os
+import threading
+from http.server import ThreadingHTTPServer
+from typing import Any, Generator
+
+import pytest
+import requests
+from _pytest.fixtures import fixture
+
+from siteatlas.crawler import CrawlState
+from siteatlas.site_map import SiteMap
+from siteatlas.seeding import RobotsRules, SitemapSeeder, iter_sitemap_locations
+from tests.conftest import QuietHandler
+
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def write_sitemap(path: str, urls: list[str], index: bool = False, compress: bool = False) -> None:
+    entry = 'sitemap' if index else 'url'
+    root = 'sitemapindex' if index else 'urlset'
+    xml = (f'<?xml version="1.0" encoding="UTF-8"?><{root} xmlns="{SITEMAP_NAMESPACE}">'
+           + ''.join(f'<{entry}><loc> {url} </loc><lastmod>2023-01-01</lastmod></{entry}>' for url in urls)
+           + f'</{root}>').encode()
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(xml) if compress else xml)
+
+
+@fixture
+def sitemap_website_url(tmp_path: str) -> Generator[str, None, None]:
+    """A site whose robots.txt points at a sitemap index of one plain and one gzipped sitemap."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=str(tmp_path)))
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    with open(os.path.join(tmp_path, 'robots.txt'), 'w') as f:
+        f.write(f'User-agent: *\nDisallow: /private/\nCrawl-delay: 2\nSitemap: {url}/sitemap_index.xml\n')
+    write_sitemap(os.path.join(tmp_path, 'sitemap_index.xml'),
+                  [f'{url}/sitemap_pages.xml', f'{url}/sitemap_products.xml.gz'], index=True)
+    write_sitemap(os.path.join(tmp_path, 'sitemap_pages.xml'),
+                  [f'{url}/', f'{url}/about?utm_source=sitemap', f'{url}/private/admin', 'https://elsewhere.org/'])
+    write_sitemap(os.path.join(tmp_path, 'sitemap_products.xml.gz'),
+                  [f'{url}/products/{i}' for i in range(1000)], compress=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def test_iter_sitemap_locations() -> None:
+    # Given a sitemap index
+    stream = io.BytesIO(f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}"><sitemap><loc>https://example.com/a.xml</loc>'
+                        f'</sitemap></sitemapindex>'.encode())
+    # Then its locations are sitemaps
+    assert list(iter_sitemap_locations(stream)) == [(True, 'https://example.com/a.xml')]
+
+
+def test_seed_from_sitemaps(sitemap_website_url: str) -> None:
+    # Given a site with sitemaps listed in robots.txt
+    seeder = SitemapSeeder()
+    allowed_domains = {sitemap_website_url.split('//')[1]}
+    # When I get the seed urls
+    seed_urls = list(seeder.iter_seed_urls(f'{sitemap_website_url}/', allowed_domains))
+    # Then every allowed url in both sitemaps is found, canonicalised
+    assert f'{sitemap_website_url}/' in seed_urls
+    assert f'{sitemap_website_url}/about' in seed_urls
+    assert f'{sitemap_website_url}/products/999' in seed_urls
+    assert len(seed_urls) == 1002
+    # And urls on other domains or disallowed by robots.txt are left out
+    assert 'https://elsewhere.org/' not in seed_urls
+    assert f'{sitemap_website_url}/private/admin' not in seed_urls
+    # And the crawl delay is read
+    assert seeder.robots.crawl_delay(sitemap_website_url) == 2.0
+
+
+def test_robots_rules_keep_disallowed_pages_off_the_frontier(sitemap_website_url: str) -> None:
+    # Given a crawl that obeys robots.txt
+    seeder = SitemapSeeder()
+    state = CrawlState(url_filter=seeder.is_allowed)
+    state.add_seed(f'{sitemap_website_url}/', 0)
+    # When a page links to a disallowed page
+    state.add_page(f'{sitemap_website_url}/', 0, SiteMap({f'{sitemap_website_url}/private/admin',
+                                                          f'{sitemap_website_url}/about'}, set()))
+    # Then it is recorded as skipped and never queued to be fetched
+    assert f'{sitemap_website_url}/private/admin' in state.site_map.skipped_urls
+    assert f'{sitemap_website_url}/private/admin' not in state.site_map.urls
+    assert state.frontier.pop() == (f'{sitemap_website_url}/', 0)
+    assert state.frontier.pop() == (f'{sitemap_website_url}/about', 1)
+    assert not state.frontier
+
+
+class RobotsSession:
+    """Answers every robots.txt request with the same status, or fails to connect if it is None."""
+
+    def __init__(self, status_code: Any) -> None:
+        self.status_code = status_code
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        if self.status_code is None:
+            raise requests.ConnectionError(url)
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = b'User-agent: *\nDisallow: /private/\n'
+        return response
+
+
+@pytest.mark.parametrize('status_code, can_fetch', [(200, True), (404, True), (410, True), (401, False),
+                                                    (403, False), (500, False), (503, False), (None, False)])
+def test_robots_rules_when_robots_txt_cannot_be_read(status_code: Any, can_fetch: bool) -> None:
+    robots = RobotsRules(session=RobotsSession(status_code))  # type: ignore[arg-type]
+    assert robots.can_fetch('https://example.com/about') == can_fetch
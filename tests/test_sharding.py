@@ -0,0 +1,127 @@
+import os
+import secrets
+import threading
+from functools import partial
+
+import pytest
+
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.sharding import (InMemoryShardQueues, SqliteShardQueues, connect_shard_queues, crawl_sharded,
+                                run_shard_worker, serve_shard_queues, shard_for)
+from siteatlas.site_map import SiteMap
+from tests.test_crawler import SITE, GraphFetcher
+
+# A larger site where every page links to its neighbours, the home page and an off site url
+BIG_SITE = {f'https://example.com/{i}': {f'https://example.com/{(i * 7) % 300}', f'https://example.com/{i + 1}',
+                                         'https://example.com/0', f'https://other.org/{i % 5}'}
+            for i in range(300)}
+
+
+class FailingFetcher:
+    def __call__(self, url: str) -> SiteMap:
+        raise ValueError(url)
+
+
+def single_process_site_map(site: dict[str, set[str]], seed: str, max_depth: int) -> SiteMap:
+    state = CrawlState(max_depth=max_depth)
+    state.add_seed(seed, 0)
+    return crawl(state, GraphFetcher(site))
+
+
+def test_shard_for_is_stable() -> None:
+    shards = [shard_for(f'https://example.com/{i}', 4) for i in range(1000)]
+    assert shards == [shard_for(f'https://example.com/{i}', 4) for i in range(1000)]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_pending_counts_unfinished_urls() -> None:
+    # Given urls sent to a shard
+    queues = InMemoryShardQueues(2)
+    queues.put(1, [('https://example.com/a', 1), ('https://example.com/b', 1)])
+    # When one is taken and finished, and the other starts a new url locally
+    assert queues.get(1, 10) == [('https://example.com/a', 1), ('https://example.com/b', 1)]
+    queues.task_done(finished=2, started=1)
+    # Then only the new url is still pending
+    assert queues.pending() == 1
+    assert queues.get(0, 10) == []
+
+
+def test_url_beyond_max_depth_is_fetched_when_a_shorter_path_arrives() -> None:
+    # Given a url that reaches a shard by a path too long to fetch it, before a shorter path arrives
+    queues = InMemoryShardQueues(1)
+    queues.put(0, [('https://example.com/contact', 3), ('https://example.com/contact', 1)])
+    # When the shard crawls with a max depth of 3
+    site_map = run_shard_worker(lambda: queues, 0, 1, partial(GraphFetcher, SITE), max_depth=3)
+    # Then it is fetched at the shorter depth, and the pages it links to are found
+    assert site_map.urls == {'https://example.com/contact', 'https://example.com/', 'https://example.com/about'}
+    assert queues.pending() == 0
+
+
+def test_each_page_is_fetched_once_without_a_depth_limit() -> None:
+    # Given four shards in threads sharing one fetcher, with no depth limit
+    queues = InMemoryShardQueues(4)
+    queues.put(shard_for('https://example.com/0', 4), [('https://example.com/0', 0)])
+    fetcher = GraphFetcher(BIG_SITE)
+    threads = [threading.Thread(target=run_shard_worker, args=(lambda: queues, shard, 4, lambda: fetcher, 0))
+               for shard in range(4)]
+    # When they crawl
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Then every page is found, and none is fetched twice however late its shortest path arrives
+    assert sorted(fetcher.fetched) == sorted(single_process_site_map(BIG_SITE, 'https://example.com/0', 0).urls)
+
+
+def test_shorter_paths_are_passed_on_without_fetching_again() -> None:
+    # Given a page found by a long path, with a shorter path to it arriving just after it is fetched
+    queues = InMemoryShardQueues(1)
+    queues.put(0, [('https://example.com/about', 2)])
+    fetcher = GraphFetcher(SITE)
+
+    def fetch_page(url: str) -> SiteMap:
+        if url == 'https://example.com/about':
+            queues.put(0, [(url, 1)])
+        return fetcher(url)
+
+    # When the shard crawls with a max depth of 4
+    run_shard_worker(lambda: queues, 0, 1, lambda: fetch_page, max_depth=4)
+    # Then it is not fetched again, but the page beyond max_depth by the long path is fetched by the short one
+    assert fetcher.fetched.count('https://example.com/about') == 1
+    assert 'https://example.com/deep' in fetcher.fetched
+    assert len(fetcher.fetched) == len(set(fetcher.fetched))
+
+
+def test_sharded_crawl_with_sqlite_queues(tmp_path: str) -> None:
+    # Given a crawl sharded over three processes sharing a SQLite file
+    queues_factory = partial(SqliteShardQueues, os.path.join(tmp_path, 'queues.db'))
+    # When I crawl
+    site_map = crawl_sharded(['https://example.com/0'], partial(GraphFetcher, BIG_SITE), queues_factory,
+                             shards=3, max_depth=4)
+    # Then the merged site map matches a single process crawl
+    assert site_map == single_process_site_map(BIG_SITE, 'https://example.com/0', 4)
+    # And each allowed url was only ever known to the shard that owns it
+    for shard, shard_map in queues_factory().results().items():
+        assert all(shard_for(url, 3) == shard for url in shard_map.urls)
+
+
+def test_sharded_crawl_with_served_queues() -> None:
+    # Given queues served over a socket, as they would be to workers on other machines
+    authkey = secrets.token_bytes(16)
+    manager = serve_shard_queues(('127.0.0.1', 0), authkey)
+    try:
+        address = manager.address
+        assert isinstance(address, tuple)
+        queues_factory = partial(connect_shard_queues, address, authkey, 4)
+        # When I crawl
+        site_map = crawl_sharded(['https://example.com/'], partial(GraphFetcher, SITE), queues_factory, shards=4)
+        # Then the whole site is found
+        assert site_map == single_process_site_map(SITE, 'https://example.com/', 10)
+    finally:
+        manager.shutdown()
+
+
+def test_failed_shard_stops_the_crawl(tmp_path: str) -> None:
+    queues_factory = partial(SqliteShardQueues, os.path.join(tmp_path, 'queues.db'))
+    with pytest.raises(RuntimeError):
+        crawl_sharded(['https://example.com/'], FailingFetcher, queues_factory, shards=2)
@@ -23,6 +23,19 @@ def test_merge_two_site_maps() -> None:
     assert merged_site_map.ignored_urls == {'1', '2', '3', '4', '5'}
 
 
+def test_diff_two_site_maps() -> None:
+    # Given two site maps
+    site_map_1 = SiteMap({'a', 'b', 'c'}, {'1', '2', '3'})
+    site_map_2 = SiteMap({'c', 'd', 'e'}, {'3', '4', '5'})
+    # When I diff them
+    diff_site_map = site_map_1.diff_site_maps(site_map_2)
+    # Then I expect the urls only in the first site map
+    assert diff_site_map.urls == {'a', 'b'}
+    assert diff_site_map.ignored_urls == {'1', '2'}
+    # And the first site map is unchanged
+    assert site_map_1.urls == {'a', 'b', 'c'}
+
+
 @pytest.mark.integration("Requires Selenium")
 def test_get_page_map_from_tags(driver: WebDriver) -> None:
     # Given a page of html
@@ -0,0 +1,72 @@
+import pytest
+
+from benchmarks.synthetic_site import SyntheticSite, SyntheticSiteServer
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.http_fetch import HttpFetcher
+from siteatlas.site_map import SiteMap
+from siteatlas.site_nagivation import get_links_map
+
+
+def test_shapes() -> None:
+    assert SyntheticSite(100, 'tree', branching=3).links(1) == [4, 5, 6]
+    assert SyntheticSite(100, 'chain').links(99) == []
+    assert len(SyntheticSite(100, 'fanout').links(0)) == 99
+    assert SyntheticSite(100, 'clique', clique_size=4).links(5) == [4, 6, 7, 8]
+    with pytest.raises(ValueError):
+        SyntheticSite(100, 'star')
+
+
+def test_button_pages() -> None:
+    # Given a site where every 10th page navigates with a button
+    site = SyntheticSite(100, 'tree', branching=3, button_every=10)
+    # Then its first link is a button rather than an anchor
+    assert site.has_button(10)
+    assert "window.location.href='/page/31'" in site.html(10)
+    assert 'href="/page/31"' not in site.html(10)
+    assert not site.has_button(11)
+
+
+def test_crawl_synthetic_site() -> None:
+    # Given a served synthetic site with buttons
+    site = SyntheticSite(500, 'tree', branching=4, button_every=25)
+    with SyntheticSiteServer(site) as server:
+        allowed_domains = {server.url.split('//')[1]}
+        fetcher = HttpFetcher()
+        browser_fetched: list[str] = []
+
+        def browser_fetch_page(url: str) -> SiteMap:
+            # Stands in for the browser, finding only the anchors
+            browser_fetched.append(url)
+            response = fetcher.get(url)
+            return get_links_map(response.text if response else '', url, allowed_domains)
+
+        state = CrawlState(max_depth=0)
+        state.add_seed(server.seed_url, 0)
+        # When I crawl it over http
+        site_map = crawl(state, lambda url: fetcher.fetch_page(url, allowed_domains, browser_fetch_page))
+    # Then every page reachable without clicking a button is found
+    reachable, to_visit = {0}, [0]
+    while to_visit:
+        page = to_visit.pop()
+        links = site.links(page)[1:] if site.has_button(page) else site.links(page)
+        for link in set(links) - reachable:
+            reachable.add(link)
+            to_visit.append(link)
+    assert site_map.urls == {f'{server.url}/page/{page}' for page in reachable}
+    assert site_map.ignored_urls == {'https://www.example.org/'}
+    # And the pages with buttons are left to the browser
+    assert sorted(browser_fetched) == sorted(f'{server.url}/page/{page}' for page in reachable if site.has_button(page))
+
+
+def test_assets_are_served() -> None:
+    # Given a site whose pages load assets
+    site = SyntheticSite(10, 'tree', branching=3, assets=True)
+    assert '<link rel="stylesheet" href="/assets/site.css">' in site.html(1)
+    assert '<img src="/assets/page-1.png"' in site.html(1)
+    # Then the server serves them
+    with SyntheticSiteServer(site) as server:
+        fetcher = HttpFetcher()
+        stylesheet = fetcher.get(f'{server.url}/assets/site.css')
+        image = fetcher.get(f'{server.url}/assets/page-1.png')
+    assert stylesheet is not None and '/assets/site.woff2' in stylesheet.text
+    assert image is not None and image.headers['Content-Type'] == 'image/png'
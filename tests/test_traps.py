@@ -0,0 +1,130 @@
+from typing import Any
+
+from selenium.common.exceptions import WebDriverException
+
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.link_extraction import BROWSER_HREFS_SCRIPT, BrowserLinkExtractor
+from siteatlas.site_map import SiteMap
+from siteatlas.link_graph import LinkGraphBuilder
+from siteatlas.site_nagivation import get_links_map, get_page_map
+from siteatlas.traps import (TrapDetector, get_content_fingerprint, has_repeating_segments, url_template, OVER_BUDGET,
+                             REPEATING_SEGMENTS, DUPLICATE_CONTENT)
+
+
+def calendar_page(url: str) -> SiteMap:
+    """An endless calendar, each day linking to the next, and a few ordinary pages."""
+    if url.startswith('https://example.com/calendar/'):
+        day = int(url.rsplit('/', 1)[1])
+        return SiteMap({f'https://example.com/calendar/{day + 1}', 'https://example.com/about'}, set())
+    return SiteMap({'https://example.com/calendar/1', 'https://example.com/about', 'https://example.com/contact'},
+                   set())
+
+
+def test_url_template() -> None:
+    assert url_template('https://example.com/calendar/2024/05?view=month&sid=a1b2') == \
+        'https://example.com/calendar/{n}/{n}?sid&view'
+    assert url_template('https://example.com/products/item-123.html') == 'https://example.com/products/item-{n}.html'
+    assert url_template('https://example.com/cart;jsessionid=0A1B2C3D4E5F6A7B8C9D/view') == \
+        'https://example.com/cart/view'
+    assert url_template('https://example.com/s/4f1c2a9be87d4c0fa1b2c3d4') == 'https://example.com/s/{id}'
+    assert url_template('https://example.com/about') == 'https://example.com/about'
+
+
+def test_has_repeating_segments() -> None:
+    assert has_repeating_segments('https://example.com/a/b/a/b/a/b/a/b', 3)
+    assert not has_repeating_segments('https://example.com/a/b/a/b/a/b', 3)
+
+
+def test_template_budget_stops_a_calendar_trap() -> None:
+    # Given a crawl of an endless calendar, with a budget of 5 urls per template
+    detector = TrapDetector(template_budget=5)
+    state = CrawlState(max_depth=0, url_filter=detector.is_allowed)
+    state.add_seed('https://example.com/', 0)
+    # When I crawl
+    site_map = crawl(state, calendar_page)
+    # Then only 5 calendar pages are fetched and the next is skipped
+    assert sorted(url for url in site_map.urls if 'calendar' in url) == \
+        [f'https://example.com/calendar/{day}' for day in range(1, 6)]
+    assert site_map.skipped_urls == {'https://example.com/calendar/6'}
+    # And ordinary pages are still found
+    assert {'https://example.com/about', 'https://example.com/contact'} <= site_map.urls
+    assert detector.skipped == {OVER_BUDGET: 1}
+    assert detector.over_budget_templates() == ['https://example.com/calendar/{n}']
+
+
+def test_repeating_segments_are_skipped() -> None:
+    detector = TrapDetector(max_segment_repeats=2)
+    assert detector.is_allowed('https://example.com/a/b/a/b')
+    assert not detector.is_allowed('https://example.com/a/b/a/b/a/b')
+    assert detector.skipped == {REPEATING_SEGMENTS: 1}
+
+
+def test_duplicate_content_is_not_followed() -> None:
+    # Given a page whose relative link leads to the same page one directory deeper, forever
+    detector = TrapDetector(max_segment_repeats=100, skip_duplicate_content=True)
+    link_graph = LinkGraphBuilder()
+    state = CrawlState(max_depth=0, url_filter=detector.is_allowed, page_filter=detector.follows_links,
+                       listeners=[link_graph])
+    state.add_seed('https://example.com/docs/', 0)
+
+    def fetch_page(url: str) -> SiteMap:
+        html = '<p>About us</p>' if url.endswith('/about') else '<a href="docs/">Docs</a> <a href="/about">About</a>'
+        detector.check_content(url, html)
+        return get_links_map(html, url, {'example.com'})
+
+    # When I crawl
+    site_map = crawl(state, fetch_page)
+    # Then the first page with the same html is skipped, and its links are not followed
+    assert site_map.skipped_urls == {'https://example.com/docs/docs/'}
+    assert site_map.urls == {'https://example.com/docs/', 'https://example.com/docs/docs/',
+                             'https://example.com/about'}
+    assert detector.duplicate_pages == {'https://example.com/docs/docs/': 'https://example.com/docs/'}
+    assert detector.skipped == {DUPLICATE_CONTENT: 1}
+    # But its links are still passed to listeners
+    assert 'https://example.com/docs/docs/docs/' in link_graph.freeze().links_from('https://example.com/docs/docs/')
+
+
+class FakeDriver:
+    """A browser showing a page with one link, counting how often its html is read."""
+
+    def __init__(self) -> None:
+        self.current_url = ''
+        self.page_source_reads = 0
+
+    def get(self, url: str) -> None:
+        self.current_url = url
+
+    def execute_script(self, script: str, *args: Any) -> Any:
+        if script == BROWSER_HREFS_SCRIPT:
+            return ['https://example.com/about']
+        raise WebDriverException("no buttons here")
+
+    @property
+    def page_source(self) -> str:
+        self.page_source_reads += 1
+        return '<a href="/about">About</a>'
+
+
+def test_page_source_is_only_read_to_check_duplicate_content() -> None:
+    # Given pages read with the browser link extractor
+    driver: Any = FakeDriver()
+    for skip_duplicate_content, reads in [(False, 0), (True, 1)]:
+        driver.page_source_reads = 0
+        detector = TrapDetector(skip_duplicate_content=skip_duplicate_content)
+        # When a page is fetched with a trap detector
+        page_map = get_page_map('https://example.com/', driver, {'example.com'}, 0,
+                                link_extractor=BrowserLinkExtractor(), trap_detector=detector)
+        # Then its html is only read if duplicate content is being looked for
+        assert page_map.urls == {'https://example.com/about'}
+        assert driver.page_source_reads == reads
+
+
+def test_content_fingerprint_ignores_whitespace() -> None:
+    assert get_content_fingerprint('<p>Hello\n  world</p>') == get_content_fingerprint('<p>Hello world</p> ')
+    assert get_content_fingerprint('<p>Hello</p>') != get_content_fingerprint('<p>World</p>')
+
+
+def test_skipped_urls_in_site_map_operations() -> None:
+    site_map = SiteMap({'a'}, {'1'}, {'x'}) + SiteMap({'b'}, set(), {'y'})
+    assert site_map.skipped_urls == {'x', 'y'}
+    assert site_map.diff_site_maps(SiteMap(set(), set(), {'x'})).skipped_urls == {'y'}
@@ -0,0 +1,55 @@
+from siteatlas.site_nagivation import get_links_map
+from siteatlas.url_canonicalisation import canonicalise_url, CanonicalisationRules
+
+
+def test_canonicalise_host_and_port() -> None:
+    # Given urls that differ only in host case and default ports
+    urls = ['https://WWW.Example.com/Path', 'https://www.example.com:443/Path', 'HTTPS://www.example.com/Path']
+    # When I canonicalise them
+    canonical_urls = {canonicalise_url(url) for url in urls}
+    # Then they are all the same page, keeping the path's case
+    assert canonical_urls == {'https://www.example.com/Path'}
+    # And non default ports are kept
+    assert canonicalise_url('http://example.com:8080/') == 'http://example.com:8080/'
+    # And a bare host gets the root path
+    assert canonicalise_url('https://example.com') == 'https://example.com/'
+
+
+def test_canonicalise_query() -> None:
+    # Given a url with tracking parameters and unsorted query parameters
+    url = 'https://example.com/search?q=a%20b&utm_source=news&page=2&fbclid=abc#results'
+    # When I canonicalise it
+    canonical_url = canonicalise_url(url)
+    # Then tracking parameters and the fragment are dropped and the rest sorted, keeping their encoding
+    assert canonical_url == 'https://example.com/search?page=2&q=a%20b'
+    # And a query of only tracking parameters is removed altogether
+    assert canonicalise_url('https://example.com/?utm_campaign=x') == 'https://example.com/'
+
+
+def test_canonicalise_rules_are_configurable() -> None:
+    # Given rules that strip trailing slashes but keep query order
+    rules = CanonicalisationRules(remove_trailing_slash=True, sort_query_parameters=False)
+    # Then trailing slashes are removed apart from the root
+    assert canonicalise_url('https://example.com/about/', rules) == 'https://example.com/about'
+    assert canonicalise_url('https://example.com/', rules) == 'https://example.com/'
+    assert canonicalise_url('https://example.com/?b=1&a=2', rules) == 'https://example.com/?b=1&a=2'
+    # And trailing slashes are kept by default
+    assert canonicalise_url('https://example.com/about/') == 'https://example.com/about/'
+
+
+def test_canonicalise_file_url() -> None:
+    # Given a file url
+    url = 'file:///Users/username/site/index.html'
+    # Then it is unchanged
+    assert canonicalise_url(url) == url
+
+
+def test_links_map_deduplicates_canonical_urls() -> None:
+    # Given a page linking to the same page in several forms
+    html = """<a href="https://EXAMPLE.com/about?utm_source=x">About</a>
+    <a href="https://example.com:443/about">About</a>
+    <a href="/about#team">About</a>"""
+    # When I get the links map
+    page_map = get_links_map(html, 'https://example.com/', {'example.com'})
+    # Then there is a single url
+    assert page_map.urls == {'https://example.com/about'}
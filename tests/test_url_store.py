@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from siteatlas.crawler import CrawlState, crawl
+from siteatlas.site_map import SiteMap
+from siteatlas.url_store import CompactUrlSet, CompactDepthMap, split_url
+
+
+def test_split_url() -> None:
+    assert split_url('https://example.com/blog/2023/post?page=2') == ('https://example.com/blog/2023/', 'post?page=2')
+    assert split_url('https://example.com/search?q=a/b') == ('https://example.com/', 'search?q=a/b')
+    assert split_url('https://example.com') == ('https://example.com', '')
+    assert split_url('mailto:someone@example.com') == ('mailto:someone@example.com', '')
+
+
+def test_compact_url_set_behaves_like_a_set() -> None:
+    # Given a plain set and a compact set of the same urls, enough to grow the table many times
+    urls = [f'https://example.com/section-{i % 7}/page-{i}.html' for i in range(5000)]
+    urls += ['https://other.example.org/', 'file:///tmp/index.html', 'https://example.com/ünïcode']
+    plain = set(urls)
+    compact = CompactUrlSet(urls + urls[:100])
+    # Then they hold the same urls
+    assert len(compact) == len(plain)
+    assert compact == plain  # type: ignore[comparison-overlap]
+    assert all(url in compact for url in urls)
+    assert 'https://example.com/missing' not in compact
+    # And removing urls in place matches the set too
+    removed = random.Random(1).sample(urls, 1000)
+    compact.difference_update(removed)
+    plain.difference_update(removed)
+    assert set(compact) == plain
+
+
+def test_compact_url_set_ids_are_stable() -> None:
+    # Given an url added to a compact set
+    compact = CompactUrlSet()
+    url_id = compact.add_with_id('https://example.com/a')
+    compact.update(f'https://example.com/{i}' for i in range(100))
+    # Then its id does not change as the set grows, or when it is removed and added back
+    assert compact.get_id('https://example.com/a') == url_id
+    compact.discard('https://example.com/a')
+    assert compact.get_id('https://example.com/a') is None
+    assert compact.add_with_id('https://example.com/a') == url_id
+    assert compact.url_for(url_id) == 'https://example.com/a'
+
+
+def test_compact_site_map_operations() -> None:
+    # Given two compact site maps
+    site_map_1 = SiteMap.compact()
+    site_map_1.update(SiteMap({'a', 'b', 'c'}, {'1', '2', '3'}))
+    site_map_2 = SiteMap({'c', 'd', 'e'}, {'3', '4', '5'})
+    # When I add and diff them
+    merged = site_map_1 + site_map_2
+    diff = site_map_1.diff_site_maps(site_map_2)
+    # Then the results are compact and match plain sets
+    assert isinstance(merged.urls, CompactUrlSet)
+    assert set(merged.urls) == {'a', 'b', 'c', 'd', 'e'}
+    assert merged.ignored_urls == {'1', '2', '3', '4', '5'}
+    assert diff == SiteMap({'a', 'b'}, {'1', '2'})
+    # And diffing does not change the original
+    assert site_map_1.urls == {'a', 'b', 'c'}
+    # And in place updates keep the same storage
+    urls = site_map_1.urls
+    site_map_1 += site_map_2
+    assert site_map_1.urls is urls
+    assert len(site_map_1.urls) == 5
+
+
+def test_crawl_with_compact_site_map() -> None:
+    # Given a crawl that stores its site map compactly
+    site = {f'https://example.com/{i}': {f'https://example.com/{i * 2}', f'https://example.com/{i * 2 + 1}'}
+            for i in range(1, 200)}
+    state = CrawlState(site_map=SiteMap.compact(), max_depth=0)
+    state.add_seed('https://example.com/1', 0)
+    # When I crawl
+    site_map = crawl(state, lambda url: SiteMap(set(site.get(url, set())), set()))
+    # Then the depths are kept compactly too
+    assert isinstance(state.depths, CompactDepthMap)
+    assert state.depths['https://example.com/4'] == 2
+    assert len(state.depths) == len(site_map.urls) == 399
+
+
+def test_depth_map_only_holds_urls_in_the_set() -> None:
+    urls = CompactUrlSet(['https://example.com/'])
+    depths = CompactDepthMap(urls)
+    depths['https://example.com/'] = 0
+    with pytest.raises(KeyError):
+        depths['https://example.com/about'] = 1
+    assert 'https://example.com/about' not in urls
+    assert dict(depths) == {'https://example.com/': 0}